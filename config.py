@@ -1,5 +1,69 @@
+import hashlib
+import logging
+import os
+import pickle
 import yaml
-from typing import Any, Dict, List, Tuple
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = Path("config.yaml")
+# Parsed configs and the rules compiled from them are cached here, keyed by
+# the sha256 of config.yaml, so unchanged configs skip YAML parsing.
+CACHE_DIR = Path(os.getenv("CONFIG_CACHE_DIR", ".config_cache"))
+
+
+def source_hash(*paths: str) -> str:
+    """Returns a short hash of the given source files.
+
+    Caches of pickled objects include it in their key, so a change to the code
+    that builds or defines those objects invalidates them without a manual
+    version bump.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(kind: str, content_hash: str) -> Path:
+    """Returns the cache file holding `kind` data for one config version."""
+    return CACHE_DIR / f"{kind}-{content_hash}.pkl"
+
+
+def read_cache(kind: str, content_hash: str) -> Optional[Any]:
+    """Loads a cached object for this config version, or None on any miss."""
+    try:
+        with open(cache_path(kind, content_hash), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Ignoring unreadable %s cache.", kind, exc_info=True)
+        return None
+
+
+def write_cache(kind: str, content_hash: str, value: Any) -> None:
+    """Atomically stores `value` and drops other `kind` caches.
+
+    Caches of other config or code versions share the `kind` prefix, so they
+    are all removed.
+
+    The cache is an optimization, so failures are logged and otherwise ignored.
+    """
+    path = cache_path(kind, content_hash)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        for stale in CACHE_DIR.glob(f"{kind}-*.pkl"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    except OSError:
+        logger.warning("Could not write %s cache to %s.", kind, path, exc_info=True)
 
 
 class Config:
@@ -30,13 +94,25 @@ class Config:
     CATEGORY_MAP: Dict[str, str]
     EXACT_MERCHANT_TO_CATEGORY_MAP: Dict[str, str]
     MERCHANT_TO_CATEGORY_MAP: Dict[str, str]
+    # sha256 of the config.yaml contents these settings were loaded from.
+    CONTENT_HASH: str
 
-    def __init__(self: "Config") -> None:
-        with open("config.yaml", "r") as f:
-            config_data: Dict[str, Any] = yaml.safe_load(f)
+    def __init__(self: "Config", path: Path = CONFIG_FILE) -> None:
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.CONTENT_HASH = hashlib.sha256(raw).hexdigest()
+        config_data: Optional[Dict[str, Any]] = read_cache("config", self.CONTENT_HASH)
+        if config_data is None:
+            config_data = yaml.safe_load(raw)
+            write_cache("config", self.CONTENT_HASH, config_data)
+        self._loaded: Dict[str, Any] = dict(config_data)
         for key, value in config_data.items():
             setattr(self, key, value)
 
+    def unchanged(self: "Config", keys: Iterable[str]) -> bool:
+        """Returns whether `keys` still hold the values loaded from the file."""
+        return all(getattr(self, key, None) is self._loaded.get(key) for key in keys)
+
 
 # Global config.
 GLOBAL: Config = Config()
@@ -1,3 +1,4 @@
+import gzip
 import requests
 import json
 import re
@@ -5,9 +6,12 @@ import os
 import pickle
 import subprocess
 import sys
+import time
 
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from dateutil.relativedelta import relativedelta
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from pathlib import Path
 
 from typing import cast, Mapping, Self
 import logging
@@ -20,6 +24,93 @@ from empower_types import (
 
 logger = logging.getLogger(__name__)
 
+# Monthly transaction shards fetched at once. Kept low: Empower sits behind
+# Cloudflare, which challenges clients that look like bursts of automation.
+SHARD_WORKERS = 3
+SHARD_RETRIES = 2
+SHARD_RETRY_SECONDS = 2.0
+# Raw responses for settled months are cached here; unset disables the cache.
+SHARD_CACHE_DIR: Path | None = (
+    Path(os.environ["EMPOWER_SHARD_CACHE_DIR"])
+    if os.getenv("EMPOWER_SHARD_CACHE_DIR")
+    else None
+)
+# Days after a month ends before its transactions are treated as final.
+SETTLE_DAYS = 30
+
+
+def _as_date(value: date) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def month_shards(start_date: date, end_date: date) -> list[tuple[date, date]]:
+    """Splits the inclusive range start_date..end_date at month boundaries."""
+    shards = []
+    start = start_date
+    while start <= end_date:
+        next_month = start.replace(day=1) + relativedelta(months=1)
+        shards.append((start, min(next_month - timedelta(days=1), end_date)))
+        start = next_month
+    return shards
+
+
+def _shard_cache_path(start_date: date, end_date: date) -> Path | None:
+    """Returns where a shard is cached, or None if it must always be fetched.
+
+    Only whole months that ended at least SETTLE_DAYS ago are cached; their
+    transactions no longer change, so a cached response never goes stale.
+    """
+    if SHARD_CACHE_DIR is None or start_date.day != 1:
+        return None
+    month_end = start_date + relativedelta(months=1) - timedelta(days=1)
+    if end_date != month_end or month_end + timedelta(SETTLE_DAYS) >= date.today():
+        return None
+    return SHARD_CACHE_DIR / f"{start_date:%Y-%m}.json.gz"
+
+
+def _read_shard(path: Path) -> TransactionData | None:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cast(TransactionData, json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Ignoring unreadable Empower shard %s.", path, exc_info=True)
+        return None
+
+
+def _write_shard(path: Path, data: TransactionData) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Could not cache Empower shard %s.", path, exc_info=True)
+
+
+def merge_transaction_data(shards: list[TransactionData]) -> TransactionData:
+    """Merges shard responses in date order, keeping each transaction once.
+
+    Transactions are de-duplicated by userTransactionId, keeping the first
+    occurrence; the cash-flow totals are summed.
+    """
+    seen: set[object] = set()
+    transactions = []
+    for shard in shards:
+        for txn in shard["transactions"]:
+            key = txn.get("userTransactionId")
+            if key is not None and key in seen:
+                continue
+            seen.add(key)
+            transactions.append(txn)
+    merged = cast(TransactionData, dict(shards[-1]))
+    merged["transactions"] = transactions
+    merged["moneyIn"] = sum(shard.get("moneyIn", 0) for shard in shards)
+    merged["netCashflow"] = sum(shard.get("netCashflow", 0) for shard in shards)
+    return merged
+
 
 class PersonalCapitalSessionExpiredException(RuntimeError):
     pass
@@ -161,6 +252,64 @@ class PersonalCapital:
         self,
         start_date: date | None,
         end_date: date = datetime.now() + relativedelta(months=1),
+        monthly_shards: bool = False,
+    ) -> TransactionData:
+        """Fetches transactions dated from start_date through end_date.
+
+        Args:
+          start_date: First day to fetch, or None for Empower's default window.
+          end_date: Last day to fetch.
+          monthly_shards: If true and start_date is set, whole calendar months
+            covering the range are fetched, SHARD_WORKERS at a time, and
+            merged. Settled months are served from SHARD_CACHE_DIR when set,
+            so an interrupted backfill resumes where it stopped.
+
+        Returns:
+          The transactions and cash-flow totals for the range. With
+          monthly_shards, transactions outside the range are dropped but the
+          totals cover the whole months.
+        """
+        if not monthly_shards or start_date is None:
+            return self._get_transaction_shard(start_date, end_date)
+        last_date = _as_date(end_date)
+        shards = month_shards(start_date.replace(day=1), last_date)
+        with ThreadPoolExecutor(
+            max_workers=min(SHARD_WORKERS, len(shards)),
+            thread_name_prefix="empower-shard",
+        ) as pool:
+            futures = [pool.submit(self._get_month, *shard) for shard in shards]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                error = future.exception() if future in done else None
+                if error is not None:
+                    # Leaving the pool would still request every queued month;
+                    # after a challenge or an expired session that is the
+                    # burst of doomed requests the shards must not cause.
+                    pool.shutdown(cancel_futures=True)
+                    raise error
+            merged = merge_transaction_data([future.result() for future in futures])
+        first, last = f"{start_date:%Y-%m-%d}", f"{last_date:%Y-%m-%d}"
+        merged["transactions"] = [
+            txn
+            for txn in merged["transactions"]
+            if first <= txn.get("transactionDate", first) <= last
+        ]
+        return merged
+
+    def _get_month(self, start_date: date, end_date: date) -> TransactionData:
+        """Fetches one month's shard, through the cache when it is settled."""
+        path = _shard_cache_path(start_date, end_date)
+        if path is not None:
+            cached = _read_shard(path)
+            if cached is not None:
+                return cached
+        data = self._get_transaction_shard_with_retry(start_date, end_date)
+        if path is not None:
+            _write_shard(path, data)
+        return data
+
+    def _get_transaction_shard(
+        self, start_date: date | None, end_date: date
     ) -> TransactionData:
         resp = self._api_request(
             "post",
@@ -172,6 +321,28 @@ class PersonalCapital:
         )
         return cast(TransactionData, resp["spData"])
 
+    def _get_transaction_shard_with_retry(
+        self, start_date: date, end_date: date
+    ) -> TransactionData:
+        """Fetches one shard, retrying failures other than challenges and expiry."""
+        attempt = 0
+        while True:
+            try:
+                return self._get_transaction_shard(start_date, end_date)
+            except (
+                PersonalCapitalSessionExpiredException,
+                PersonalCapitalCloudflareChallengeException,
+            ):
+                raise
+            except (RuntimeError, requests.RequestException):
+                if attempt >= SHARD_RETRIES:
+                    raise
+            logger.warning(
+                "Retrying Empower transactions for %s..%s.", start_date, end_date
+            )
+            time.sleep(SHARD_RETRY_SECONDS * 2**attempt)
+            attempt += 1
+
     def get_account_data(self) -> AccountsData:
         resp = self._api_request("post", "/api/newaccount/getAccounts2")
         return cast(AccountsData, resp["spData"])
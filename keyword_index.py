@@ -0,0 +1,115 @@
+"""Substring keyword index for the merchant-to-category maps.
+
+``KeywordIndex`` compiles a keyword map into an Aho-Corasick automaton once,
+so finding the winning keyword for a merchant costs one walk over the
+merchant's characters no matter how many keywords are configured.
+
+The winner is the keyword a linear scan would have returned: keywords are
+ranked longest first by ``rank_key`` with ties broken by map order, and the
+best-ranked keyword contained anywhere in the merchant wins.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Generic, Mapping, Optional, TypeVar
+
+V = TypeVar("V")
+
+# Rank of nodes that do not complete any keyword.
+_NO_MATCH = 1 << 62
+
+
+def _identity(keyword: str) -> str:
+    return keyword
+
+
+class KeywordIndex(Generic[V]):
+    """Longest-keyword-first substring matcher.
+
+    Args:
+      keyword_map: Mapping from keyword to value, in priority order for ties.
+      normalize: Applied to every keyword before it is indexed.  Texts passed
+        to ``match`` must already be normalized the same way.
+      rank_key: Length used to rank a raw keyword; longer ranks first.
+    """
+
+    def __init__(
+        self,
+        keyword_map: Mapping[str, V],
+        normalize: Callable[[str], str] = _identity,
+        rank_key: Callable[[str], int] = len,
+    ) -> None:
+        ranked = sorted(
+            keyword_map.items(), key=lambda item: rank_key(item[0]), reverse=True
+        )
+        self._keywords: list[tuple[str, V]] = []
+        seen: set[str] = set()
+        for keyword, value in ranked:
+            normalized = normalize(keyword)
+            # Only the first of several spellings of a keyword can ever win.
+            if normalized not in seen:
+                seen.add(normalized)
+                self._keywords.append((normalized, value))
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[int] = [_NO_MATCH]
+        for rank, (keyword, _) in enumerate(self._keywords):
+            self._insert(keyword, rank)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def _insert(self, keyword: str, rank: int) -> None:
+        node = 0
+        for ch in keyword:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(_NO_MATCH)
+            node = child
+        self._best[node] = min(self._best[node], rank)
+
+    def _link(self) -> None:
+        """Set failure links breadth first and fold suffix matches into nodes.
+
+        After linking, ``_best[node]`` is the best rank among every keyword
+        that ends at ``node``, including those that are proper suffixes of it.
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target
+                self._best[child] = min(self._best[child], self._best[target])
+                queue.append(child)
+
+    def _best_rank(self, text: str) -> int:
+        goto, fail, best = self._goto, self._fail, self._best
+        node = 0
+        found = best[0]
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if best[node] < found:
+                found = best[node]
+        return found
+
+    def match(self, text: str) -> Optional[tuple[str, V]]:
+        """Return the winning ``(keyword, value)`` contained in ``text``."""
+        rank = self._best_rank(text)
+        return None if rank == _NO_MATCH else self._keywords[rank]
+
+    def get(self, text: str) -> Optional[V]:
+        """Return the value of the winning keyword in ``text``, if any."""
+        found = self.match(text)
+        return None if found is None else found[1]
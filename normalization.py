@@ -0,0 +1,321 @@
+"""Compiled merchant normalization rules.
+
+The cleaning rules in ``config.yaml`` are applied to every merchant string the
+project sees.  ``MerchantNormalizer`` compiles them once per config snapshot so
+each pass rejects whole rule families with a single C-level check and only
+falls back to the ordered, rule-by-rule application when a rule can apply.
+
+Results are memoized in bounded LRU caches keyed on the raw string.  The
+merchant cache lives on the compiled normalizer, so it is dropped together
+with the rules whenever the config changes.  ``map_unique`` normalizes a
+column by touching each distinct value once.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import re
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import config
+import schema
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of cleaning passes before giving up on a fixpoint.
+MAX_NORMALIZATION_PASSES = 30
+AMAZON_MARKETPLACE_PREFIX = "amzn mktp "
+# Canonical names that settle within this many passes are resolved up front;
+# it is well below the pass count at which cycle warnings start.
+_SHORTCUT_PASSES = 10
+# Distinct raw strings remembered by each normalization cache.
+CACHE_SIZE = 1 << 16
+
+# ASCII bytes dropped by the trim step.  Non-ASCII strings use the generic
+# predicate so unicode letters behave as before.
+_ASCII_TRIM_DELETE = bytes(
+    code for code in range(128) if not (chr(code).isalpha() or chr(code).isspace())
+)
+
+_RULE_ATTRS = (
+    "STARTS_WITH_REMOVAL",
+    "ENDS_WITH_REMOVAL",
+    "MERCHANT_NORMALIZATION_PAIRS",
+    "MERCHANT_NORMALIZATION",
+)
+
+
+def trim(merchant: str) -> str:
+    """Removes non-alphabetic characters from a string and titles it."""
+    if merchant.isascii():
+        encoded = merchant.encode("ascii")
+        kept = encoded.translate(None, _ASCII_TRIM_DELETE).decode("ascii")
+    else:
+        kept = "".join(ch for ch in merchant if ch.isalpha() or ch.isspace())
+    return " ".join(kept.replace("xx", "").split()).title()
+
+
+def _normalize_value(value: str) -> str:
+    return " ".join(
+        "".join(
+            ch for ch in value if ch.isalnum() or ch.isspace() or ch in ("/")
+        ).split()
+    ).title()
+
+
+# Value normalization does not depend on the config, so one cache is shared.
+normalize_value = functools.lru_cache(maxsize=CACHE_SIZE)(_normalize_value)
+
+
+def map_unique(values: pd.Series, func: Callable[[Any], Any]) -> pd.Series:
+    """Apply ``func`` once per distinct value of ``values``.
+
+    Equivalent to ``values.map(func)``: the column is factorized, ``func`` is
+    mapped over the uniques and the results are taken back by code.  Missing
+    values are passed through ``func`` individually, as ``map`` would.
+    Categorical columns stay categorical; see ``_map_categories``.
+    """
+    if schema.is_categorical(values):
+        return _map_categories(values, func)
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(value) for value in uniques]
+    result = mapped.take(codes)
+    missing = codes == -1
+    if missing.any():
+        result[missing] = [func(value) for value in values.to_numpy()[missing]]
+    mapped_values = pd.Series(result, index=values.index, name=values.name)
+    return mapped_values.infer_objects()
+
+
+def _map_categories(values: pd.Series, func: Callable[[Any], Any]) -> pd.Series:
+    """``map_unique`` for categoricals, without expanding them to objects.
+
+    ``func`` runs once per category plus once for missing values; the results
+    become the new categories and the codes are remapped to them.
+    """
+    codes = values.cat.codes.to_numpy()
+    missing = codes == -1
+    # The last entry is taken for missing values (code -1).
+    results = [func(value) for value in values.cat.categories]
+    results.append(func(values[missing].iloc[0]) if missing.any() else None)
+    new_codes, new_categories = pd.factorize(pd.Series(results, dtype=object))
+    mapped = pd.Categorical.from_codes(new_codes.take(codes), new_categories)
+    return pd.Series(mapped, index=values.index, name=values.name)
+
+
+def _trie_pattern(node: dict[str, Any]) -> str:
+    branches = [re.escape(ch) + _trie_pattern(node[ch]) for ch in sorted(node) if ch]
+    if not branches:
+        return ""
+    optional = "" in node
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    return f"(?:{'|'.join(branches)}){'?' if optional else ''}"
+
+
+def _any_of(patterns: Iterable[str]) -> Optional[re.Pattern[str]]:
+    """Compile a literal alternation used to reject strings no rule touches.
+
+    The literals are merged into a prefix trie first, so the regex engine
+    branches on one character at a time instead of trying every literal at
+    every position.
+    """
+    trie: dict[str, Any] = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    if not trie:
+        return None
+    if "" in trie:
+        # An empty literal matches every string.
+        return re.compile("")
+    return re.compile(_trie_pattern(trie))
+
+
+class MerchantNormalizer:
+    """Merchant cleaning rules compiled from one config snapshot.
+
+    ``normalize_once`` is exactly one pass of the configured rules and
+    ``normalize`` repeats it until the merchant stops changing.  Rule order is
+    preserved: each family is first tested as a whole (a ``startswith`` or
+    ``endswith`` tuple, or one compiled alternation) and only strings that can
+    be affected walk the ordered rule list.
+    """
+
+    def __init__(
+        self,
+        starts_with_removal: Sequence[str],
+        ends_with_removal: Sequence[str],
+        normalization_pairs: Sequence[Sequence[str]],
+        canonical_names: Sequence[str],
+    ) -> None:
+        self._prefixes = tuple(prefix.lower() for prefix in starts_with_removal)
+        self._suffixes = tuple(suffix.lower() for suffix in ends_with_removal)
+        self._pairs = tuple(
+            (src.lower(), dst.lower()) for src, dst in normalization_pairs
+        )
+        self._pair_pattern = _any_of(src for src, _ in self._pairs)
+        self._canonical = tuple((name, name.lower()) for name in canonical_names)
+        self._canonical_pattern = _any_of(lowered for _, lowered in self._canonical)
+        self._canonical_results = self._resolve_canonical_names()
+        self._cached_normalize = functools.lru_cache(maxsize=CACHE_SIZE)(
+            self._normalize
+        )
+
+    @classmethod
+    def from_config(cls, settings: Any) -> "MerchantNormalizer":
+        """Compile the merchant rules currently held by ``settings``."""
+        return cls(
+            getattr(settings, "STARTS_WITH_REMOVAL", []),
+            getattr(settings, "ENDS_WITH_REMOVAL", []),
+            getattr(settings, "MERCHANT_NORMALIZATION_PAIRS", []),
+            getattr(settings, "MERCHANT_NORMALIZATION", []),
+        )
+
+    def _strip_affixes(self, merchant: str) -> str:
+        if self._prefixes and merchant.startswith(self._prefixes):
+            for prefix in self._prefixes:
+                if merchant.startswith(prefix):
+                    merchant = merchant[len(prefix) :]
+        if merchant.startswith(AMAZON_MARKETPLACE_PREFIX):
+            merchant = f"Amazon {merchant[len(AMAZON_MARKETPLACE_PREFIX):]}"
+        if self._suffixes and merchant.endswith(self._suffixes):
+            for suffix in self._suffixes:
+                if merchant.endswith(suffix):
+                    merchant = merchant[: len(merchant) - len(suffix)]
+        return merchant
+
+    def _canonical_name(self, normalized: str) -> Optional[str]:
+        lowered = normalized.lower()
+        if self._canonical_pattern is None or not self._canonical_pattern.search(
+            lowered
+        ):
+            return None
+        # The first configured name wins, regardless of where it matches.
+        for name, name_lower in self._canonical:
+            if name_lower in lowered:
+                return name
+        return None  # pragma: no cover - the alternation guarantees a match
+
+    def normalize_once(self, merchant: str) -> str:
+        """Applies a single pass of the merchant cleaning rules."""
+        merchant = self._strip_affixes(merchant.lower())
+        if self._pair_pattern is not None and self._pair_pattern.search(merchant):
+            for src, dst in self._pairs:
+                merchant = merchant.replace(src, dst)
+        normalized = trim(merchant)
+        canonical = self._canonical_name(normalized)
+        return normalized if canonical is None else canonical
+
+    def _resolve_canonical_names(self) -> dict[str, str]:
+        """Precompute where each canonical name settles under further passes."""
+        resolved: dict[str, str] = {}
+        for name, _ in self._canonical:
+            merchant = name
+            for _ in range(_SHORTCUT_PASSES):
+                norm = self.normalize_once(merchant)
+                if norm == merchant or len(norm) == 0:
+                    resolved[name] = norm
+                    break
+                merchant = norm
+        return resolved
+
+    def _is_fixpoint(self, normalized: str) -> bool:
+        """Return whether a pass over ``normalized`` would leave it unchanged.
+
+        ``normalized`` is the trimmed output of a pass that matched no canonical
+        name, so another pass can only change it through an affix, a
+        replacement pair, or the trim step itself.
+        """
+        lowered = normalized.lower()
+        if self._prefixes and lowered.startswith(self._prefixes):
+            return False
+        if lowered.startswith(AMAZON_MARKETPLACE_PREFIX):
+            return False
+        if self._suffixes and lowered.endswith(self._suffixes):
+            return False
+        if self._pair_pattern is not None and self._pair_pattern.search(lowered):
+            return False
+        return trim(lowered) == normalized
+
+    def normalize(self, merchant: str) -> str:
+        """Applies cleaning passes until the merchant is stable or empty.
+
+        Results are memoized per raw merchant string; see ``cache_info``.
+        """
+        return self._cached_normalize(merchant)
+
+    def cache_info(self) -> functools._CacheInfo:
+        """Hit/miss counters of this normalizer's merchant cache."""
+        return self._cached_normalize.cache_info()
+
+    def _normalize(self, merchant: str) -> str:
+        """Uncached ``normalize``.
+
+        Most merchants settle after one pass.  When that pass produced a
+        canonical name, its precomputed result is used; otherwise the cheap
+        ``_is_fixpoint`` check stands in for the confirming second pass.  Only
+        merchants that keep changing fall back to the pass-by-pass loop.
+        """
+        norm = self.normalize_once(merchant)
+        if norm == merchant or len(norm) == 0:
+            return norm
+        if norm in self._canonical_results:
+            return self._canonical_results[norm]
+        if self._is_fixpoint(norm):
+            return norm
+        return self._normalize_loop(merchant)
+
+    def _normalize_loop(self, merchant: str) -> str:
+        goes = MAX_NORMALIZATION_PASSES
+        while goes > 0:
+            norm = self.normalize_once(merchant)
+            goes = 0 if norm == merchant or len(norm) == 0 else goes - 1
+            merchant = norm
+            if 0 < goes < 5:
+                logger.warning(f"Might enter a cycle with {merchant}")
+        return merchant
+
+
+# The sources are held strongly so an identity check cannot be fooled by a
+# replaced list reusing a freed object's id.
+_compiled: Optional[tuple[tuple[object, ...], MerchantNormalizer]] = None
+
+
+def merchant_normalizer() -> MerchantNormalizer:
+    """Return the normalizer compiled from the current ``config.GLOBAL`` rules.
+
+    Rules are treated as immutable: replacing a rule list on ``config.GLOBAL``
+    (or replacing ``config.GLOBAL`` itself) triggers a recompile.
+    """
+    global _compiled
+    sources = tuple(getattr(config.GLOBAL, attr, None) for attr in _RULE_ATTRS)
+    compiled = _compiled
+    if compiled is None or any(
+        current is not cached for current, cached in zip(sources, compiled[0])
+    ):
+        compiled = (sources, MerchantNormalizer.from_config(config.GLOBAL))
+        _compiled = compiled
+    return compiled[1]
+
+
+def cache_info() -> dict[str, functools._CacheInfo]:
+    """Hit/miss counters of the value and current merchant caches."""
+    return {
+        "value": normalize_value.cache_info(),
+        "merchant": merchant_normalizer().cache_info(),
+    }
+
+
+def clear_caches() -> None:
+    """Drop all memoized results and force the rules to be recompiled."""
+    global _compiled
+    _compiled = None
+    normalize_value.cache_clear()
@@ -1,8 +1,10 @@
 """Plaid Transactions Sync source and encrypted Google Sheet state.
 
-The spreadsheet is deliberately the durable store: both Fly process groups can
-read it, while the value kept there is an authenticated encrypted blob.  The
-only key material lives in ``PLAID_STATE_KEY``.
+Without ``PLAID_STATE_DIR`` the spreadsheet is the durable store: both Fly
+process groups can read it, while the value kept there is an authenticated
+encrypted blob.  With it, plaid_state keeps the primary copy on each process
+group's local volume and the sheet becomes the replica they reconcile through.
+The only key material lives in ``PLAID_STATE_KEY``.
 """
 
 from __future__ import annotations
@@ -10,17 +12,30 @@ from __future__ import annotations
 import base64
 import hashlib
 import json
+import logging
 import os
+import pickle
+import random
 import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Any, Hashable, Iterable, Optional
+from typing import Any, Hashable, Iterable, Iterator, Optional
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from cryptography.fernet import Fernet, InvalidToken
 
 import config
+import normalization
 import remote
+import rules
 import utils
 
 STATE_SHEET_TITLE = "Plaid State"
@@ -29,6 +44,20 @@ STATE_MAX_CHUNK_SIZE = 45_000
 STATE_MAX_CHUNKS = 200
 MAX_ITEMS = 10
 RESERVED_ITEMS = 1
+# Connections kept open to Plaid; covers scraper.PLAID_SYNC_WORKERS threads.
+HTTP_POOL_SIZE = 10
+REQUEST_TIMEOUT_SECONDS = 45
+# Read-only endpoints that are safe to send again after a transient failure.
+RETRYABLE_PATHS = frozenset({"/transactions/sync", "/accounts/get"})
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = int(os.getenv("PLAID_MAX_RETRIES", "3"))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+SYNC_PAGE_SIZE = 500
+# How long account metadata and balances cached in an item stay fresh.
+ACCOUNTS_TTL = timedelta(hours=float(os.getenv("PLAID_ACCOUNTS_TTL_HOURS", "6")))
+
+logger = logging.getLogger(__name__)
 
 
 class PlaidError(utils.ScraperError):
@@ -54,9 +83,113 @@ def _fernet() -> Fernet:
         return Fernet(derived)
 
 
+def _seal(cipher: Fernet, text: str) -> str:
+    return cipher.encrypt(zlib.compress(text.encode())).decode()
+
+
+def _unseal(cipher: Fernet, token: str) -> str:
+    try:
+        return zlib.decompress(cipher.decrypt(token.encode())).decode()
+    except InvalidToken as exc:
+        raise PlaidError(
+            "state_decryption_failed", "Plaid state cannot be decrypted"
+        ) from exc
+    except (zlib.error, UnicodeDecodeError) as exc:
+        raise PlaidError(
+            "state_decryption_failed", "Plaid state could not be read"
+        ) from exc
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class StateItems(MutableMapping[str, dict[str, Any]]):
+    """The items of a loaded Plaid state, each decrypted when first read.
+
+    Items that were never read, or whose JSON is unchanged, keep the
+    ciphertext they were loaded with, so saving them writes nothing.
+    """
+
+    def __init__(self, cipher: Fernet, tokens: dict[str, str]):
+        self._cipher = cipher
+        self._tokens = dict(tokens)
+        # Item id -> value, or None while still encrypted; keeps item order.
+        self._values: dict[str, Optional[dict[str, Any]]] = dict.fromkeys(tokens)
+        # JSON each decrypted item was loaded with.
+        self._loaded: dict[str, str] = {}
+
+    def __getitem__(self, item_id: str) -> dict[str, Any]:
+        value = self._values[item_id]
+        if value is None:
+            text = _unseal(self._cipher, self._tokens[item_id])
+            value = json.loads(text)
+            if not isinstance(value, dict):
+                raise PlaidError(
+                    "state_decryption_failed", "Plaid state could not be read"
+                )
+            self._loaded[item_id] = text
+            self._values[item_id] = value
+        return value
+
+    def __setitem__(self, item_id: str, value: dict[str, Any]) -> None:
+        self._values[item_id] = value
+
+    def __delitem__(self, item_id: str) -> None:
+        del self._values[item_id]
+        self._tokens.pop(item_id, None)
+        self._loaded.pop(item_id, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def remember(self, item_id: str, text: str, token: str) -> None:
+        """Records that `token` now stores the item as `text`."""
+        self._tokens[item_id] = token
+        self._loaded[item_id] = text
+
+    def unchanged_token(
+        self, item_id: str, value: Optional[dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Returns the item's stored ciphertext if it still holds `value`.
+
+        `value` defaults to the item's current value in this mapping.
+        """
+        if item_id not in self._tokens:
+            return None
+        current = self._values.get(item_id) if value is None else value
+        if current is None or self._loaded.get(item_id) == _dumps(current):
+            return self._tokens[item_id]
+        return None
+
+
 class SheetStateStore:
+    """Plaid state kept encrypted in a hidden sheet, one record per item.
+
+    Cells A2 and below hold the records in order as '<record>:<ciphertext>'
+    chunks of at most STATE_MAX_CHUNK_SIZE characters. Record 0 holds the
+    top-level fields and the item ids; record n holds the n-th item. Every
+    record is zlib-compressed JSON encrypted with Fernet.
+
+    Loads decrypt only the top-level record; items are decrypted on first
+    access (see StateItems). Saves re-encrypt only changed records and write
+    only the span of rows that differ from what the sheet holds, re-read right
+    before writing so rows another process wrote in the meantime are never
+    left interleaved with ours. States written as one blob by older versions
+    are still read.
+    """
+
     def __init__(self, spreadsheet: Any):
         self.spreadsheet = spreadsheet
+        # Cells A2... as last read or written, or None if unknown.
+        self._cells: Optional[list[str]] = None
+        # The top-level record as last read or written: (JSON, ciphertext).
+        self._header: Optional[tuple[str, str]] = None
+        # Items as last read, to reuse their ciphertext when saving a copy.
+        self._items: Optional[StateItems] = None
 
     def _worksheet(self) -> Any:
         try:
@@ -72,30 +205,62 @@ class SheetStateStore:
                 pass
             return ws
 
-    def load(self) -> dict[str, Any]:
-        try:
-            worksheet = self._worksheet()
-            if hasattr(worksheet, "get_values"):
-                cells = worksheet.get_values(
-                    "A2", f"A{STATE_MAX_CHUNKS + 1}", include_tailing_empty=False
-                )
-                chunks = []
-                for row in cells:
-                    if not row or not row[0]:
-                        break
-                    chunks.append(str(row[0]))
-                raw = "".join(chunks).strip()
-            else:  # Small test doubles and old pygsheets versions.
-                raw = str(worksheet.get_value(STATE_CELL) or "").strip()
-            if not raw:
-                return {"version": 1, "items": {}}
-            data = _fernet().decrypt(raw.encode())
-            value = json.loads(data.decode())
+    def _read_cells(self) -> list[str]:
+        worksheet = self._worksheet()
+        if not hasattr(worksheet, "get_values"):
+            # Small test doubles and old pygsheets versions.
+            return [str(worksheet.get_value(STATE_CELL) or "").strip()]
+        cells = []
+        for row in worksheet.get_values(
+            "A2", f"A{STATE_MAX_CHUNKS + 1}", include_tailing_empty=False
+        ):
+            if not row or not row[0]:
+                break
+            cells.append(str(row[0]))
+        return cells
+
+    @staticmethod
+    def _records(cells: list[str]) -> list[str]:
+        """Joins '<record>:<chunk>' cells back into one token per record."""
+        records: list[list[str]] = []
+        for cell in cells:
+            index, chunk = cell.split(":", 1)
+            if int(index) == len(records):
+                records.append([])
+            elif int(index) != len(records) - 1:
+                raise ValueError("state records out of order")
+            records[-1].append(chunk)
+        return ["".join(chunks) for chunks in records]
+
+    def _decode(self, cells: list[str], cipher: Fernet) -> dict[str, Any]:
+        if ":" not in cells[0]:
+            # A single blob written before states were split into records.
+            value = json.loads(cipher.decrypt("".join(cells).strip().encode()))
             if not isinstance(value, dict) or not isinstance(
                 value.get("items", {}), dict
             ):
                 raise ValueError("invalid state shape")
             return value
+        header_token, *item_tokens = self._records(cells)
+        header_text = _unseal(cipher, header_token)
+        header = json.loads(header_text)
+        item_ids = header.pop("item_ids")
+        if len(item_ids) != len(item_tokens):
+            raise ValueError("invalid state shape")
+        self._header = (header_text, header_token)
+        self._items = StateItems(cipher, dict(zip(item_ids, item_tokens)))
+        return {**header, "items": self._items}
+
+    def load(self) -> dict[str, Any]:
+        try:
+            cipher = _fernet()
+            cells = [cell for cell in self._read_cells() if cell]
+            self._cells = cells
+            self._header = None
+            self._items = None
+            if not cells:
+                return {"version": 1, "items": {}}
+            return self._decode(cells, cipher)
         except InvalidToken as exc:
             raise PlaidError(
                 "state_decryption_failed", "Plaid state cannot be decrypted"
@@ -107,29 +272,79 @@ class SheetStateStore:
                 "state_decryption_failed", "Plaid state could not be read"
             ) from exc
 
-    def save(self, state: dict[str, Any]) -> None:
-        encrypted = (
-            _fernet()
-            .encrypt(json.dumps(state, separators=(",", ":")).encode())
-            .decode()
+    def _tokens(self, state: dict[str, Any], cipher: Fernet) -> list[str]:
+        """Returns the ciphertext of each record, reusing unchanged ones."""
+        items = state.get("items", {})
+        header_text = _dumps(
+            {
+                **{key: value for key, value in state.items() if key != "items"},
+                "item_ids": list(items),
+            }
         )
-        chunks = [
-            encrypted[offset : offset + STATE_MAX_CHUNK_SIZE]
-            for offset in range(0, len(encrypted), STATE_MAX_CHUNK_SIZE)
+        if self._header is not None and self._header[0] == header_text:
+            header_token = self._header[1]
+        else:
+            header_token = _seal(cipher, header_text)
+        self._header = (header_text, header_token)
+        tokens = [header_token]
+        lazy = isinstance(items, StateItems)
+        known = items if lazy else self._items
+        for item_id in items:
+            token = None
+            if known is not None:
+                token = known.unchanged_token(item_id, None if lazy else items[item_id])
+            if token is None:
+                text = _dumps(items[item_id])
+                token = _seal(cipher, text)
+                if known is not None:
+                    known.remember(item_id, text, token)
+            tokens.append(token)
+        return tokens
+
+    def save(self, state: dict[str, Any]) -> None:
+        cells = [
+            f"{index}:{token[offset : offset + STATE_MAX_CHUNK_SIZE]}"
+            for index, token in enumerate(self._tokens(state, _fernet()))
+            for offset in range(0, len(token), STATE_MAX_CHUNK_SIZE)
         ]
-        if len(chunks) > STATE_MAX_CHUNKS:
+        if len(cells) > STATE_MAX_CHUNKS:
             raise PlaidError(
                 "state_decryption_failed", "Plaid state is too large to store"
             )
-        # Clear every remaining state cell so a later, smaller save cannot leave
-        # encrypted fragments that a future read might accidentally consume.
-        self._worksheet().update_values(
-            STATE_CELL,
-            [[chunk] for chunk in chunks] + [[""]] * (STATE_MAX_CHUNKS - len(chunks)),
-        )
+        # Blank every row a previous, larger state used, so a later read cannot
+        # consume stale encrypted fragments. If the sheet's contents are not
+        # known, blank all of them. Otherwise diff against the sheet as it is
+        # now rather than as last seen: another process may have saved a state
+        # with different chunk counts, and a partial write over its rows would
+        # mix chunks of both into unreadable records.
+        if self._cells is None:
+            previous = [""] * STATE_MAX_CHUNKS
+        else:
+            previous = self._read_cells()
+        size = max(len(cells), len(previous))
+        padded = cells + [""] * (size - len(cells))
+        changed = [
+            row
+            for row in range(size)
+            if row >= len(previous) or padded[row] != previous[row]
+        ]
+        if changed:
+            first, last = changed[0], changed[-1]
+            self._worksheet().update_values(
+                f"A{first + 2}", [[cell] for cell in padded[first : last + 1]]
+            )
+        self._cells = cells
 
 
 class PlaidClient:
+    """Plaid API client sharing one pooled keep-alive session.
+
+    Calls to RETRYABLE_PATHS that fail with a connection error, a timeout or a
+    RETRYABLE_STATUSES response are retried up to MAX_RETRIES times with
+    jittered exponential backoff, honoring Plaid's Retry-After header.
+    Per-endpoint latencies are collected in `latencies`.
+    """
+
     def __init__(self) -> None:
         env = os.getenv("PLAID_ENV", "production")
         base_url = {
@@ -142,6 +357,72 @@ class PlaidClient:
                 "sync_failed", "PLAID_ENV must be sandbox, development, or production"
             )
         self.base_url: str = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Seconds each completed request took, by path; shared by sync threads.
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self._latency_lock = threading.Lock()
+
+    def _record_latency(self, path: str, seconds: float) -> None:
+        with self._latency_lock:
+            self.latencies[path].append(seconds)
+
+    def log_latencies(self) -> None:
+        """Logs the request count and mean and max latency of each endpoint."""
+        with self._latency_lock:
+            summary = {path: list(times) for path, times in self.latencies.items()}
+        for path, times in sorted(summary.items()):
+            logger.info(
+                f"Plaid {path}: {len(times)} requests, "
+                f"mean {sum(times) / len(times):.2f}s, max {max(times):.2f}s"
+            )
+
+    def _send(self, path: str, payload: dict[str, Any]) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            return self.session.post(
+                self.base_url + path, json=payload, timeout=REQUEST_TIMEOUT_SECONDS
+            )
+        finally:
+            self._record_latency(path, time.perf_counter() - start)
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[requests.Response]) -> float:
+        """Returns how long to wait before retry number `attempt` (from 0)."""
+        if response is not None:
+            try:
+                return min(float(response.headers["Retry-After"]), RETRY_MAX_SECONDS)
+            except (KeyError, ValueError):
+                pass
+        ceiling = min(RETRY_BASE_SECONDS * 2**attempt, RETRY_MAX_SECONDS)
+        return random.uniform(0, ceiling)
+
+    def _post_with_retries(
+        self, path: str, payload: dict[str, Any]
+    ) -> requests.Response:
+        retries = MAX_RETRIES if path in RETRYABLE_PATHS else 0
+        attempt = 0
+        while True:
+            response: Optional[requests.Response] = None
+            try:
+                response = self._send(path, payload)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+            else:
+                if attempt >= retries or response.status_code not in RETRYABLE_STATUSES:
+                    return response
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+            logger.warning(
+                f"Plaid {path} failed transiently; retrying in {delay:.1f}s "
+                f"({attempt}/{retries})."
+            )
+            time.sleep(delay)
 
     def _post(self, path: str, body: dict[str, Any]) -> dict[str, Any]:
         payload = {
@@ -150,7 +431,7 @@ class PlaidClient:
             **body,
         }
         try:
-            response = requests.post(self.base_url + path, json=payload, timeout=45)
+            response = self._post_with_retries(path, payload)
             data = response.json()
         except requests.RequestException as exc:
             raise PlaidError("sync_failed", "Plaid request failed") from exc
@@ -165,6 +446,11 @@ class PlaidClient:
                     "reauthentication_required",
                     "A Plaid connection needs to be reauthenticated",
                 )
+            if code == "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION":
+                raise PlaidError(
+                    "sync_restart_required",
+                    "Plaid data changed mid-sync; the sync must restart",
+                )
             raise PlaidError(
                 "sync_failed", str(data.get("error_message", "Plaid request failed"))
             )
@@ -191,24 +477,44 @@ class PlaidClient:
     def exchange_public_token(self, public_token: str) -> dict[str, Any]:
         return self._post("/item/public_token/exchange", {"public_token": public_token})
 
+    def sync_pages(
+        self, access_token: str, cursor: str = ""
+    ) -> Iterator[dict[str, Any]]:
+        """Yields /transactions/sync responses one page at a time.
+
+        Args:
+          access_token: The item's access token.
+          cursor: Cursor to continue from; empty for the item's full history.
+
+        Yields:
+          Each response; its 'next_cursor' resumes after that page.
+        """
+        has_more = True
+        while has_more:
+            page = self._post(
+                "/transactions/sync",
+                {
+                    "access_token": access_token,
+                    "cursor": cursor,
+                    "count": SYNC_PAGE_SIZE,
+                },
+            )
+            yield page
+            cursor = str(page.get("next_cursor", ""))
+            has_more = bool(page.get("has_more"))
+
     def sync(
         self, access_token: str, cursor: str = ""
     ) -> tuple[list[dict[str, Any]], list[dict[str, Any]], list[dict[str, Any]], str]:
         added: list[dict[str, Any]] = []
         modified: list[dict[str, Any]] = []
         removed: list[dict[str, Any]] = []
-        has_more = True
         next_cursor = cursor
-        while has_more:
-            data = self._post(
-                "/transactions/sync",
-                {"access_token": access_token, "cursor": next_cursor, "count": 500},
-            )
-            added.extend(data.get("added", []))
-            modified.extend(data.get("modified", []))
-            removed.extend(data.get("removed", []))
-            next_cursor = str(data.get("next_cursor", ""))
-            has_more = bool(data.get("has_more"))
+        for page in self.sync_pages(access_token, cursor):
+            added.extend(page.get("added", []))
+            modified.extend(page.get("modified", []))
+            removed.extend(page.get("removed", []))
+            next_cursor = str(page.get("next_cursor", ""))
         return added, modified, removed, next_cursor
 
     def accounts(self, access_token: str) -> list[dict[str, Any]]:
@@ -259,6 +565,210 @@ def transaction_frame(
     return remote._cleanTxns(remote.ApplyCategoryRules(frame))
 
 
+def account_summary(account: dict[str, Any]) -> dict[str, Any]:
+    """Returns the parts of a Plaid account the Accounts tab is built from."""
+    summary: dict[str, Any] = {
+        key: account[key]
+        for key in ("account_id", "name", "official_name", "type", "subtype")
+        if key in account
+    }
+    summary["balances"] = {"current": (account.get("balances") or {}).get("current")}
+    return summary
+
+
+def cached_accounts(
+    item: dict[str, Any], now: Optional[datetime] = None
+) -> Optional[list[dict[str, Any]]]:
+    """Returns the item's cached accounts, or None if missing or stale."""
+    cache = item.get("accounts_cache") or {}
+    try:
+        fetched_at = datetime.fromisoformat(str(cache["fetched_at"]))
+    except (KeyError, ValueError):
+        return None
+    if (now or datetime.now(timezone.utc)) - fetched_at > ACCOUNTS_TTL:
+        return None
+    return list(cache.get("accounts", []))
+
+
+def cache_accounts(
+    item: dict[str, Any], accounts: list[dict[str, Any]], fetched_at: datetime
+) -> None:
+    """Stores account summaries in the item, which is saved encrypted."""
+    item["accounts_cache"] = {
+        "fetched_at": fetched_at.isoformat(),
+        "accounts": [account_summary(account) for account in accounts],
+    }
+
+
+SYNC_CHECKPOINT_KIND = "plaid-sync"
+SYNC_PAGE_KIND = f"{SYNC_CHECKPOINT_KIND}-page"
+
+
+@dataclass
+class SyncProgress:
+    """Transactions synced for one item that are not in the sheet yet.
+
+    Pages are converted with transaction_frame as they arrive, so only the
+    compact frames are kept rather than Plaid's JSON, and merged as they
+    arrive: rows a later page modifies or removes are dropped from the frames
+    of earlier pages. Each page is checkpointed, encrypted, to the config cache
+    as its own record, followed by a small progress record holding the cursor
+    and page count; a sync that is interrupted resumes from the last page it
+    fetched. Checkpoints are keyed by the cursor the item's sync started from,
+    which only advances once the merged transactions and new cursor have been
+    saved.
+    """
+
+    item_id: str
+    start_cursor: str
+    cursor: str
+    frames: list[pd.DataFrame] = field(default_factory=list)
+    modified_ids: set[str] = field(default_factory=set)
+    removed_ids: set[str] = field(default_factory=set)
+    # Accounts from the latest page that listed them, as account_summary dicts.
+    accounts: list[dict[str, Any]] = field(default_factory=list)
+    pages: int = 0
+    # Whether Plaid's JSON is also kept, for items pending review: their
+    # account selection can still change, which filters the rows again.
+    keep_transactions: bool = False
+    # Plaid's added and modified transactions by ID, if keep_transactions.
+    transactions: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # The index into frames of the frame holding each transaction ID.
+    _frame_of: dict[str, int] = field(default_factory=dict, repr=False)
+
+    @staticmethod
+    def _cache_key(value: str) -> str:
+        return hashlib.sha256(value.encode()).hexdigest()[:16]
+
+    @property
+    def _kind(self) -> str:
+        return f"{SYNC_CHECKPOINT_KIND}-{self._cache_key(self.item_id)}"
+
+    def _page_kind(self, index: int) -> str:
+        # Not prefixed by _kind, so writing the progress record, which drops
+        # records of other kinds starting with it, keeps the pages.
+        return f"{SYNC_PAGE_KIND}-{self._cache_key(self.item_id)}-{index}"
+
+    def _write(self, kind: str, record: dict[str, Any]) -> None:
+        token = _fernet().encrypt(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+        config.write_cache(kind, self._cache_key(self.start_cursor), token)
+
+    def _read(self, kind: str) -> Optional[dict[str, Any]]:
+        token = config.read_cache(kind, self._cache_key(self.start_cursor))
+        if not isinstance(token, bytes):
+            return None
+        try:
+            return pickle.loads(_fernet().decrypt(token))
+        except InvalidToken:
+            logger.warning(
+                f"Ignoring undecryptable sync checkpoint for {self.item_id}."
+            )
+            return None
+
+    @classmethod
+    def resume(
+        cls, item_id: str, cursor: str, keep_transactions: bool = False
+    ) -> "SyncProgress":
+        """Returns the checkpointed progress from `cursor`, or a fresh start."""
+        progress = cls(item_id, cursor, cursor, keep_transactions=keep_transactions)
+        saved = progress._read(progress._kind)
+        if saved is None or saved.get("keep_transactions", False) != keep_transactions:
+            return progress
+        records = []
+        for index in range(saved["pages"]):
+            record = progress._read(progress._page_kind(index))
+            if record is None:
+                logger.warning(f"Ignoring incomplete sync checkpoint for {item_id}.")
+                return progress
+            records.append(record)
+        logger.info(f"Resuming Plaid sync of {item_id} from a checkpoint.")
+        for record in records:
+            progress._fold(record)
+        progress.cursor = saved["cursor"]
+        progress.pages = saved["pages"]
+        return progress
+
+    def _fold(self, record: dict[str, Any]) -> None:
+        superseded = record["modified_ids"] | record["removed_ids"]
+        stale: defaultdict[int, set[str]] = defaultdict(set)
+        for txn_id in superseded & self._frame_of.keys():
+            stale[self._frame_of.pop(txn_id)].add(txn_id)
+        for index, ids in stale.items():
+            frame = self.frames[index]
+            self.frames[index] = frame[~frame["ID"].isin(ids)]
+        for frame in record["frames"]:
+            self._frame_of.update(dict.fromkeys(frame["ID"], len(self.frames)))
+            self.frames.append(frame)
+        for txn_id in superseded:
+            self.transactions.pop(txn_id, None)
+        self.transactions.update(
+            ("plaid:" + str(t.get("transaction_id", "")), t)
+            for t in record.get("transactions", [])
+        )
+        self.modified_ids.update(record["modified_ids"])
+        self.removed_ids.update(record["removed_ids"])
+        if record["accounts"]:
+            self.accounts = record["accounts"]
+
+    def add_page(self, page: dict[str, Any], item: dict[str, Any]) -> None:
+        """Folds one /transactions/sync page in and checkpoints it."""
+        frames = [
+            frame
+            for frame in (
+                transaction_frame(page.get(key, []), item)
+                for key in ("added", "modified")
+            )
+            if not frame.empty
+        ]
+        record = {
+            "frames": frames,
+            "modified_ids": {
+                "plaid:" + str(t.get("transaction_id", ""))
+                for t in page.get("modified", [])
+            },
+            "removed_ids": {
+                "plaid:" + str(t.get("transaction_id", ""))
+                for t in page.get("removed", [])
+            },
+            "accounts": [account_summary(a) for a in page.get("accounts") or []],
+            "transactions": (
+                [*page.get("added", []), *page.get("modified", [])]
+                if self.keep_transactions
+                else []
+            ),
+        }
+        self._fold(record)
+        self.cursor = str(page.get("next_cursor", ""))
+        # The page is written before the progress record that counts it, so
+        # an interruption in between only leaves an unreferenced page.
+        self._write(self._page_kind(self.pages), record)
+        self.pages += 1
+        self._write(
+            self._kind,
+            {
+                "cursor": self.cursor,
+                "pages": self.pages,
+                "keep_transactions": self.keep_transactions,
+            },
+        )
+
+    def additions(self) -> pd.DataFrame:
+        """Returns the added and modified rows that are still current."""
+        frames = [frame for frame in self.frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=config.GLOBAL.COLUMN_NAMES)
+        return pd.concat(frames, ignore_index=True)
+
+    def discard(self) -> None:
+        """Deletes the checkpoint, e.g. once the sync has been saved."""
+        config.cache_path(self._kind, self._cache_key(self.start_cursor)).unlink(
+            missing_ok=True
+        )
+        item_key = self._cache_key(self.item_id)
+        for path in config.CACHE_DIR.glob(f"{SYNC_PAGE_KIND}-{item_key}-*.pkl"):
+            path.unlink(missing_ok=True)
+
+
 def overlap_fingerprint(row: pd.Series) -> str:
     merchant_or_description = str(row.get("Merchant") or row.get("Description", ""))
     return "|".join(
@@ -271,21 +781,105 @@ def overlap_fingerprint(row: pd.Series) -> str:
     )
 
 
-def _overlap_components(row: pd.Series) -> tuple[str, float, str]:
-    """Return the stable portions of an initial-import overlap key."""
-    aliases = getattr(config.GLOBAL, "HISTORICAL_ACCOUNT_ALIASES", {})
-    account = str(row.get("Account", ""))
-    canonical_account = aliases.get(account, account)
-    return (
-        remote._Normalize(canonical_account).lower(),
-        round(float(row.get("Amount", 0)), 2),
-        _overlap_merchant(row),
-    )
+def overlap_fingerprints(txns: pd.DataFrame) -> pd.Series:
+    """Column-wise ``overlap_fingerprint``, normalizing each distinct value once."""
+    map_unique = normalization.map_unique
+    merchant = txns["Merchant"].astype(object)
+    merchant = merchant.where(merchant.map(bool), txns["Description"])
+    parts = [
+        map_unique(txns["Account"], lambda v: remote._Normalize(str(v)).lower()),
+        map_unique(txns["Date"], str),
+        map_unique(txns["Amount"], lambda v: f"{float(v):.2f}"),
+        map_unique(merchant, lambda v: remote._NormalizeMerchant(str(v)).lower()),
+    ]
+    return parts[0].str.cat(pd.concat(parts[1:], axis=1), sep="|")
 
 
-def _overlap_merchant(row: pd.Series) -> str:
-    merchant_or_description = str(row.get("Merchant") or row.get("Description", ""))
-    return remote._NormalizeMerchant(merchant_or_description).lower()
+# Columns overlap_fingerprint reads; rows hashing equal share a fingerprint.
+FINGERPRINT_COLUMNS = ["Account", "Date", "Amount", "Merchant", "Description"]
+FINGERPRINT_CACHE_KIND = "overlap-fingerprints"
+# overlap_fingerprint lives here; rules.cache_key covers the normalization code.
+FINGERPRINT_CODE_VERSION = config.source_hash(__file__)
+
+
+class FingerprintIndex:
+    """Overlap fingerprints of sheet rows, persisted between syncs.
+
+    Fingerprints are keyed by a 64-bit hash of the columns they are derived
+    from, so only rows added or edited since the last sync are fingerprinted.
+    The index is stored next to the parsed config, keyed like the compiled
+    rules plus this module's code, because fingerprints depend on the merchant
+    normalization rules and on the code that derives them.
+    """
+
+    def __init__(self, fingerprints: Optional[dict[int, str]] = None):
+        self._fingerprints: dict[int, str] = dict(fingerprints or {})
+        self._dirty = False
+
+    @classmethod
+    def load(cls) -> "FingerprintIndex":
+        """Return the persisted index, or an empty one if it is unusable."""
+        settings = config.GLOBAL
+        if settings.unchanged(rules.RULE_ATTRS):
+            cached = config.read_cache(FINGERPRINT_CACHE_KIND, cls._cache_key())
+            if isinstance(cached, dict):
+                return cls(cached)
+        return cls()
+
+    def save(self) -> None:
+        """Persist the index if it changed and the rules match config.yaml."""
+        settings = config.GLOBAL
+        if self._dirty and settings.unchanged(rules.RULE_ATTRS):
+            config.write_cache(
+                FINGERPRINT_CACHE_KIND, self._cache_key(), self._fingerprints
+            )
+            self._dirty = False
+
+    @staticmethod
+    def _cache_key() -> str:
+        return f"{rules.cache_key(config.GLOBAL)}-{FINGERPRINT_CODE_VERSION}"
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    @staticmethod
+    def keys(txns: pd.DataFrame) -> np.ndarray:
+        """Return the index key of each row, for fingerprints and retain."""
+        if txns.empty:
+            return np.array([], dtype=np.uint64)
+        return pd.util.hash_pandas_object(
+            txns[FINGERPRINT_COLUMNS], index=False
+        ).to_numpy()
+
+    def fingerprints(
+        self, txns: pd.DataFrame, keys: Optional[np.ndarray] = None
+    ) -> pd.Series:
+        """Return the fingerprint of each row, computing only unseen rows.
+
+        Args:
+          txns: The rows to fingerprint.
+          keys: The rows' ``keys``, if the caller already computed them.
+        """
+        if txns.empty:
+            return pd.Series([], index=txns.index, dtype=object)
+        row_keys = pd.Series(
+            self.keys(txns) if keys is None else keys, index=txns.index
+        )
+        known = row_keys.map(self._fingerprints).astype(object)
+        unseen = known.isna()
+        if unseen.any():
+            computed = overlap_fingerprints(txns[unseen])
+            known[unseen] = computed
+            self._fingerprints.update(zip(row_keys[unseen].tolist(), computed.tolist()))
+            self._dirty = True
+        return known
+
+    def retain(self, keys: np.ndarray) -> None:
+        """Forget rows whose keys are not in ``keys``, e.g. removed in the sheet."""
+        stale = self._fingerprints.keys() - set(keys.tolist())
+        for key in stale:
+            del self._fingerprints[key]
+        self._dirty = self._dirty or bool(stale)
 
 
 def _merchants_overlap(left: str, right: str) -> bool:
@@ -305,40 +899,100 @@ def _merchants_overlap(left: str, right: str) -> bool:
     )
 
 
+def _overlap_keys(txns: pd.DataFrame) -> pd.DataFrame:
+    """Return the initial-import overlap key of each dated row.
+
+    Keys combine the historical account alias, the amount in cents, the
+    posting day and the normalized merchant (or description).  Each column is
+    normalized once per distinct value rather than once per row.
+    """
+    aliases = getattr(config.GLOBAL, "HISTORICAL_ACCOUNT_ALIASES", {})
+    dates = pd.to_datetime(txns["Date"], errors="coerce")
+    dated = txns[dates.notna()]
+    merchant = dated["Merchant"].astype(object)
+    merchant = merchant.where(merchant.map(bool), dated["Description"])
+    map_unique = normalization.map_unique
+    return pd.DataFrame(
+        {
+            "account": map_unique(
+                dated["Account"],
+                lambda account: remote._Normalize(
+                    aliases.get(str(account), str(account))
+                ).lower(),
+            ),
+            "amount": map_unique(dated["Amount"], lambda value: round(float(value), 2)),
+            "day": dates[dates.notna()].to_numpy().astype("datetime64[D]").astype(int),
+            "merchant": map_unique(
+                merchant, lambda value: remote._NormalizeMerchant(str(value)).lower()
+            ),
+        },
+        index=dated.index,
+    )
+
+
 def _tolerant_overlap_pairs(
     existing: pd.DataFrame, candidate: pd.DataFrame, max_date_delta_days: int = 3
 ) -> list[tuple[int, Hashable, Hashable]]:
-    """Return all conservative candidate/history overlap pairs."""
+    """Return all conservative candidate/history overlap pairs.
+
+    Each candidate is probed at every day of its date window and joined to the
+    history on (account, amount, day), so the work grows with the number of
+    plausible pairs instead of with history size times candidates.
+    """
     if existing.empty or candidate.empty:
         return []
 
-    old = existing.copy()
-    new = candidate.copy()
-    old["_overlap_date"] = pd.to_datetime(old["Date"], errors="coerce")
-    new["_overlap_date"] = pd.to_datetime(new["Date"], errors="coerce")
-    old = old[old["_overlap_date"].notna()]
-    new = new[new["_overlap_date"].notna()]
-
-    buckets: dict[tuple[str, float], list[tuple[Hashable, pd.Timestamp, str]]] = {}
-    for old_index, row in old.iterrows():
-        account, amount, merchant = _overlap_components(row)
-        buckets.setdefault((account, amount), []).append(
-            (old_index, row["_overlap_date"], merchant)
+    old = _overlap_keys(existing).rename_axis("old_index").reset_index()
+    new = _overlap_keys(candidate).rename_axis("new_index").reset_index()
+    # Fuzzy merchant matches always get a one-day window; see below.
+    window = max(max_date_delta_days, 1)
+    offsets = np.arange(-window, window + 1)
+    probes = new.loc[new.index.repeat(len(offsets))]
+    probes = probes.assign(
+        day=probes["day"].to_numpy() + np.tile(offsets, len(new)),
+        date_delta=np.tile(np.abs(offsets), len(new)),
+    )
+    pairs = probes.merge(
+        old, on=["account", "amount", "day"], suffixes=("_new", "_old")
+    )
+
+    merchant_new = pairs["merchant_new"].to_numpy()
+    merchant_old = pairs["merchant_old"].to_numpy()
+    date_delta = pairs["date_delta"].to_numpy()
+    same_merchant = (merchant_new == merchant_old) & (merchant_new != "")
+    # A fuzzy provider-label match is only safe across an adjacent posting
+    # date; exact labels retain the established three-day window for
+    # pending/posted timing differences.
+    keep = same_merchant & (date_delta <= max_date_delta_days)
+    fuzzy = ~same_merchant & (date_delta <= 1)
+    keep[fuzzy] = [
+        _merchants_overlap(left, right)
+        for left, right in zip(merchant_new[fuzzy], merchant_old[fuzzy])
+    ]
+    kept = pairs[keep]
+    return list(
+        zip(
+            kept["date_delta"].tolist(),
+            kept["new_index"].tolist(),
+            kept["old_index"].tolist(),
         )
+    )
 
-    possible: list[tuple[int, Hashable, Hashable]] = []
-    for new_index, row in new.iterrows():
-        account, amount, merchant = _overlap_components(row)
-        for old_index, old_date, old_merchant in buckets.get((account, amount), []):
-            date_delta = abs((row["_overlap_date"] - old_date).days)
-            merchant_matches = _merchants_overlap(merchant, old_merchant)
-            # A fuzzy provider-label match is only safe across an adjacent
-            # posting date; exact labels retain the established three-day
-            # window for pending/posted timing differences.
-            allowed_date_delta = max_date_delta_days if merchant == old_merchant else 1
-            if date_delta <= allowed_date_delta and merchant_matches:
-                possible.append((date_delta, new_index, old_index))
-    return possible
+
+def _one_to_one(
+    pairs: list[tuple[int, Hashable, Hashable]],
+) -> list[tuple[Hashable, Hashable]]:
+    """Consume each row at most once, nearest posting dates first."""
+    matched_new: set[Hashable] = set()
+    matched_old: set[Hashable] = set()
+    matches: list[tuple[Hashable, Hashable]] = []
+    for _, new_index, old_index in sorted(pairs):
+        if new_index in matched_new or old_index in matched_old:
+            continue
+        matched_new.add(new_index)
+        matched_old.add(old_index)
+        matches.append((old_index, new_index))
+    return matches
 
 
 def tolerant_overlap_matches(
@@ -351,27 +1005,18 @@ def tolerant_overlap_matches(
     alias, amount, a small date window, and conservative merchant comparison.
     Each row is consumed at most once so repeated same-value purchases remain.
     """
-
-    matched_new: set[Hashable] = set()
-    matched_old: set[Hashable] = set()
-    matches: list[tuple[Hashable, Hashable]] = []
-    for _, new_index, old_index in sorted(
+    return _one_to_one(
         _tolerant_overlap_pairs(existing, candidate, max_date_delta_days)
-    ):
-        if new_index in matched_new or old_index in matched_old:
-            continue
-        matched_new.add(new_index)
-        matched_old.add(old_index)
-        matches.append((old_index, new_index))
-    return matches
+    )
 
 
 def reconcile(existing: pd.DataFrame, candidate: pd.DataFrame) -> dict[str, int]:
-    matches = tolerant_overlap_matches(existing, candidate)
+    pairs = _tolerant_overlap_pairs(existing, candidate)
+    matches = _one_to_one(pairs)
     # A candidate with more than one otherwise-valid historical row deserves
     # review, even though the one-to-one matcher chooses the nearest row.
     possible_counts: dict[Hashable, int] = {}
-    for _, candidate_index, _ in _tolerant_overlap_pairs(existing, candidate):
+    for _, candidate_index, _ in pairs:
         possible_counts[candidate_index] = possible_counts.get(candidate_index, 0) + 1
     return {
         "matched_overlap": len(matches),
@@ -392,7 +1037,25 @@ def merge_transactions(
     removed_ids: set[str],
     *,
     initial_import: bool = False,
+    fingerprints: Optional[FingerprintIndex] = None,
 ) -> pd.DataFrame:
+    """Apply one sync's changes to the existing raw transactions.
+
+    Additions whose overlap fingerprint is already present are dropped; on an
+    initial import the tolerant matcher is used instead.
+
+    Args:
+      existing: The raw transactions tab.
+      additions: Added and modified transactions from the sync.
+      modified_ids: IDs of modified transactions, replaced by `additions`.
+      removed_ids: IDs of removed transactions.
+      initial_import: Whether this is the first import of an item.
+      fingerprints: The fingerprint index to use; defaults to the persisted
+        one, which is saved with the merged rows.
+
+    Returns:
+      The merged transactions, sorted by date.
+    """
     result = existing.copy()
     if "ID" in result:
         result = result[~result["ID"].isin(removed_ids | modified_ids)]
@@ -404,10 +1067,15 @@ def merge_transactions(
             }
             additions = additions.drop(index=list(matched_additions))
         else:
-            current_fps = set(result.apply(overlap_fingerprint, axis=1))
-            additions = additions[
-                ~additions.apply(overlap_fingerprint, axis=1).isin(current_fps)
-            ]
+            index = FingerprintIndex.load() if fingerprints is None else fingerprints
+            # Each row is hashed once; the keys also tell retain what is left.
+            result_keys = index.keys(result)
+            addition_keys = index.keys(additions)
+            current_fps = set(index.fingerprints(result, result_keys))
+            new = ~index.fingerprints(additions, addition_keys).isin(current_fps)
+            additions = additions[new]
+            index.retain(np.concatenate([result_keys, addition_keys[new.to_numpy()]]))
+            index.save()
         result = pd.concat([result, additions], ignore_index=True)
     return result.sort_values("Date", ascending=True, ignore_index=True)
 
@@ -0,0 +1,386 @@
+"""Plaid state on the local volume, replicated to the Google Sheet.
+
+Reading the encrypted state from the sheet costs a Sheets API round trip on
+every Plaid endpoint and scrape. When ``PLAID_STATE_DIR`` is set, the state is
+instead kept in a SQLite database there, and ``Plaid State`` in the sheet
+becomes a replica that is written asynchronously.
+
+The web and scraper process groups each have their own volume, so each keeps
+its own local copy and reconciles it with the sheet: local changes are pushed
+and changes made by the other process are pulled. When both sides changed
+since the last reconcile, the states are merged field by field against the
+last replicated state, with local edits winning where both changed a value.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import plaid_source
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the local state database; unset keeps state in the sheet.
+STATE_DIR: Optional[Path] = (
+    Path(os.environ["PLAID_STATE_DIR"]) if os.getenv("PLAID_STATE_DIR") else None
+)
+STATE_DB_NAME = "plaid_state.sqlite3"
+# A load older than this since the last reconcile pulls from the sheet in the
+# background; the load itself is still served locally.
+REFRESH_SECONDS = 60.0
+# Reconcile attempts when local saves keep racing with the merge.
+MAX_RECONCILE_ATTEMPTS = 3
+
+_MISSING = object()
+_reconcile_lock = threading.Lock()
+_queue_lock = threading.Lock()
+# Stores waiting for background replication, by database path.
+_queued: dict[Path, "ReplicatedStateStore"] = {}
+_worker: Optional[threading.Thread] = None
+# When each database was last reconciled, from time.monotonic().
+_reconciled_at: dict[Path, float] = {}
+
+
+def revision(state: dict[str, Any]) -> int:
+    """Returns the state's revision; states without one are revision 0."""
+    return int(state.get("revision", 0))
+
+
+def _plain(state: dict[str, Any]) -> dict[str, Any]:
+    """Returns `state` with its items decrypted into a plain dict."""
+    return {**state, "items": dict(state.get("items", {}).items())}
+
+
+def digest(state: dict[str, Any]) -> str:
+    """Returns a hash of the state's content, revision included.
+
+    Two process groups can both push the same revision with different content
+    to the sheet, which has no compare-and-swap, so equal revisions do not
+    mean equal states.
+    """
+    text = json.dumps(_plain(state), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def merge_states(base: Any, ours: Any, theirs: Any) -> Any:
+    """Three-way merges two edits of `base`, recursing into dicts.
+
+    Args:
+      base: The value both edits started from, or _MISSING.
+      ours: The local edit, or _MISSING if it deleted the value.
+      theirs: The replica's edit, or _MISSING if it deleted the value.
+
+    Returns:
+      The edit that changed the value, the merged dict if both changed a
+      dict, or `ours` if both changed anything else.
+    """
+    if ours == base:
+        return theirs
+    if theirs == base or theirs == ours:
+        return ours
+    if not (isinstance(ours, dict) and isinstance(theirs, dict)):
+        return ours
+    base_dict = base if isinstance(base, dict) else {}
+    merged = {}
+    for key in dict.fromkeys([*theirs, *ours]):
+        value = merge_states(
+            base_dict.get(key, _MISSING),
+            ours.get(key, _MISSING),
+            theirs.get(key, _MISSING),
+        )
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
+
+
+class LocalStateStore:
+    """Versioned, encrypted state records in a SQLite database.
+
+    Records are named: STATE is the live state and REPLICA the state last
+    known to be in the sheet. Each record keeps its state's revision, so
+    writes can be compare-and-swap.
+    """
+
+    STATE = "state"
+    REPLICA = "replica"
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "name TEXT PRIMARY KEY, revision INTEGER NOT NULL, token TEXT NOT NULL)"
+        )
+        return connection
+
+    def read(self, name: str) -> Optional[dict[str, Any]]:
+        """Returns the named record, or None if it was never written."""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT token FROM records WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        value = json.loads(plaid_source._unseal(plaid_source._fernet(), row[0]))
+        return value if isinstance(value, dict) else None
+
+    def write(
+        self, name: str, state: dict[str, Any], expected: Optional[int] = None
+    ) -> None:
+        """Stores `state` under `name`.
+
+        Args:
+          name: The record to write.
+          state: The plain state, with its new revision.
+          expected: If set, the write only happens if the stored revision is
+            still `expected`; a missing record counts as revision 0.
+
+        Raises:
+          PlaidError: If the stored revision is not `expected`.
+        """
+        token = plaid_source._seal(plaid_source._fernet(), plaid_source._dumps(state))
+        with self._connect() as connection:
+            if expected is None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+                    (name, revision(state), token),
+                )
+                return
+            written = connection.execute(
+                "UPDATE records SET revision = ?, token = ? "
+                "WHERE name = ? AND revision = ?",
+                (revision(state), token, name, expected),
+            ).rowcount
+            if not written and expected == 0:
+                written = connection.execute(
+                    "INSERT OR IGNORE INTO records VALUES (?, ?, ?)",
+                    (name, revision(state), token),
+                ).rowcount
+        if not written:
+            raise plaid_source.PlaidError(
+                "state_conflict", "Plaid state changed concurrently; retry"
+            )
+
+
+class ReplicatedStateStore:
+    """A LocalStateStore primary with the Plaid State sheet as its replica.
+
+    It has the same load/save interface as plaid_source.SheetStateStore.
+    Saves are compare-and-swap on the revision the state was loaded at. When
+    the local state changed since, for example because a background reconcile
+    pulled the other process's edits, the save's edits are merged onto it.
+    """
+
+    def __init__(
+        self,
+        local: LocalStateStore,
+        open_replica: Callable[[], Any],
+        background: bool = True,
+    ):
+        """Initializes the store.
+
+        Args:
+          local: The primary store.
+          open_replica: Returns the spreadsheet holding the replica; only
+            called when the replica is read or written.
+          background: Whether to reconcile on a background thread. When
+            false, loads and saves reconcile before returning.
+        """
+        self.local = local
+        self._open_replica = open_replica
+        self.background = background
+        # States as loaded or saved, by revision, to rebase later saves on.
+        self._loaded: dict[int, dict[str, Any]] = {}
+
+    def load(self) -> dict[str, Any]:
+        if not self.background:
+            self.reconcile()
+        state = self.local.read(LocalStateStore.STATE)
+        if state is None:
+            self.reconcile()
+            state = self.local.read(LocalStateStore.STATE)
+        elif self.background:
+            last = _reconciled_at.get(self.local.path, float("-inf"))
+            if time.monotonic() - last > REFRESH_SECONDS:
+                _schedule(self)
+        state = state or {"version": 1, "items": {}}
+        self._loaded[revision(state)] = copy.deepcopy(state)
+        return state
+
+    def save(self, state: dict[str, Any]) -> None:
+        loaded = revision(state)
+        saved = {**_plain(state), "revision": loaded + 1}
+        try:
+            self.local.write(LocalStateStore.STATE, saved, expected=loaded)
+        except plaid_source.PlaidError as exc:
+            base = self._loaded.get(loaded)
+            if exc.code != "state_conflict" or base is None:
+                raise
+            saved = self._rebase(base, saved)
+            # The state object now also holds the changes merged in.
+            state.clear()
+            state.update(copy.deepcopy(saved))
+        # Later saves of the same state object continue from this revision.
+        state["revision"] = revision(saved)
+        self._loaded = {revision(saved): copy.deepcopy(saved)}
+        if self.background:
+            _schedule(self)
+        else:
+            self.reconcile()
+
+    def _rebase(self, base: dict[str, Any], ours: dict[str, Any]) -> dict[str, Any]:
+        """Merges the edit from `base` to `ours` onto the current local state.
+
+        Raises:
+          PlaidError: If the local state kept changing while merging.
+        """
+        for _ in range(MAX_RECONCILE_ATTEMPTS):
+            current = self.local.read(LocalStateStore.STATE) or {"revision": 0}
+            merged = merge_states(base, ours, current)
+            merged["revision"] = revision(current) + 1
+            try:
+                self.local.write(
+                    LocalStateStore.STATE, merged, expected=revision(current)
+                )
+            except plaid_source.PlaidError as exc:
+                if exc.code != "state_conflict":
+                    raise
+                continue
+            return merged
+        raise plaid_source.PlaidError(
+            "state_conflict", "Plaid state changed concurrently; retry"
+        )
+
+    def reconcile(self) -> None:
+        """Brings the local state and the sheet to the same merged state.
+
+        Raises:
+          PlaidError: If the sheet cannot be read or the merge kept losing
+            races with local saves.
+        """
+        with _reconcile_lock:
+            replica = plaid_source.SheetStateStore(self._open_replica())
+            for _ in range(MAX_RECONCILE_ATTEMPTS):
+                try:
+                    self._reconcile_once(replica)
+                except plaid_source.PlaidError as exc:
+                    if exc.code != "state_conflict":
+                        raise
+                    continue
+                _reconciled_at[self.local.path] = time.monotonic()
+                return
+        raise plaid_source.PlaidError(
+            "state_conflict", "Plaid state kept changing during replication"
+        )
+
+    def _reconcile_once(self, replica: plaid_source.SheetStateStore) -> None:
+        local = self.local
+        theirs = _plain(replica.load())
+        ours = local.read(LocalStateStore.STATE)
+        base = local.read(LocalStateStore.REPLICA)
+        if base is None:
+            # Nothing was replicated from this volume yet, so merge any local
+            # state with the sheet's as if they had no common ancestor.
+            base = {"revision": -1}
+        if ours is None:
+            # First use of this volume: adopt the sheet's state.
+            local.write(LocalStateStore.STATE, theirs, expected=0)
+        elif digest(ours) == digest(base):
+            # No local edits since the last reconcile.
+            if digest(theirs) != digest(base):
+                local.write(LocalStateStore.STATE, theirs, expected=revision(ours))
+        elif digest(theirs) == digest(base):
+            self._push(replica, theirs, ours)
+            theirs = ours
+        else:
+            merged = merge_states(base, ours, theirs)
+            merged["revision"] = max(revision(ours), revision(theirs)) + 1
+            local.write(LocalStateStore.STATE, merged, expected=revision(ours))
+            self._push(replica, theirs, merged)
+            theirs = merged
+        local.write(LocalStateStore.REPLICA, theirs)
+
+    @staticmethod
+    def _push(
+        replica: plaid_source.SheetStateStore,
+        theirs: dict[str, Any],
+        state: dict[str, Any],
+    ) -> None:
+        """Writes `state` to the sheet if the sheet still holds `theirs`.
+
+        Raises:
+          PlaidError: If the sheet changed since `theirs` was read, so the
+            reconcile is retried against what it holds now.
+        """
+        if digest(_plain(replica.load())) != digest(theirs):
+            raise plaid_source.PlaidError(
+                "state_conflict", "Plaid state sheet changed during replication"
+            )
+        replica.save(state)
+
+
+def _drain() -> None:
+    global _worker
+    while True:
+        with _queue_lock:
+            if not _queued:
+                _worker = None
+                return
+            _, store = _queued.popitem()
+        try:
+            store.reconcile()
+        except Exception:
+            logger.warning("Could not replicate Plaid state.", exc_info=True)
+
+
+def _schedule(store: ReplicatedStateStore) -> None:
+    """Queues `store` for reconciling on the background replication thread."""
+    global _worker
+    with _queue_lock:
+        _queued[store.local.path] = store
+        if _worker is None:
+            _worker = threading.Thread(
+                target=_drain, name="plaid-state-replica", daemon=True
+            )
+            _worker.start()
+
+
+def wait_for_replication() -> None:
+    """Blocks until queued background replication has finished."""
+    with _queue_lock:
+        worker = _worker
+    if worker is not None:
+        worker.join()
+
+
+def open_store(
+    open_sheet: Callable[[], Any], background: bool = True
+) -> Union[plaid_source.SheetStateStore, ReplicatedStateStore]:
+    """Returns the configured Plaid state store.
+
+    Args:
+      open_sheet: Returns the spreadsheet holding the Plaid State tab.
+      background: Whether the sheet replica is written asynchronously; batch
+        jobs that exit right after saving should pass False.
+
+    Returns:
+      A ReplicatedStateStore if PLAID_STATE_DIR is set, otherwise a
+      SheetStateStore on the opened sheet.
+    """
+    if STATE_DIR is None:
+        return plaid_source.SheetStateStore(open_sheet())
+    return ReplicatedStateStore(
+        LocalStateStore(STATE_DIR / STATE_DB_NAME), open_sheet, background
+    )
@@ -2,6 +2,10 @@ import auth
 import utils
 import config
 import empower
+import normalization
+import rules
+import schema
+import sheet_sync
 import pandas as pd
 import pygsheets
 import logging
@@ -13,6 +17,7 @@ from datetime import date
 
 from typing import (
     Any,
+    Callable,
     cast,
     Optional,
 )
@@ -24,32 +29,12 @@ SCRAPE_LAST_UPDATED_CELL = "D5"
 
 def _trim(merchant: str) -> str:
     """Removes non-alphanumeric characters from a string and titles it."""
-    trimmed = []
-    for ch in merchant:
-        if ch.isalpha() or ch.isspace():
-            trimmed.append(ch)
-    return " ".join("".join(trimmed).replace("xx", "").split()).title()
+    return normalization.trim(merchant)
 
 
 def _normalize(merchant: str) -> str:
     """Normalizes a merchant string by applying a series of cleaning rules."""
-    merchant = merchant.lower()
-    for prefix in config.GLOBAL.STARTS_WITH_REMOVAL:
-        if merchant.startswith(prefix.lower()):
-            n = len(prefix)
-            merchant = merchant[n:]
-    if merchant.startswith("amzn mktp "):
-        merchant = f"Amazon {merchant[10:]}"
-    for suffix in config.GLOBAL.ENDS_WITH_REMOVAL:
-        if merchant.endswith(suffix.lower()):
-            merchant = merchant[: len(merchant) - len(suffix)]
-    for src, dst in config.GLOBAL.MERCHANT_NORMALIZATION_PAIRS:
-        merchant = merchant.replace(src.lower(), dst.lower())
-    normalized = _trim(merchant)
-    for simpleName in config.GLOBAL.MERCHANT_NORMALIZATION:
-        if simpleName.lower() in normalized.lower():
-            return simpleName
-    return normalized
+    return normalization.merchant_normalizer().normalize_once(merchant)
 
 
 def _Normalize(value: str) -> str:
@@ -61,20 +46,17 @@ def _Normalize(value: str) -> str:
     Returns:
       The normalized string.
     """
-    return " ".join(
-        "".join(
-            ch for ch in value if ch.isalnum() or ch.isspace() or ch in ("/")
-        ).split()
-    ).title()
+    return normalization.normalize_value(value)
 
 
 def _NormalizeMerchant(merchant: str) -> str:
     """Normalizes a merchant string by repeatedly applying cleaning rules.
 
-    This function repeatedly applies the `_normalize` function to a merchant
-    string until the string is stable (i.e., no more changes are made) or
-    a maximum number of iterations is reached. This is to handle cases
-    where multiple cleaning rules need to be applied in sequence.
+    This function repeatedly applies the cleaning rules to a merchant string
+    until the string is stable (i.e., no more changes are made) or a maximum
+    number of iterations is reached. This is to handle cases where multiple
+    cleaning rules need to be applied in sequence. The rules are compiled
+    once per config snapshot by `normalization.merchant_normalizer`.
 
     Args:
       merchant: The merchant string to be normalized.
@@ -82,15 +64,24 @@ def _NormalizeMerchant(merchant: str) -> str:
     Returns:
       The normalized merchant string.
     """
-    # Keep normalizing until stable or if we'll end up empty.
-    maxGoes = 30
-    while maxGoes > 0:
-        norm = _normalize(merchant)
-        maxGoes = 0 if norm == merchant or len(norm) == 0 else maxGoes - 1
-        merchant = norm
-        if maxGoes > 0 and maxGoes < 5:
-            logger.warning(f"Might enter a cycle with {merchant}")
-    return merchant
+    return normalization.merchant_normalizer().normalize(merchant)
+
+
+def _normalizeColumns(txns: pd.DataFrame) -> pd.DataFrame:
+    """Returns a copy of txns with the text columns normalized.
+
+    'Category', 'Account' and 'Description' go through `_Normalize` and
+    'Merchant' through `_NormalizeMerchant`, once per distinct value.
+    """
+    map_unique = normalization.map_unique
+    return txns.assign(
+        Category=map_unique(txns["Category"], _Normalize),
+        Merchant=map_unique(
+            txns["Merchant"], normalization.merchant_normalizer().normalize
+        ),
+        Account=map_unique(txns["Account"], _Normalize),
+        Description=map_unique(txns["Description"], _Normalize),
+    )
 
 
 def _cleanTxns(txns: pd.DataFrame) -> pd.DataFrame:
@@ -104,49 +95,58 @@ def _cleanTxns(txns: pd.DataFrame) -> pd.DataFrame:
     2.  Filters out transactions based on ignored categories, merchants,
         transaction IDs, and accounts as defined in the global configuration.
 
+    The ignore rules are compiled once per config snapshot into a
+    `rules.IgnoreFilter`, which matches each rule once per distinct value.
+
     Args:
-        txns: The DataFrame of transactions to clean. A copy is made.
+        txns: The DataFrame of transactions to clean. It is not modified.
 
     Returns:
         The cleaned DataFrame of transactions.
     """
-    cleaned = txns[:]
-    cleaned["Category"] = cleaned["Category"].map(_Normalize)
-    cleaned["Merchant"] = cleaned["Merchant"].map(_NormalizeMerchant)
-    cleaned["Account"] = cleaned["Account"].map(_Normalize)
-    cleaned["Description"] = cleaned["Description"].map(_Normalize)
-
-    ignored_category = cleaned["Category"].isin(
-        [_Normalize(category) for category in config.GLOBAL.IGNORED_CATEGORIES]
-    )
-    ignored_merchant = cleaned["Merchant"].isin(
-        [_NormalizeMerchant(merchant) for merchant in config.GLOBAL.IGNORED_MERCHANTS]
-    )
-    ignored_merchant_prefix = cleaned["Merchant"].map(
-        lambda merchant: any(
-            merchant.startswith(_NormalizeMerchant(prefix))
-            for prefix in getattr(config.GLOBAL, "IGNORED_MERCHANT_PREFIXES", [])
-        )
-    )
-    ignored_txn = cleaned["ID"].isin(config.GLOBAL.IGNORED_TXNS)
-    ignored_account = cleaned["Account"].isin(
-        [_Normalize(account) for account in config.GLOBAL.SKIPPED_ACCOUNTS]
-    )
-    cleaned = cleaned[
-        ~(
-            ignored_category
-            | ignored_merchant
-            | ignored_merchant_prefix
-            | ignored_txn
-            | ignored_account
-        )
-    ]
-    return cleaned
+    cleaned = _normalizeColumns(txns)
+    ignored = rules.compiled_rules().ignore_filter.evaluate(cleaned)
+    logger.info("Ignored transactions per rule: %s", ignored.counts)
+    return cleaned[~ignored.mask]
+
+
+def _compile_merchant_category_rule() -> Optional[Callable[[Any], Optional[str]]]:
+    """Compiles the merchant-based category maps into one per-merchant rule.
+
+    EXACT_MERCHANT_TO_CATEGORY_MAP wins over MERCHANT_TO_CATEGORY_MAP, and
+    merchants listed there are never keyword matched.  Keywords are matched
+    through the `keyword_index.KeywordIndex` in `rules.compiled_rules`,
+    longest keyword first.
+
+    Returns:
+      A function from a raw merchant to its category override (None to keep
+      the current category), or None if neither map is configured.
+    """
+    compiled = rules.compiled_rules()
+    exact_merchant_to_cat_norm = compiled.exact_merchant_to_category
+    keyword_match = compiled.merchant_keywords
+    if not exact_merchant_to_cat_norm and keyword_match is None:
+        return None
+
+    def category_for(merchant: Any) -> Optional[str]:
+        merchant = str(merchant)
+        exact_merchant_norm = _Normalize(merchant).lower()
+        if exact_merchant_norm in exact_merchant_to_cat_norm:
+            return exact_merchant_to_cat_norm[exact_merchant_norm]
+        if keyword_match is None:
+            return None
+        return keyword_match.get(_NormalizeMerchant(merchant).lower())
 
+    return category_for
 
-def ApplyCategoryRules(txns: pd.DataFrame) -> pd.DataFrame:  # noqa: C901
+
+def ApplyCategoryRules(txns: pd.DataFrame) -> pd.DataFrame:
     """Applies MERCHANT_TO_CATEGORY_MAP and CATEGORY_MAP to transactions.
 
+    Every rule is evaluated once per distinct merchant or category value and
+    the results are broadcast back to the rows. A categorical 'Category'
+    column stays categorical.
+
     Args:
       txns: DataFrame of transactions to transform.
 
@@ -157,56 +157,21 @@ def ApplyCategoryRules(txns: pd.DataFrame) -> pd.DataFrame:  # noqa: C901
     if updated.empty:
         return updated
 
-    # 1. Apply Exact Merchant to Category Map
-    exact_merchant_to_cat = getattr(config.GLOBAL, "EXACT_MERCHANT_TO_CATEGORY_MAP", {})
-    if exact_merchant_to_cat:
-        exact_merchant_to_cat_norm = {
-            _Normalize(k).lower(): v for k, v in exact_merchant_to_cat.items()
-        }
-
-        def map_exact_merchant(row: pd.Series) -> str:
-            merchant_norm = _Normalize(str(row["Merchant"])).lower()
-            if merchant_norm in exact_merchant_to_cat_norm:
-                return exact_merchant_to_cat_norm[merchant_norm]
-            return row["Category"]
-
-        updated["Category"] = updated.apply(map_exact_merchant, axis=1)
-
-    # 2. Apply Merchant to Category Map (using keyword matching)
-    merchant_to_cat = getattr(config.GLOBAL, "MERCHANT_TO_CATEGORY_MAP", {})
-    if merchant_to_cat:
-        # Sort keywords descending by length so most specific keywords match first
-        sorted_keywords = sorted(
-            merchant_to_cat.items(),
-            key=lambda item: len(item[0]),
-            reverse=True,
+    # 1. Apply the exact merchant and keyword merchant maps.
+    merchant_rule = _compile_merchant_category_rule()
+    if merchant_rule is not None:
+        overrides = normalization.map_unique(updated["Merchant"], merchant_rule)
+        category = updated["Category"]
+        merged = overrides.astype(object).where(
+            overrides.notna(), category.astype(object)
+        )
+        updated["Category"] = (
+            merged.astype("category") if schema.is_categorical(category) else merged
         )
-        normalized_keywords = [
-            (_NormalizeMerchant(keyword).lower(), category)
-            for keyword, category in sorted_keywords
-        ]
-        exact_merchant_names = set()
-        if exact_merchant_to_cat:
-            exact_merchant_names = {
-                _Normalize(k).lower() for k in exact_merchant_to_cat
-            }
-
-        def map_merchant(row: pd.Series) -> str:
-            exact_merchant_norm = _Normalize(str(row["Merchant"])).lower()
-            if exact_merchant_norm in exact_merchant_names:
-                return row["Category"]
-            merchant_norm = _NormalizeMerchant(str(row["Merchant"])).lower()
-            for kw_norm, cat in normalized_keywords:
-                if kw_norm in merchant_norm:
-                    return cat
-            return row["Category"]
-
-        updated["Category"] = updated.apply(map_merchant, axis=1)
 
-    # 3. Apply Category Map (mapping old category names to new ones)
-    category_map = getattr(config.GLOBAL, "CATEGORY_MAP", {})
-    if category_map:
-        category_map_norm = {_Normalize(k).lower(): v for k, v in category_map.items()}
+    # 2. Apply Category Map (mapping old category names to new ones)
+    category_map_norm = rules.compiled_rules().category_map
+    if category_map_norm:
 
         def map_category(cat: Any) -> str:
             cat_norm = _Normalize(str(cat)).lower()
@@ -214,10 +179,12 @@ def ApplyCategoryRules(txns: pd.DataFrame) -> pd.DataFrame:  # noqa: C901
                 return category_map_norm[cat_norm]
             return str(cat)
 
-        updated["Category"] = updated["Category"].map(map_category)
+        updated["Category"] = normalization.map_unique(
+            updated["Category"], map_category
+        )
 
     # Re-normalize Category column to match format expectations
-    updated["Category"] = updated["Category"].map(_Normalize)
+    updated["Category"] = normalization.map_unique(updated["Category"], _Normalize)
     return updated
 
 
@@ -262,12 +229,8 @@ def RetrieveAccounts(conn: empower.PersonalCapital) -> pd.DataFrame:
     def getAccountType(originalType: str) -> str:
         # Process in sorted order from longest to shortest
         # (more specific ones match first)
-        for substring, accountType in sorted(
-            config.GLOBAL.ACCOUNT_NAME_TO_TYPE_MAP,
-            key=lambda x: len(x[0]),
-            reverse=True,
-        ):
-            if substring.lower() in originalType.lower():
+        for substring, accountType in rules.compiled_rules().account_types:
+            if substring in originalType.lower():
                 return accountType
         logger.warning("No account type for account with type: %s" % originalType)
         return "Unknown - %s" % (originalType)
@@ -294,7 +257,7 @@ def _get_old_transactions(
     all_txns_ws: pygsheets.Worksheet = sheet.worksheet_by_title(
         title=config.GLOBAL.RAW_TRANSACTIONS_TITLE
     )
-    old_txns: pd.DataFrame = all_txns_ws.get_as_df(numerize=False)
+    old_txns: pd.DataFrame = sheet_sync.read_dataframe(all_txns_ws)
     old_txns = old_txns[config.GLOBAL.COLUMN_NAMES]
     cutoff: Optional[date] = (
         max(
@@ -316,7 +279,7 @@ def _get_new_transactions(
     conn: empower.PersonalCapital, cutoff: Optional[date]
 ) -> pd.DataFrame:
     """Fetches new transactions from Personal Capital."""
-    resp = conn.get_transaction_data(start_date=cutoff)
+    resp = conn.get_transaction_data(start_date=cutoff, monthly_shards=True)
     txns = pd.json_normalize(cast(list[dict[str, Any]], resp["transactions"]))
     if cutoff:
         txns = txns[txns.transactionDate >= cutoff.strftime("%Y-%m-%d")]
@@ -397,6 +360,7 @@ def RetrieveTransactions(
     deduped_txns = combined.drop_duplicates(
         subset=config.GLOBAL.IDENTIFIER_COLUMNS, ignore_index=True
     )
+    logger.info("Normalization cache stats: %s", normalization.cache_info())
     return deduped_txns
 
 
@@ -409,7 +373,9 @@ def UpdateGoogleSheet(
 
     This function updates the "Raw - All Transactions" and "Raw - All Accounts"
     sheets with the provided DataFrames. It also updates a "Settings" sheet
-    with the current timestamp and hostname.
+    with the current timestamp and hostname. Transactions are written as a
+    delta against the tab contents last read or written in this process; see
+    `sheet_sync.write_dataframe`.
 
     Args:
       sheet: The Google Sheet object to update.
@@ -420,7 +386,7 @@ def UpdateGoogleSheet(
         all_transactions_ws = sheet.worksheet_by_title(
             title=config.GLOBAL.RAW_TRANSACTIONS_TITLE
         )
-        all_transactions_ws.set_dataframe(transactions, "A1", fit=True)
+        sheet_sync.write_dataframe(all_transactions_ws, transactions)
 
     if accounts is not None:
         all_accounts_ws = sheet.worksheet_by_title(
@@ -441,6 +407,38 @@ def UpdateGoogleSheet(
     settings_ws.update_values(SCRAPE_LAST_UPDATED_CELL, [[scrape_timestamp]])
 
 
+def _sheetRow(index: Any) -> int:
+    """Returns the 1-based sheet row of a row read with `get_as_df`."""
+    # Row 1 holds the header.
+    return int(index) + 2
+
+
+def UpdateTransactionCells(
+    sheet: pygsheets.Spreadsheet,
+    categories: pd.Series,
+    removed: pd.Index,
+) -> None:
+    """Writes targeted changes to the raw transactions tab.
+
+    Both arguments are indexed like the frame returned by `get_as_df` on the
+    tab, so index `i` is sheet row `i + 2`.
+
+    Args:
+      sheet: The Google Sheet object to update.
+      categories: New 'Category' values for the rows to rewrite.
+      removed: Rows to delete from the tab.
+    """
+    worksheet = sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
+    sheet_sync.forget(worksheet)
+    if not categories.empty:
+        column = chr(ord("A") + config.GLOBAL.COLUMN_NAMES.index("Category"))
+        worksheet.update_values_batch(
+            [f"{column}{_sheetRow(index)}" for index in categories.index],
+            [[[value]] for value in categories],
+        )
+    sheet_sync.delete_rows(worksheet, (_sheetRow(index) for index in removed))
+
+
 def read_last_scrape_at(
     settings_ws: pygsheets.Worksheet,
 ) -> Optional[datetime]:
@@ -0,0 +1,163 @@
+"""Content-addressed cache of generated report files.
+
+A report is a pure function of the transactions, the category rules and the
+chart options, so when ``REPORT_CACHE_DIR`` is set each generated report is
+kept there under a hash of all three. Publishing a report whose inputs were
+already rendered then skips preparing the transactions and rendering the
+chart: the cached files are linked into the report directory instead.
+
+Entries are written to a temporary directory and renamed into place once
+complete, and the report directory only ever receives new links swapped in
+with ``os.replace``, so a served file is never rewritten in place. The least
+recently used entries are evicted once the cache exceeds
+``REPORT_CACHE_MAX_MB``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import pandas as pd
+
+import config
+import rules
+
+logger = logging.getLogger(__name__)
+
+# Directory holding cached reports; unset disables the cache.
+CACHE_DIR: Optional[Path] = (
+    Path(os.environ["REPORT_CACHE_DIR"]) if os.getenv("REPORT_CACHE_DIR") else None
+)
+MAX_BYTES = int(float(os.getenv("REPORT_CACHE_MAX_MB", "200")) * 1024 * 1024)
+# The code that decides what the same inputs render, relative to this module.
+# Any change to it keys new entries, so stale reports are never served.
+REPORT_MODULES = (
+    "normalization.py",
+    "remote.py",
+    "report_publisher.py",
+    "rules.py",
+    "schema.py",
+    "scripts/generate_spend_charts.py",
+    "spend_snapshot.py",
+)
+CODE_VERSION = config.source_hash(
+    *(str(Path(__file__).parent / module) for module in REPORT_MODULES)
+)
+
+
+def cache_key(txns: pd.DataFrame, options: dict[str, Any]) -> str:
+    """Returns the cache key of a report.
+
+    Args:
+      txns: The normalized transactions the report is generated from.
+      options: The generation options; values must be JSON serializable.
+
+    Returns:
+      A hex digest of the transactions, the current category rules, the
+      report code and `options`.
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {"code": CODE_VERSION, "rules": rules.fingerprint(), **options},
+            sort_keys=True,
+        ).encode()
+    )
+    digest.update(json.dumps(list(txns.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(txns, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def lookup(key: str, filenames: Iterable[str]) -> Optional[Path]:
+    """Returns the complete cache entry for `key`, marking it recently used."""
+    if CACHE_DIR is None:
+        return None
+    entry = CACHE_DIR / key
+    if not all((entry / filename).is_file() for filename in filenames):
+        return None
+    try:
+        os.utime(entry)
+    except OSError:
+        return None
+    return entry
+
+
+def store(key: str, build: Callable[[Path], Any]) -> Path:
+    """Builds the files of a new cache entry and adds it to the cache.
+
+    Args:
+      key: The entry's cache key.
+      build: Writes the report files into the directory it is passed.
+
+    Returns:
+      The entry directory.
+
+    Raises:
+      ValueError: If the cache is disabled.
+    """
+    if CACHE_DIR is None:
+        raise ValueError("REPORT_CACHE_DIR is not set.")
+    entry = CACHE_DIR / key
+    building = CACHE_DIR / f"{key}.{os.getpid()}.tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+    try:
+        build(building)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(building, entry)
+    finally:
+        shutil.rmtree(building, ignore_errors=True)
+    evict(keep=entry)
+    return entry
+
+
+def publish(entry: Path, output_dir: Path, filenames: Iterable[str]) -> None:
+    """Points the report files in `output_dir` at the files of `entry`."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for filename in filenames:
+        target = output_dir / filename
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            os.link(entry / filename, tmp_path)
+        except OSError:
+            shutil.copyfile(entry / filename, tmp_path)
+        os.replace(tmp_path, target)
+
+
+def _entry_size(entry: Path) -> int:
+    return sum(path.stat().st_size for path in entry.iterdir() if path.is_file())
+
+
+def evict(keep: Optional[Path] = None) -> None:
+    """Removes least recently used entries until the cache fits MAX_BYTES.
+
+    Args:
+      keep: An entry that is never evicted, even if it alone is too large.
+    """
+    if CACHE_DIR is None:
+        return
+    try:
+        entries = [
+            (path.stat().st_mtime, path, _entry_size(path))
+            for path in CACHE_DIR.iterdir()
+            if path.is_dir() and not path.name.endswith(".tmp")
+        ]
+    except OSError:
+        logger.warning("Could not scan report cache %s.", CACHE_DIR, exc_info=True)
+        return
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries, key=lambda entry: entry[0]):
+        if total <= MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        logger.info("Evicted cached report %s (%d bytes).", path.name, size)
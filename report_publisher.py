@@ -8,7 +8,7 @@ import os
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 from urllib.parse import urlencode
 
 import pandas as pd
@@ -16,6 +16,9 @@ import pygsheets
 
 import auth
 import config
+import report_cache
+import sheet_sync
+import spend_snapshot
 from scripts import generate_spend_charts
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,9 @@ logger = logging.getLogger(__name__)
 DEFAULT_REPORT_DIR = Path(os.getenv("REPORT_OUTPUT_DIR", "/data/reports"))
 SPEND_REPORT_FILENAME = "spend_profile.html"
 OUTLIER_REPORT_FILENAME = "outliers.csv"
+PLOTLYJS_FILENAME = generate_spend_charts.PLOTLYJS_FILENAME
+# Relative to the report URL, so reports load plotly.js from report_server.
+PLOTLYJS_URL = f"../assets/{PLOTLYJS_FILENAME}"
 STATUS_RANGE_START = "F1"
 STATUS_URL_VALUE_CELLS = ("F1", "F2")
 
@@ -89,7 +95,7 @@ def load_transactions_from_sheet(sheet: pygsheets.Spreadsheet) -> pd.DataFrame:
     """Load transactions from an already-open Google Sheet."""
     worksheet = sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
     return generate_spend_charts._normalize_transaction_columns(
-        worksheet.get_as_df(numerize=False)
+        sheet_sync.read_dataframe(worksheet)
     )
 
 
@@ -130,6 +136,96 @@ def write_report_status(
     _log(job_id, "Updated Settings!F1:G6 with status=%s", result.status)
 
 
+def _build_spend_grid(
+    txns: pd.DataFrame,
+    *,
+    window: int,
+    top_n_categories: Optional[int],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    cap_daily_spend: Optional[float],
+    auto_cap: bool,
+    job_id: Optional[str],
+) -> tuple[generate_spend_charts.SpendGrid, pd.DataFrame]:
+    """Build the spend grid from every transaction.
+
+    Returns:
+      The grid and the prepared, top-N grouped transactions.
+    """
+    prep_start = time.perf_counter()
+    prepared_txns = generate_spend_charts._prepare_transactions(
+        txns,
+        start_date=start_date,
+        end_date=end_date,
+        job_id=job_id,
+    )
+    _log(
+        job_id,
+        "Prepared %d transactions in %s",
+        len(prepared_txns),
+        _elapsed(prep_start),
+    )
+    group_start = time.perf_counter()
+    grouped_txns = generate_spend_charts._apply_top_n_category_grouping(
+        prepared_txns, top_n_categories
+    )
+    _log(
+        job_id,
+        "Grouped transactions into %d rows across %d categories in %s",
+        len(grouped_txns),
+        grouped_txns["Category"].nunique() if not grouped_txns.empty else 0,
+        _elapsed(group_start),
+    )
+    spend_data = generate_spend_charts.prepare_spend_grid(
+        grouped_txns,
+        window=window,
+        top_n_categories=None,
+        skip_cleanup=True,
+        cap_daily_spend=cap_daily_spend,
+        auto_cap=auto_cap,
+        job_id=job_id,
+    )
+    return spend_data, grouped_txns
+
+
+def _update_spend_grid(
+    txns: pd.DataFrame,
+    *,
+    window: int,
+    top_n_categories: Optional[int],
+    start_date: Optional[str],
+    end_date: Optional[str],
+    cap_daily_spend: Optional[float],
+    auto_cap: bool,
+    job_id: Optional[str],
+) -> tuple[generate_spend_charts.SpendGrid, pd.DataFrame]:
+    """Update the spend grid snapshot with the changed transactions.
+
+    Returns:
+      The grid and the prepared, top-N grouped transactions on its outlier
+      days.
+    """
+    spend_data = spend_snapshot.update_spend_grid(
+        txns,
+        window=window,
+        top_n_categories=top_n_categories,
+        start_date=start_date,
+        end_date=end_date,
+        cap_daily_spend=cap_daily_spend,
+        auto_cap=auto_cap,
+        job_id=job_id,
+    )
+    outlier_txns = spend_snapshot.spike_transactions(
+        txns,
+        spend_data,
+        cap_daily_spend=cap_daily_spend,
+        start_date=start_date,
+        end_date=end_date,
+        job_id=job_id,
+    )
+    return spend_data, outlier_txns
+
+
 def generate_report_files(
     txns: pd.DataFrame,
     output_dir: Path,
@@ -158,36 +254,16 @@ def generate_report_files(
         len(txns),
         output_dir,
     )
-    prep_start = time.perf_counter()
-    prepared_txns = generate_spend_charts._prepare_transactions(
+    spend_start = time.perf_counter()
+    build = (
+        _build_spend_grid if spend_snapshot.SNAPSHOT_DIR is None else _update_spend_grid
+    )
+    spend_data, outlier_txns = build(
         txns,
+        window=window,
+        top_n_categories=top_n_categories,
         start_date=start_date,
         end_date=end_date,
-        job_id=job_id,
-    )
-    _log(
-        job_id,
-        "Prepared %d transactions in %s",
-        len(prepared_txns),
-        _elapsed(prep_start),
-    )
-    group_start = time.perf_counter()
-    grouped_txns = generate_spend_charts._apply_top_n_category_grouping(
-        prepared_txns, top_n_categories
-    )
-    _log(
-        job_id,
-        "Grouped transactions into %d rows across %d categories in %s",
-        len(grouped_txns),
-        grouped_txns["Category"].nunique() if not grouped_txns.empty else 0,
-        _elapsed(group_start),
-    )
-    spend_start = time.perf_counter()
-    spend_data = generate_spend_charts.prepare_spend_data(
-        grouped_txns,
-        window=window,
-        top_n_categories=None,
-        skip_cleanup=True,
         cap_daily_spend=cap_daily_spend,
         auto_cap=auto_cap,
         job_id=job_id,
@@ -196,7 +272,7 @@ def generate_report_files(
         job_id,
         "Built spend grid with %d rows across %d dates in %s",
         len(spend_data),
-        spend_data["Date"].nunique() if not spend_data.empty else 0,
+        len(spend_data.dates),
         _elapsed(spend_start),
     )
     chart_start = time.perf_counter()
@@ -208,13 +284,15 @@ def generate_report_files(
         include_total_spend=include_total_spend,
         include_category_share=include_category_share,
         include_customdata=include_customdata,
+        compact=True,
+        plotlyjs=PLOTLYJS_URL,
     )
     _log(
         job_id, "Wrote spend chart HTML to %s in %s", report_path, _elapsed(chart_start)
     )
     outlier_start = time.perf_counter()
     outlier_report = generate_spend_charts.build_outlier_report(
-        grouped_txns,
+        outlier_txns,
         spend_data,
         cap_daily_spend=cap_daily_spend,
     )
@@ -244,6 +322,55 @@ def generate_report_files(
     return report_path, outlier_path
 
 
+def _publish_report_files(
+    txns: pd.DataFrame,
+    output_dir: Path,
+    *,
+    window: int,
+    include_heatmap: bool,
+    include_total_spend: bool,
+    include_category_share: bool,
+    include_customdata: bool,
+    job_id: Optional[str],
+) -> None:
+    """Generate the report files into output_dir, reusing cached ones."""
+    options: dict[str, Any] = {
+        "window": window,
+        "include_heatmap": include_heatmap,
+        "include_total_spend": include_total_spend,
+        "include_category_share": include_category_share,
+        "include_customdata": include_customdata,
+    }
+    if report_cache.CACHE_DIR is None:
+        generate_report_files(txns, output_dir, **options, job_id=job_id)
+        return
+
+    filenames = (SPEND_REPORT_FILENAME, OUTLIER_REPORT_FILENAME)
+    # Cached HTML links the plotly.js asset of the version it was rendered
+    # with, which serve_asset stops serving after an upgrade.
+    key = report_cache.cache_key(
+        txns,
+        {
+            **options,
+            "compact": True,
+            "plotlyjs": PLOTLYJS_URL,
+            "plotlyjs_version": generate_spend_charts.PLOTLYJS_VERSION,
+        },
+    )
+    entry = report_cache.lookup(key, filenames)
+    if entry is None:
+        _log(job_id, "No cached report for input %s; generating", key[:12])
+        entry = report_cache.store(
+            key,
+            lambda directory: generate_report_files(
+                txns, directory, **options, job_id=job_id
+            ),
+        )
+    else:
+        _log(job_id, "Reusing cached report for input %s", key[:12])
+    report_cache.publish(entry, output_dir, filenames)
+
+
 def publish_spend_report(
     *,
     source: str = "sheets",
@@ -300,7 +427,7 @@ def publish_spend_report(
             raise ValueError(f"Unsupported report source: {source}")
 
         stage_start = time.perf_counter()
-        generate_report_files(
+        _publish_report_files(
             txns,
             output_dir,
             window=window,
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import functools
+import gzip
 import hmac
 import logging
 import os
@@ -9,9 +11,10 @@ from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from threading import Lock, Thread
-from typing import Optional
+from typing import Any, Optional
 from uuid import uuid4
 
+import plotly.offline  # type: ignore[import-untyped]
 from flask import (
     Flask,
     Response,
@@ -28,7 +31,9 @@ import empower
 import report_publisher
 import remote
 import scraper
+import sheet_sync
 import plaid_source
+import plaid_state
 import utils
 
 app = Flask(__name__)
@@ -40,6 +45,8 @@ _plaid_approval_lock = Lock()
 _SCRAPE_FRESHNESS_WINDOW = timedelta(
     seconds=int(os.getenv("SCRAPE_FRESHNESS_SECONDS", "900"))
 )
+# Times a new item's initial sync starts over when Plaid data changes mid-sync.
+_PLAID_SYNC_RESTARTS = 2
 
 
 def _configure_logging() -> None:
@@ -102,6 +109,11 @@ _current_job: Optional[GenerateJob] = None
 _last_terminal_job: Optional[GenerateJob] = None
 _current_scrape_job: Optional[ScrapeJob] = None
 _last_terminal_scrape_job: Optional[ScrapeJob] = None
+# Gzipped report HTML keyed by file name, with the stat signature it was
+# compressed from so a newly published report is compressed once.
+_gzipped_reports: dict[str, tuple[tuple[int, int, int], bytes]] = {}
+_gzipped_reports_lock = Lock()
+_ASSET_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
 
 
 def _report_token() -> str:
@@ -135,6 +147,13 @@ def _forbidden() -> tuple[Response, int]:
     return jsonify({"error": "forbidden"}), 403
 
 
+@app.errorhandler(plaid_source.PlaidError)
+def plaid_error(exc: plaid_source.PlaidError) -> tuple[Response, int]:
+    """Reports Plaid errors a request did not handle; conflicts can be retried."""
+    status = 409 if exc.code == "state_conflict" else 500
+    return jsonify({"error": str(exc), "error_code": exc.code}), status
+
+
 def _utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -308,6 +327,53 @@ def health() -> Response:
     return jsonify({"status": "ok"})
 
 
+def _accepts_gzip() -> bool:
+    return request.accept_encodings["gzip"] > 0
+
+
+def _gzipped_report(path: Path) -> bytes:
+    stat = path.stat()
+    signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _gzipped_reports_lock:
+        cached = _gzipped_reports.get(path.name)
+        if cached is None or cached[0] != signature:
+            cached = (signature, gzip.compress(path.read_bytes(), mtime=0))
+            _gzipped_reports[path.name] = cached
+    return cached[1]
+
+
+@functools.lru_cache(maxsize=2)
+def _plotlyjs_bytes(gzipped: bool) -> bytes:
+    script = plotly.offline.get_plotlyjs().encode()
+    return gzip.compress(script, mtime=0) if gzipped else script
+
+
+def _gzip_response(body: bytes, mimetype: str) -> Response:
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.get("/assets/<filename>")
+def serve_asset(filename: str) -> Response | tuple[Response, int]:
+    """Serves the pinned plotly.js that compact reports load.
+
+    The file name carries the plotly.js version, so browsers may cache it
+    indefinitely and share it across every published report.
+    """
+    if filename != report_publisher.PLOTLYJS_FILENAME:
+        return jsonify({"error": "not found"}), 404
+    if _accepts_gzip():
+        response = _gzip_response(_plotlyjs_bytes(True), "text/javascript")
+    else:
+        response = Response(_plotlyjs_bytes(False), mimetype="text/javascript")
+    response.cache_control.public = True
+    response.cache_control.max_age = _ASSET_MAX_AGE_SECONDS
+    response.cache_control.immutable = True
+    return response
+
+
 @app.get("/reports/<path:filename>")
 def serve_report(filename: str) -> Response | tuple[Response, int]:
     if not is_authorized_token(_request_token()):
@@ -317,6 +383,16 @@ def serve_report(filename: str) -> Response | tuple[Response, int]:
         report_publisher.OUTLIER_REPORT_FILENAME,
     }:
         return jsonify({"error": "not found"}), 404
+    path = _report_dir() / filename
+    if filename == report_publisher.SPEND_REPORT_FILENAME and _accepts_gzip():
+        try:
+            body = _gzipped_report(path)
+        except FileNotFoundError:
+            return jsonify({"error": "not found"}), 404
+        response = _gzip_response(body, "text/html")
+        response.add_etag()
+        response.make_conditional(request)
+        return response
     return send_from_directory(_report_dir(), filename)
 
 
@@ -416,6 +492,18 @@ def _open_plaid_sheet():
     return report_publisher.open_configured_spreadsheet()
 
 
+def _plaid_state_store(sheet: Any = None) -> Any:
+    """Returns the Plaid state store; the sheet is only opened if it is needed.
+
+    An already open `sheet` is only reused when the state is kept in it
+    directly. The replica is written from a background thread, which must not
+    share the request's Sheets client: httplib2 is not thread-safe.
+    """
+    if sheet is None or plaid_state.STATE_DIR is not None:
+        return plaid_state.open_store(_open_plaid_sheet)
+    return plaid_state.open_store(lambda: sheet)
+
+
 def _require_plaid_configured() -> Optional[tuple[Response, int]]:
     if not plaid_source.is_configured():
         return (
@@ -434,7 +522,7 @@ def plaid_connect() -> Response | tuple[Response, int]:
     if unavailable:
         return unavailable
     reserve = request.args.get("use_reserve") == "1"
-    store = plaid_source.SheetStateStore(_open_plaid_sheet())
+    store = _plaid_state_store()
     state = store.load()
     count = len(state.get("items", {}))
     if count >= plaid_source.MAX_ITEMS or (
@@ -492,6 +580,34 @@ document.getElementById('connect').onclick = () => handler.open();
     )
 
 
+def _initial_sync(
+    client: plaid_source.PlaidClient, item_id: str, item: dict[str, Any]
+) -> plaid_source.SyncProgress:
+    """Pages through a new item's history, checkpointing each page.
+
+    As in scraper._fetch_item, the checkpoint is discarded when Plaid asks for
+    the sync to restart; here the sync then starts over, since the item is not
+    saved until it has its first batch.
+
+    Raises:
+      PlaidError: If the sync fails, or keeps restarting.
+    """
+    restarts = 0
+    while True:
+        progress = plaid_source.SyncProgress.resume(item_id, "", keep_transactions=True)
+        try:
+            for page in client.sync_pages(str(item["access_token"]), progress.cursor):
+                progress.add_page(page, item)
+            return progress
+        except plaid_source.PlaidError as exc:
+            if exc.code != "sync_restart_required":
+                raise
+            progress.discard()
+            restarts += 1
+            if restarts > _PLAID_SYNC_RESTARTS:
+                raise
+
+
 @app.post("/plaid/exchange")
 def plaid_exchange() -> Response | tuple[Response, int]:
     if not session.get("plaid_link_authorized"):
@@ -502,7 +618,7 @@ def plaid_exchange() -> Response | tuple[Response, int]:
     client = plaid_source.PlaidClient()
     result = client.exchange_public_token(public_token)
     sheet = _open_plaid_sheet()
-    store = plaid_source.SheetStateStore(sheet)
+    store = _plaid_state_store(sheet)
     state = store.load()
     if len(state.get("items", {})) >= plaid_source.MAX_ITEMS:
         return (
@@ -515,13 +631,10 @@ def plaid_exchange() -> Response | tuple[Response, int]:
             409,
         )
     item_id = str(result["item_id"])
-    added, modified, removed, cursor = client.sync(str(result["access_token"]))
-    # Keep the initial batch encrypted until the user reviews the bounded result.
-    txns = added + modified
     linked_accounts = client.accounts(str(result["access_token"]))
     item = {
         "access_token": result["access_token"],
-        "cursor": cursor,
+        "cursor": "",
         "status": "pending_review",
         "selected_account_ids": [
             str(account["account_id"]) for account in linked_accounts
@@ -538,21 +651,26 @@ def plaid_exchange() -> Response | tuple[Response, int]:
             )
             for account in linked_accounts
         },
-        "pending_transactions": txns,
+        "pending_transactions": [],
         "created_at": _utc_now(),
         "last_sync_at": "",
         "last_error": "",
     }
-    existing = sheet.worksheet_by_title(
-        title=config.GLOBAL.RAW_TRANSACTIONS_TITLE
-    ).get_as_df(numerize=False)
+    progress = _initial_sync(client, item_id, item)
+    item["cursor"] = progress.cursor
+    # Keep the initial batch encrypted until the user reviews the bounded result.
+    item["pending_transactions"] = list(progress.transactions.values())
+    existing = sheet_sync.read_dataframe(
+        sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
+    )
     review = plaid_source.reconcile(
         existing.reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value=""),
-        plaid_source.transaction_frame(txns, item),
+        progress.additions(),
     )
     item["reconciliation"] = review
     state.setdefault("items", {})[item_id] = item
     store.save(state)
+    progress.discard()
     session["plaid_pending_item_id"] = item_id
     return jsonify(
         {
@@ -570,7 +688,7 @@ def plaid_review() -> Response | tuple[Response, int]:
         _request_token()
     ):
         return _forbidden()
-    state = plaid_source.SheetStateStore(_open_plaid_sheet()).load()
+    state = _plaid_state_store().load()
     item_id = str(session.get("plaid_pending_item_id", ""))
     item = state.get("items", {}).get(item_id)
     if not item or item.get("status") != "pending_review":
@@ -583,14 +701,18 @@ def plaid_review() -> Response | tuple[Response, int]:
             return jsonify({"error": "No unambiguous pending Plaid review"}), 404
         item_id, item = pending[0]
     review = item.get("reconciliation", {})
-    raw_accounts = (
-        _open_plaid_sheet()
-        .worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-        .get_as_df(numerize=False)
-        .get("Account", [])
+    raw_transactions = sheet_sync.read_dataframe(
+        _open_plaid_sheet().worksheet_by_title(
+            title=config.GLOBAL.RAW_TRANSACTIONS_TITLE
+        )
     )
+    raw_accounts = raw_transactions.reindex(columns=["Account"], fill_value="")
     known_accounts = sorted(
-        {str(account).strip() for account in raw_accounts if str(account).strip()}
+        {
+            str(account).strip()
+            for account in raw_accounts["Account"]
+            if str(account).strip()
+        }
     )
     original_names = item.get("account_original_names", {})
     accounts = [
@@ -734,7 +856,7 @@ def plaid_selection(item_id: str) -> Response | tuple[Response, int]:
     if not isinstance(mappings, dict):
         return jsonify({"error": "account_mappings must be an object"}), 400
     sheet = _open_plaid_sheet()
-    store = plaid_source.SheetStateStore(sheet)
+    store = _plaid_state_store(sheet)
     state = store.load()
     item = state.get("items", {}).get(item_id)
     if not item or item.get("status") != "pending_review":
@@ -750,11 +872,9 @@ def plaid_selection(item_id: str) -> Response | tuple[Response, int]:
         for account_id, current_name in item.get("account_mappings", {}).items()
     }
     item["selected_account_ids"] = selected
-    existing = (
+    existing = sheet_sync.read_dataframe(
         sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-        .get_as_df(numerize=False)
-        .reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value="")
-    )
+    ).reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value="")
     item["reconciliation"] = plaid_source.reconcile(
         existing,
         plaid_source.transaction_frame(item.get("pending_transactions", []), item),
@@ -771,7 +891,7 @@ def plaid_reauth(item_id: str) -> Response | tuple[Response, int]:
     unavailable = _require_plaid_configured()
     if unavailable:
         return unavailable
-    state = plaid_source.SheetStateStore(_open_plaid_sheet()).load()
+    state = _plaid_state_store().load()
     item = state.get("items", {}).get(item_id)
     if not item:
         return jsonify({"error": "Plaid Item not found"}), 404
@@ -797,7 +917,7 @@ def plaid_reauth_complete() -> Response | tuple[Response, int]:
     item_id = session.pop("plaid_reauth_item_id", "")
     if not item_id:
         return _forbidden()
-    store = plaid_source.SheetStateStore(_open_plaid_sheet())
+    store = _plaid_state_store()
     state = store.load()
     item = state.get("items", {}).get(item_id)
     if not item:
@@ -827,7 +947,7 @@ def plaid_approve(item_id: str) -> Response | tuple[Response, int]:
         )
     try:
         sheet = _open_plaid_sheet()
-        store = plaid_source.SheetStateStore(sheet)
+        store = _plaid_state_store(sheet)
         state = store.load()
         item = state.get("items", {}).get(item_id)
         if not item:
@@ -846,11 +966,9 @@ def plaid_approve(item_id: str) -> Response | tuple[Response, int]:
         state["items"][item_id] = item
         store.save(state)
 
-        existing = (
+        existing = sheet_sync.read_dataframe(
             sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-            .get_as_df(numerize=False)
-            .reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value="")
-        )
+        ).reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value="")
         additions = plaid_source.transaction_frame(
             item.get("pending_transactions", []), item
         )
@@ -895,7 +1013,7 @@ def plaid_approve_status(item_id: str) -> Response | tuple[Response, int]:
         _request_token()
     ):
         return _forbidden()
-    state = plaid_source.SheetStateStore(_open_plaid_sheet()).load()
+    state = _plaid_state_store().load()
     item = state.get("items", {}).get(item_id)
     if not item:
         return jsonify({"error": "Plaid Item not found"}), 404
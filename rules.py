@@ -0,0 +1,359 @@
+"""Category and filtering rules compiled from one config snapshot.
+
+``CompiledRules`` holds the ignore filter, lookup dicts and keyword index
+that ``remote`` used to re-derive from ``config.GLOBAL`` on every call.
+``compiled_rules`` builds them once per config snapshot and, while the
+settings still match ``config.yaml``, persists them next to the parsed config
+keyed by its content hash, so later processes load them instead.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import types
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+import keyword_index
+import normalization
+
+CACHE_KIND = "rules"
+# Changes to the code that defines or derives CompiledRules invalidate the
+# cached pickles, and writing one removes those of other versions, including
+# the "rules-v<n>" files of the hand-bumped versions this replaced.
+CODE_VERSION = config.source_hash(
+    __file__, keyword_index.__file__, normalization.__file__
+)
+
+RULE_ATTRS = (
+    "IGNORED_CATEGORIES",
+    "IGNORED_MERCHANTS",
+    "IGNORED_MERCHANT_PREFIXES",
+    "IGNORED_TXNS",
+    "SKIPPED_ACCOUNTS",
+    "ACCOUNT_NAME_TO_TYPE_MAP",
+    "CATEGORY_MAP",
+    "EXACT_MERCHANT_TO_CATEGORY_MAP",
+    "MERCHANT_TO_CATEGORY_MAP",
+    # Normalized merchants depend on the merchant cleaning rules.
+    "STARTS_WITH_REMOVAL",
+    "ENDS_WITH_REMOVAL",
+    "MERCHANT_NORMALIZATION_PAIRS",
+    "MERCHANT_NORMALIZATION",
+)
+# Changing any of these can affect every transaction, so ``diff`` gives up.
+_GLOBAL_RULE_ATTRS = (
+    "STARTS_WITH_REMOVAL",
+    "ENDS_WITH_REMOVAL",
+    "MERCHANT_NORMALIZATION_PAIRS",
+    "MERCHANT_NORMALIZATION",
+    "CATEGORY_MAP",
+)
+_IGNORE_RULE_ATTRS = (
+    "IGNORED_CATEGORIES",
+    "IGNORED_MERCHANTS",
+    "IGNORED_MERCHANT_PREFIXES",
+    "IGNORED_TXNS",
+    "SKIPPED_ACCOUNTS",
+)
+
+
+@dataclass(frozen=True)
+class IgnoreResult:
+    """Rows dropped by an ``IgnoreFilter``.
+
+    Attributes:
+      mask: True for every ignored row, aligned with the evaluated frame.
+      counts: Rows matched by each rule.  A row can match several rules.
+    """
+
+    mask: pd.Series
+    counts: dict[str, int]
+
+
+@dataclass(frozen=True)
+class IgnoreFilter:
+    """The IGNORED_* and SKIPPED_ACCOUNTS rules, matched against clean columns.
+
+    Attributes:
+      categories: Normalized IGNORED_CATEGORIES.
+      merchants: Normalized IGNORED_MERCHANTS.
+      merchant_prefixes: Normalized IGNORED_MERCHANT_PREFIXES.
+      txns: IGNORED_TXNS as configured.
+      accounts: Normalized SKIPPED_ACCOUNTS.
+    """
+
+    categories: frozenset[str]
+    merchants: frozenset[str]
+    merchant_prefixes: tuple[str, ...]
+    txns: tuple[Any, ...]
+    accounts: frozenset[str]
+
+    @classmethod
+    def from_config(cls, settings: Any) -> "IgnoreFilter":
+        """Compile the ignore rules currently held by ``settings``."""
+        normalize_value = normalization.normalize_value
+        normalize_merchant = normalization.merchant_normalizer().normalize
+        return cls(
+            categories=frozenset(
+                normalize_value(category)
+                for category in getattr(settings, "IGNORED_CATEGORIES", [])
+            ),
+            merchants=frozenset(
+                normalize_merchant(merchant)
+                for merchant in getattr(settings, "IGNORED_MERCHANTS", [])
+            ),
+            merchant_prefixes=tuple(
+                normalize_merchant(prefix)
+                for prefix in getattr(settings, "IGNORED_MERCHANT_PREFIXES", [])
+            ),
+            txns=tuple(getattr(settings, "IGNORED_TXNS", [])),
+            accounts=frozenset(
+                normalize_value(account)
+                for account in getattr(settings, "SKIPPED_ACCOUNTS", [])
+            ),
+        )
+
+    def _merchant_masks(self, merchants: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+        """Match both merchant rules once per distinct merchant."""
+        codes, uniques = pd.factorize(merchants)
+        distinct = pd.Series(uniques, dtype=object)
+        # The extra False entry is taken for missing merchants (code -1).
+        exact = np.append(distinct.isin(self.merchants).to_numpy(), False)
+        prefix = np.zeros(len(uniques) + 1, dtype=bool)
+        if self.merchant_prefixes and len(uniques):
+            prefix[:-1] = distinct.str.startswith(self.merchant_prefixes).to_numpy(
+                dtype=bool, na_value=False
+            )
+        return exact.take(codes), prefix.take(codes)
+
+    def evaluate(self, txns: pd.DataFrame) -> IgnoreResult:
+        """Match every rule against normalized ``txns`` in one pass per column."""
+        merchant, merchant_prefix = self._merchant_masks(txns["Merchant"])
+        masks = {
+            "category": txns["Category"].isin(self.categories).to_numpy(),
+            "merchant": merchant,
+            "merchant_prefix": merchant_prefix,
+            "txn": txns["ID"].isin(self.txns).to_numpy(),
+            "account": txns["Account"].isin(self.accounts).to_numpy(),
+        }
+        ignored = np.logical_or.reduce(list(masks.values()))
+        return IgnoreResult(
+            mask=pd.Series(ignored, index=txns.index),
+            counts={rule: int(mask.sum()) for rule, mask in masks.items()},
+        )
+
+
+@dataclass(frozen=True)
+class CompiledRules:
+    """Precomputed forms of the category and ignore rules.
+
+    Attributes:
+      ignore_filter: The transaction ignore rules.
+      account_types: ACCOUNT_NAME_TO_TYPE_MAP lower-cased, longest first.
+      exact_merchant_to_category: EXACT_MERCHANT_TO_CATEGORY_MAP keyed by the
+        lower-cased normalized merchant.
+      merchant_keywords: MERCHANT_TO_CATEGORY_MAP keyword index, or None.
+      category_map: CATEGORY_MAP keyed by the lower-cased normalized category.
+    """
+
+    ignore_filter: IgnoreFilter
+    account_types: tuple[tuple[str, str], ...]
+    exact_merchant_to_category: dict[str, str]
+    merchant_keywords: Optional[keyword_index.KeywordIndex[str]]
+    category_map: dict[str, str]
+
+    @classmethod
+    def from_config(cls, settings: Any) -> "CompiledRules":
+        """Compile the rules currently held by ``settings``."""
+        normalize_value = normalization.normalize_value
+        normalize_merchant = normalization.merchant_normalizer().normalize
+        merchant_to_cat = getattr(settings, "MERCHANT_TO_CATEGORY_MAP", {})
+        return cls(
+            ignore_filter=IgnoreFilter.from_config(settings),
+            account_types=tuple(
+                (substring.lower(), account_type)
+                for substring, account_type in sorted(
+                    getattr(settings, "ACCOUNT_NAME_TO_TYPE_MAP", []),
+                    key=lambda x: len(x[0]),
+                    reverse=True,
+                )
+            ),
+            exact_merchant_to_category={
+                normalize_value(k).lower(): v
+                for k, v in getattr(
+                    settings, "EXACT_MERCHANT_TO_CATEGORY_MAP", {}
+                ).items()
+            },
+            merchant_keywords=(
+                keyword_index.KeywordIndex(
+                    merchant_to_cat,
+                    lambda keyword: normalize_merchant(keyword).lower(),
+                )
+                if merchant_to_cat
+                else None
+            ),
+            category_map={
+                normalize_value(k).lower(): v
+                for k, v in getattr(settings, "CATEGORY_MAP", {}).items()
+            },
+        )
+
+
+# As in normalization, the sources are held strongly for the identity check.
+_compiled: Optional[tuple[object, tuple[object, ...], CompiledRules]] = None
+
+
+def cache_key(settings: config.Config) -> str:
+    """Return the key of the cached rules compiled from `settings`."""
+    return f"{settings.CONTENT_HASH}-{CODE_VERSION}"
+
+
+def _load_or_compile(settings: config.Config) -> CompiledRules:
+    pristine = settings.unchanged(RULE_ATTRS)
+    if pristine:
+        cached = config.read_cache(CACHE_KIND, cache_key(settings))
+        if isinstance(cached, CompiledRules):
+            return cached
+    rules = CompiledRules.from_config(settings)
+    if pristine:
+        config.write_cache(CACHE_KIND, cache_key(settings), rules)
+    return rules
+
+
+def compiled_rules() -> CompiledRules:
+    """Return the rules compiled from the current ``config.GLOBAL``.
+
+    As with ``normalization.merchant_normalizer``, replacing a rule on
+    ``config.GLOBAL`` (or ``config.GLOBAL`` itself) triggers a recompile.
+    Settings that were changed in-process are never written to disk.
+    """
+    global _compiled
+    settings = config.GLOBAL
+    sources = tuple(getattr(settings, attr, None) for attr in RULE_ATTRS)
+    compiled = _compiled
+    if (
+        compiled is None
+        or compiled[0] is not settings
+        or any(current is not cached for current, cached in zip(sources, compiled[1]))
+    ):
+        compiled = (settings, sources, _load_or_compile(settings))
+        _compiled = compiled
+    return compiled[2]
+
+
+def clear_cache() -> None:
+    """Drop the in-memory compiled rules."""
+    global _compiled
+    _compiled = None
+
+
+def snapshot(settings: Any = None) -> dict[str, Any]:
+    """Return a detached copy of the rule settings, for a later ``diff``."""
+    settings = config.GLOBAL if settings is None else settings
+    return {attr: copy.deepcopy(getattr(settings, attr, None)) for attr in RULE_ATTRS}
+
+
+def fingerprint(settings: Any = None) -> str:
+    """Return a content hash of the rule settings, for keying derived data."""
+    payload = json.dumps(snapshot(settings), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _changed_entries(old: Optional[dict], new: Optional[dict]) -> dict[str, Any]:
+    """Keys added, removed or remapped between two rule maps."""
+    old, new = old or {}, new or {}
+    return {
+        key: new.get(key)
+        for key in old.keys() | new.keys()
+        if key not in old or key not in new or old[key] != new[key]
+    }
+
+
+def _added_entries(old: Optional[list], new: Optional[list]) -> list[Any]:
+    old_entries = old or []
+    return [entry for entry in new or [] if entry not in old_entries]
+
+
+@dataclass(frozen=True)
+class RulesDiff:
+    """What changed between two rule snapshots that share merchant rules.
+
+    Attributes:
+      exact_merchants: Lower-cased normalized merchants whose
+        EXACT_MERCHANT_TO_CATEGORY_MAP entry was added, removed or remapped.
+      keywords: Index of MERCHANT_TO_CATEGORY_MAP keywords that were added,
+        removed or remapped, or None if no keyword changed.
+      added_ignores: Ignore rules present only in the newer snapshot.
+    """
+
+    exact_merchants: frozenset[str]
+    keywords: Optional[keyword_index.KeywordIndex[Any]]
+    added_ignores: IgnoreFilter
+
+    def affected(self, txns: pd.DataFrame) -> pd.Series:
+        """Rows whose category the merchant rules could now set differently."""
+        keywords = self.keywords
+        if not self.exact_merchants and keywords is None:
+            return pd.Series(False, index=txns.index)
+        normalize_merchant = normalization.merchant_normalizer().normalize
+
+        def is_affected(merchant: Any) -> bool:
+            merchant = str(merchant)
+            if normalization.normalize_value(merchant).lower() in self.exact_merchants:
+                return True
+            return (
+                keywords is not None
+                and keywords.match(normalize_merchant(merchant).lower()) is not None
+            )
+
+        return normalization.map_unique(txns["Merchant"], is_affected).astype(bool)
+
+
+def diff(previous: dict[str, Any], current: dict[str, Any]) -> Optional[RulesDiff]:
+    """Compare two ``snapshot`` results.
+
+    ``current`` must be a snapshot of ``config.GLOBAL``: changed keywords are
+    normalized with its merchant rules, which both snapshots share whenever a
+    diff is returned.
+
+    Returns:
+      The changes as a RulesDiff, or None when a changed rule can affect every
+      transaction and the rules must be re-applied in full.
+    """
+    if any(previous.get(attr) != current.get(attr) for attr in _GLOBAL_RULE_ATTRS):
+        return None
+    normalize_merchant = normalization.merchant_normalizer().normalize
+    changed_keywords = _changed_entries(
+        previous.get("MERCHANT_TO_CATEGORY_MAP"),
+        current.get("MERCHANT_TO_CATEGORY_MAP"),
+    )
+    added_ignores = types.SimpleNamespace(
+        **{
+            attr: _added_entries(previous.get(attr), current.get(attr))
+            for attr in _IGNORE_RULE_ATTRS
+        }
+    )
+    return RulesDiff(
+        exact_merchants=frozenset(
+            normalization.normalize_value(merchant).lower()
+            for merchant in _changed_entries(
+                previous.get("EXACT_MERCHANT_TO_CATEGORY_MAP"),
+                current.get("EXACT_MERCHANT_TO_CATEGORY_MAP"),
+            )
+        ),
+        keywords=(
+            keyword_index.KeywordIndex(
+                changed_keywords, lambda keyword: normalize_merchant(keyword).lower()
+            )
+            if changed_keywords
+            else None
+        ),
+        added_ignores=IgnoreFilter.from_config(added_ignores),
+    )
@@ -0,0 +1,64 @@
+"""Typed schema for transaction frames.
+
+Sheets and CSVs hand transactions over as object columns of strings.
+``coerce_transactions`` converts the ``COLUMN_NAMES`` columns once, where a
+frame is loaded, so later stages work on parsed dates, float amounts and
+categorical text columns instead of re-parsing or re-hashing strings.
+Stages that rewrite a column keep its dtype: ``normalization.map_unique``
+maps categoricals category by category.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+DATE_DTYPE = np.dtype("datetime64[ns]")
+AMOUNT_DTYPE = np.dtype("float64")
+# Low-cardinality text columns, stored as codes into their distinct values.
+CATEGORICAL_COLUMNS = ("Category", "Account", "Merchant")
+
+
+def is_categorical(values: pd.Series) -> bool:
+    """Returns whether `values` has a categorical dtype."""
+    return isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Returns `values` as midnight timestamps, parsing only if needed."""
+    if values.dtype == DATE_DTYPE:
+        return values
+    return pd.to_datetime(values, errors="raise").dt.normalize().astype(DATE_DTYPE)
+
+
+def categorical(values: pd.Series) -> pd.Series:
+    """Returns `values` as a categorical, converting only if needed."""
+    if is_categorical(values):
+        return values
+    return values.astype("category")
+
+
+def coerce_transactions(txns: pd.DataFrame) -> pd.DataFrame:
+    """Returns a copy of txns with the schema dtypes applied.
+
+    Columns that already have their schema dtype are kept as they are, so
+    coercing an already typed frame is cheap. 'ID' and 'Description' keep
+    their loaded values: ignored transaction IDs are matched as configured.
+
+    Args:
+      txns: Transactions with at least the 'Date', 'Amount' and categorical
+        columns.
+
+    Returns:
+      The typed copy.
+
+    Raises:
+      ValueError: If a date or amount cannot be parsed.
+    """
+    typed = txns.assign(
+        Date=parse_dates(txns["Date"]),
+        Amount=pd.to_numeric(txns["Amount"], errors="raise").astype(AMOUNT_DTYPE),
+    )
+    for column in CATEGORICAL_COLUMNS:
+        typed[column] = categorical(typed[column])
+    return typed
@@ -8,14 +8,18 @@ import os
 import pandas as pd
 import pygsheets
 import remote
+import sheet_sync
 import plaid_source
+import plaid_state
 import sys
 import utils
 
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Any, Callable, Optional, Union
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -23,6 +27,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 DEFAULT_SCRAPE_LOCK_FILE = Path(os.getenv("SCRAPE_LOCK_FILE", "/tmp/scraper.lock"))
+# Plaid items synced at once. Each item is a chain of blocking HTTP requests,
+# so threads overlap their waits.
+PLAID_SYNC_WORKERS = int(os.getenv("PLAID_SYNC_WORKERS", "4"))
 
 
 @contextmanager
@@ -54,11 +61,96 @@ def _open_sheet(sheets_credentials: object) -> pygsheets.Spreadsheet:
     return client.open(config.GLOBAL.WORKSHEET_TITLE)
 
 
+@dataclass
+class _ItemSync:
+    """Everything one Plaid item's network calls returned."""
+
+    progress: plaid_source.SyncProgress
+    # None when balances were not requested and the sync listed no accounts.
+    accounts: Optional[list[dict[str, Any]]]
+    # When `accounts` came from Plaid in this run; None if they were cached.
+    accounts_fetched_at: Optional[datetime]
+
+
+def _fetch_item(
+    client: plaid_source.PlaidClient,
+    item_id: str,
+    item: dict[str, Any],
+    with_balances: bool,
+) -> Union[_ItemSync, plaid_source.PlaidError]:
+    """Pages through an item's transactions and lists its accounts.
+
+    Accounts come from the sync responses when Plaid includes them. Otherwise,
+    if balances are wanted, the item's cached accounts are used while fresh
+    and /accounts/get is only called once they are stale.
+
+    Runs on a worker thread, so it only talks to Plaid and checkpoints pages;
+    the returned result or error is applied to the sync state by the calling
+    thread.
+    """
+    access_token = str(item["access_token"])
+    progress = plaid_source.SyncProgress.resume(item_id, str(item.get("cursor", "")))
+    fetched_at: Optional[datetime] = datetime.now(timezone.utc)
+    try:
+        for page in client.sync_pages(access_token, progress.cursor):
+            progress.add_page(page, item)
+        accounts = progress.accounts or None
+        if accounts is None and with_balances:
+            accounts = plaid_source.cached_accounts(item)
+            if accounts is None:
+                accounts = client.accounts(access_token)
+            else:
+                fetched_at = None
+    except plaid_source.PlaidError as exc:
+        if exc.code == "sync_restart_required":
+            progress.discard()
+        return exc
+    return _ItemSync(progress, accounts, fetched_at if accounts is not None else None)
+
+
+def _fetch_items(
+    client: plaid_source.PlaidClient,
+    items: list[tuple[str, dict[str, Any]]],
+    with_balances: bool,
+) -> list[Union[_ItemSync, plaid_source.PlaidError]]:
+    """Runs _fetch_item for every item on a bounded pool, in item order."""
+    workers = max(1, min(PLAID_SYNC_WORKERS, len(items)))
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="plaid-sync"
+    ) as pool:
+        futures = [
+            pool.submit(_fetch_item, client, item_id, item, with_balances)
+            for item_id, item in items
+        ]
+        return [future.result() for future in futures]
+
+
+def _account_rows(
+    accounts: list[dict[str, Any]], item: dict[str, Any]
+) -> list[dict[str, object]]:
+    selected = item.get("selected_account_ids")
+    return [
+        {
+            "Name": plaid_source._account_name(account, item),
+            "Type": account.get("type", "Unknown"),
+            "Balance": account.get("balances", {}).get("current"),
+            "inferredType": account.get("subtype", ""),
+        }
+        for account in accounts
+        if not selected or account.get("account_id") in selected
+    ]
+
+
 def scrape_plaid_and_push(options: utils.ScraperOptions) -> None:
-    """Run the configured Plaid cursor sync without requiring Empower secrets."""
+    """Run the configured Plaid cursor sync without requiring Empower secrets.
+
+    Items are fetched from Plaid concurrently (see PLAID_SYNC_WORKERS); their
+    results are applied to the sync state in item order, so the saved cursors
+    and errors do not depend on which request finished first.
+    """
     with acquire_scrape_lock():
         sheet = _open_sheet(auth.GetGoogleCredentials())
-        store = plaid_source.SheetStateStore(sheet)
+        store = plaid_state.open_store(lambda: sheet, background=False)
         state = store.load()
         items = state.get("items", {})
         active = [
@@ -72,54 +164,38 @@ def scrape_plaid_and_push(options: utils.ScraperOptions) -> None:
             )
         client = plaid_source.PlaidClient()
         tx_ws = sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-        existing = tx_ws.get_as_df(numerize=False)
+        existing = sheet_sync.read_dataframe(tx_ws)
         existing = existing.reindex(columns=config.GLOBAL.COLUMN_NAMES, fill_value="")
+        results = _fetch_items(client, active, options.scrape_accounts)
+        client.log_latencies()
         all_added: list[pd.DataFrame] = []
         modified_ids: set[str] = set()
         removed_ids: set[str] = set()
         accounts: list[dict[str, object]] = []
         item_errors: list[plaid_source.PlaidError] = []
-        for item_id, item in active:
-            try:
-                added, modified, removed, cursor = client.sync(
-                    str(item["access_token"]), str(item.get("cursor", ""))
-                )
-            except plaid_source.PlaidError as exc:
-                item["last_error"] = exc.code
-                item["last_sync_at"] = datetime.now(timezone.utc).isoformat()
-                items[item_id] = item
-                item_errors.append(exc)
+        synced: list[plaid_source.SyncProgress] = []
+        for (item_id, item), result in zip(active, results):
+            item["last_sync_at"] = datetime.now(timezone.utc).isoformat()
+            items[item_id] = item
+            if isinstance(result, plaid_source.PlaidError):
+                item["last_error"] = result.code
+                item_errors.append(result)
                 continue
-            all_added.extend(
-                [
-                    plaid_source.transaction_frame(added, item),
-                    plaid_source.transaction_frame(modified, item),
-                ]
-            )
-            modified_ids.update(
-                "plaid:" + str(t.get("transaction_id", "")) for t in modified
-            )
-            removed_ids.update(
-                "plaid:" + str(t.get("transaction_id", "")) for t in removed
-            )
-            for account in client.accounts(str(item["access_token"])):
-                if (
-                    item.get("selected_account_ids")
-                    and account.get("account_id") not in item["selected_account_ids"]
-                ):
-                    continue
-                accounts.append(
-                    {
-                        "Name": plaid_source._account_name(account, item),
-                        "Type": account.get("type", "Unknown"),
-                        "Balance": account.get("balances", {}).get("current"),
-                        "inferredType": account.get("subtype", ""),
-                    }
+            progress = result.progress
+            item_additions = progress.additions()
+            if not item_additions.empty:
+                all_added.append(item_additions)
+            modified_ids.update(progress.modified_ids)
+            removed_ids.update(progress.removed_ids)
+            if result.accounts is not None:
+                accounts.extend(_account_rows(result.accounts, item))
+            if result.accounts_fetched_at is not None:
+                plaid_source.cache_accounts(
+                    item, result.accounts or [], result.accounts_fetched_at
                 )
-            item["cursor"] = cursor
-            item["last_sync_at"] = datetime.now(timezone.utc).isoformat()
+            item["cursor"] = progress.cursor
+            synced.append(progress)
             item["last_error"] = ""
-            items[item_id] = item
         if len(item_errors) == len(active):
             store.save(state)
             raise item_errors[0]
@@ -138,6 +214,8 @@ def scrape_plaid_and_push(options: utils.ScraperOptions) -> None:
                 pd.DataFrame(accounts) if options.scrape_accounts else None,
             )
             store.save(state)
+            for progress in synced:
+                progress.discard()
 
 
 def scrape_and_push(
@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import argparse
 import gc
+import gzip
+import itertools
 import json
 import logging
 import subprocess
@@ -51,6 +53,9 @@ class BenchmarkResult:
     include_total_spend: bool
     include_category_share: bool
     include_customdata: bool
+    compact: bool = False
+    compressed_bytes: int = 0
+    parse_seconds: float = 0.0
 
     def as_dict(self) -> dict[str, object]:
         return {
@@ -65,6 +70,9 @@ class BenchmarkResult:
             "include_total_spend": self.include_total_spend,
             "include_category_share": self.include_category_share,
             "include_customdata": self.include_customdata,
+            "compact": self.compact,
+            "compressed_bytes": self.compressed_bytes,
+            "parse_seconds": round(self.parse_seconds, 4),
         }
 
 
@@ -133,12 +141,18 @@ def build_parser() -> argparse.ArgumentParser:
         default=True,
         help="Include heavier hover payloads in the benchmark chart.",
     )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the compact report format that report_server publishes.",
+    )
     parser.add_argument(
         "--sweep-compact-matrix",
         action="store_true",
         help=(
-            "Run the 2x2 matrix of include-total-spend and include-customdata "
-            "with the heatmap disabled."
+            "Run the matrix of include-total-spend, include-category-share and "
+            "include-customdata with the heatmap disabled, in the full and "
+            "compact formats."
         ),
     )
     return parser
@@ -159,6 +173,26 @@ def _resolve_input_path(input_path: Path, cache_path: Path) -> Path:
     return input_path
 
 
+def _figure_parse_seconds(html: str) -> float:
+    """Returns the time taken to parse the figure JSON embedded in a report.
+
+    A browser parses the same payload before plotly.js can draw anything, so
+    this tracks how the report format affects load time.
+    """
+    start = html.find("Plotly.newPlot(")
+    if start < 0:
+        return 0.0
+    decoder = json.JSONDecoder()
+    position = html.index(",", start) + 1
+    started = time.perf_counter()
+    for _ in range(2):
+        while html[position].isspace():
+            position += 1
+        _, position = decoder.raw_decode(html, position)
+        position = html.index(",", position) + 1
+    return time.perf_counter() - started
+
+
 def run_benchmark(
     *,
     input_path: Path,
@@ -170,6 +204,7 @@ def run_benchmark(
     include_total_spend: bool = True,
     include_category_share: bool = True,
     include_customdata: bool = True,
+    compact: bool = False,
 ) -> BenchmarkResult:
     if not input_path.exists():
         raise FileNotFoundError(f"Benchmark input {input_path} does not exist.")
@@ -177,7 +212,7 @@ def run_benchmark(
     gc.collect()
     started = time.perf_counter()
     txns = generate_spend_charts.load_transactions_from_csv(input_path)
-    prepared = generate_spend_charts.prepare_spend_data(
+    prepared = generate_spend_charts.prepare_spend_grid(
         txns,
         window=window,
         top_n_categories=top_n_categories,
@@ -202,21 +237,26 @@ def run_benchmark(
         include_total_spend=include_total_spend,
         include_category_share=include_category_share,
         include_customdata=include_customdata,
+        compact=compact,
         job_id="benchmark",
     )
     elapsed = time.perf_counter() - started
+    html = output_path.read_bytes() if output_path.exists() else b""
     return BenchmarkResult(
         input_path=input_path,
         output_path=output_path,
         rows=len(txns),
-        categories=prepared["Category"].nunique() if not prepared.empty else 0,
+        categories=len(prepared.categories),
         elapsed_seconds=elapsed,
         peak_rss_mb=_peak_rss_mb(),
-        output_bytes=output_path.stat().st_size if output_path.exists() else 0,
+        output_bytes=len(html),
         include_heatmap=include_heatmap,
         include_total_spend=include_total_spend,
         include_category_share=include_category_share,
         include_customdata=include_customdata,
+        compact=compact,
+        compressed_bytes=len(gzip.compress(html)),
+        parse_seconds=_figure_parse_seconds(html.decode()),
     )
 
 
@@ -230,69 +270,137 @@ def run_benchmark_matrix(
 ) -> list[BenchmarkResult]:
     output_dir.mkdir(parents=True, exist_ok=True)
     results: list[BenchmarkResult] = []
-    for include_total_spend in (True, False):
-        for include_customdata in (True, False):
-            for include_category_share in (True, False):
-                variant_output = output_dir / (
-                    f"spend_profile_total-{int(include_total_spend)}"
-                    f"_share-{int(include_category_share)}"
-                    f"_custom-{int(include_customdata)}.html"
-                )
-                command = [
-                    sys.executable,
-                    str(Path(__file__).resolve()),
-                    "--input",
-                    str(input_path),
-                    "--output",
-                    str(variant_output),
-                    "--window",
-                    str(window),
-                    "--no-include-heatmap",
-                    (
-                        "--include-total-spend"
-                        if include_total_spend
-                        else "--no-include-total-spend"
-                    ),
-                    (
-                        "--include-category-share"
-                        if include_category_share
-                        else "--no-include-category-share"
-                    ),
-                    (
-                        "--include-customdata"
-                        if include_customdata
-                        else "--no-include-customdata"
-                    ),
-                ]
-                if top_n_categories is not None:
-                    command.extend(["--top-n-categories", str(top_n_categories)])
-                if skip_cleanup:
-                    command.append("--skip-cleanup")
-                completed = subprocess.run(
-                    command,
-                    check=True,
-                    capture_output=True,
-                    text=True,
-                )
-                payload = json.loads(completed.stdout.strip())
-                results.append(
-                    BenchmarkResult(
-                        input_path=Path(payload["input_path"]),
-                        output_path=Path(payload["output_path"]),
-                        rows=payload["rows"],
-                        categories=payload["categories"],
-                        elapsed_seconds=payload["elapsed_seconds"],
-                        peak_rss_mb=payload["peak_rss_mb"],
-                        output_bytes=payload["output_bytes"],
-                        include_heatmap=payload["include_heatmap"],
-                        include_total_spend=payload["include_total_spend"],
-                        include_category_share=payload["include_category_share"],
-                        include_customdata=payload["include_customdata"],
-                    )
-                )
+    for (
+        include_total_spend,
+        include_customdata,
+        include_category_share,
+        compact,
+    ) in itertools.product((True, False), repeat=4):
+        variant_output = output_dir / (
+            f"spend_profile_total-{int(include_total_spend)}"
+            f"_share-{int(include_category_share)}"
+            f"_custom-{int(include_customdata)}"
+            f"_compact-{int(compact)}.html"
+        )
+        command = [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "--input",
+            str(input_path),
+            "--output",
+            str(variant_output),
+            "--window",
+            str(window),
+            "--no-include-heatmap",
+            (
+                "--include-total-spend"
+                if include_total_spend
+                else "--no-include-total-spend"
+            ),
+            (
+                "--include-category-share"
+                if include_category_share
+                else "--no-include-category-share"
+            ),
+            (
+                "--include-customdata"
+                if include_customdata
+                else "--no-include-customdata"
+            ),
+        ]
+        if compact:
+            command.append("--compact")
+        if top_n_categories is not None:
+            command.extend(["--top-n-categories", str(top_n_categories)])
+        if skip_cleanup:
+            command.append("--skip-cleanup")
+        completed = subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        payload = json.loads(completed.stdout.strip())
+        results.append(
+            BenchmarkResult(
+                input_path=Path(payload["input_path"]),
+                output_path=Path(payload["output_path"]),
+                rows=payload["rows"],
+                categories=payload["categories"],
+                elapsed_seconds=payload["elapsed_seconds"],
+                peak_rss_mb=payload["peak_rss_mb"],
+                output_bytes=payload["output_bytes"],
+                include_heatmap=payload["include_heatmap"],
+                include_total_spend=payload["include_total_spend"],
+                include_category_share=payload["include_category_share"],
+                include_customdata=payload["include_customdata"],
+                compact=payload["compact"],
+                compressed_bytes=payload["compressed_bytes"],
+                parse_seconds=payload["parse_seconds"],
+            )
+        )
     return results
 
 
+def compact_savings(results: list[BenchmarkResult]) -> list[dict[str, object]]:
+    """Compares each matrix variant's compact report with its full report.
+
+    Args:
+      results: Matrix results containing full and compact runs of each variant.
+
+    Returns:
+      One row per variant with the size, compressed size and parse time of
+      both formats and the factor by which compact output shrinks each.
+    """
+    full = {
+        (
+            result.include_total_spend,
+            result.include_category_share,
+            result.include_customdata,
+        ): result
+        for result in results
+        if not result.compact
+    }
+    rows: list[dict[str, object]] = []
+    for result in results:
+        baseline = full.get(
+            (
+                result.include_total_spend,
+                result.include_category_share,
+                result.include_customdata,
+            )
+        )
+        if not result.compact or baseline is None:
+            continue
+        rows.append(
+            {
+                "variant": baseline.output_path.stem,
+                "output_bytes": [baseline.output_bytes, result.output_bytes],
+                "compressed_bytes": [
+                    baseline.compressed_bytes,
+                    result.compressed_bytes,
+                ],
+                "parse_seconds": [baseline.parse_seconds, result.parse_seconds],
+                "size_factor": _ratio(baseline.output_bytes, result.output_bytes),
+                "compressed_factor": _ratio(
+                    baseline.compressed_bytes, result.compressed_bytes
+                ),
+                "parse_factor": _ratio(baseline.parse_seconds, result.parse_seconds),
+            }
+        )
+    return rows
+
+
+def _ratio(before: float, after: float) -> Optional[float]:
+    return round(before / after, 2) if after else None
+
+
+def _print_matrix(results: list[BenchmarkResult]) -> None:
+    for savings in compact_savings(results):
+        logger.info("Compact report savings: %s", json.dumps(savings))
+    print(json.dumps([result.as_dict() for result in results]))
+
+
 def main(argv: Optional[list[str]] = None) -> None:
     logging.basicConfig(
         level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -313,7 +421,7 @@ def main(argv: Optional[list[str]] = None) -> None:
                     top_n_categories=args.top_n_categories,
                     skip_cleanup=args.skip_cleanup,
                 )
-                print(json.dumps([result.as_dict() for result in results]))
+                _print_matrix(results)
         else:
             results = run_benchmark_matrix(
                 input_path=input_path,
@@ -322,7 +430,7 @@ def main(argv: Optional[list[str]] = None) -> None:
                 top_n_categories=args.top_n_categories,
                 skip_cleanup=args.skip_cleanup,
             )
-            print(json.dumps([result.as_dict() for result in results]))
+            _print_matrix(results)
         return
     result = run_benchmark(
         input_path=input_path,
@@ -334,6 +442,7 @@ def main(argv: Optional[list[str]] = None) -> None:
         include_total_spend=args.include_total_spend,
         include_category_share=args.include_category_share,
         include_customdata=args.include_customdata,
+        compact=args.compact,
     )
     print(json.dumps(result.as_dict(), sort_keys=True))
 
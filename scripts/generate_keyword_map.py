@@ -10,6 +10,7 @@ Usage:
 
 import re
 import csv
+import sys
 from math import ceil
 from collections import Counter, defaultdict
 from pathlib import Path
@@ -18,6 +19,11 @@ from typing import Any
 import yaml
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from keyword_index import KeywordIndex  # noqa: E402
+
 UNIQUE_MERCHANTS_FILE = PROJECT_ROOT / "data" / "unique_merchants.csv"
 EXACT_OVERRIDES_FILE = (
     PROJECT_ROOT / "data" / "merchant_category_overrides_2025_2026.yaml"
@@ -503,17 +509,16 @@ def phrase_tokens(merchant: str) -> list[str]:
     ]
 
 
-def find_keyword_category(merchant: str, keyword_map: dict[str, str]) -> str | None:
+def build_keyword_index(keyword_map: dict[str, str]) -> KeywordIndex[str]:
+    """Index keywords by their normalised form, longest normalised form first."""
+    return KeywordIndex(
+        keyword_map, normalize, rank_key=lambda keyword: len(normalize(keyword))
+    )
+
+
+def find_keyword_category(merchant: str, index: KeywordIndex[str]) -> str | None:
     """Return the category found by keyword matching, if any."""
-    merchant_norm = normalize(merchant)
-    for kw, cat in sorted(
-        keyword_map.items(),
-        key=lambda item: len(normalize(item[0])),
-        reverse=True,
-    ):
-        if normalize(kw) in merchant_norm:
-            return cat
-    return None
+    return index.get(normalize(merchant))
 
 
 def build_labeled_merchants(
@@ -522,10 +527,11 @@ def build_labeled_merchants(
     exact_overrides: dict[str, str],
 ) -> dict[str, str]:
     """Infer a category label for each known merchant."""
+    index = build_keyword_index(keyword_map)
     labels: dict[str, str] = {}
     for merchant in merchants:
         exact_cat = exact_overrides.get(merchant)
-        keyword_cat = find_keyword_category(merchant, keyword_map)
+        keyword_cat = find_keyword_category(merchant, index)
         if exact_cat:
             labels[merchant] = exact_cat
         elif keyword_cat:
@@ -540,8 +546,9 @@ def generate_dynamic_keywords(  # noqa: C901
 ) -> dict[str, str]:
     """Add unambiguous merchant-set keywords until target coverage is reached."""
     expanded = dict(keyword_map)
+    index = build_keyword_index(expanded)
     covered = {
-        merchant for merchant in merchants if find_keyword_category(merchant, expanded)
+        merchant for merchant in merchants if find_keyword_category(merchant, index)
     }
 
     candidates: dict[str, tuple[str, set[str]]] = {}
@@ -603,11 +610,12 @@ def minimize_exact_map(
     exact_overrides: dict[str, str],
 ) -> dict[str, str]:
     """Keep exact entries only for known merchants not covered by keywords."""
+    index = build_keyword_index(keyword_map)
     exact = {}
     for merchant in merchants:
         if (
             merchant in exact_overrides
-            and find_keyword_category(merchant, keyword_map) is None
+            and find_keyword_category(merchant, index) is None
         ):
             exact[merchant] = exact_overrides[merchant]
     return exact
@@ -671,24 +679,12 @@ def compute_coverage(
 ) -> tuple[list[str], list[str]]:
     """Check how many merchants are matched by the keyword map."""
     exact_names = {normalize(merchant) for merchant in (exact_map or {})}
-    sorted_keywords = sorted(
-        keyword_map.items(),
-        key=lambda item: len(item[0]),
-        reverse=True,
-    )
+    index = KeywordIndex(keyword_map, normalize)
     matched: list[str] = []
     unmatched: list[str] = []
     for merchant in merchants:
         merchant_norm = normalize(merchant)
-        if merchant_norm in exact_names:
-            matched.append(merchant)
-            continue
-        found = False
-        for kw, _cat in sorted_keywords:
-            if normalize(kw) in merchant_norm:
-                found = True
-                break
-        if found:
+        if merchant_norm in exact_names or index.match(merchant_norm) is not None:
             matched.append(merchant)
         else:
             unmatched.append(merchant)
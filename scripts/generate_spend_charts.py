@@ -4,11 +4,14 @@ import argparse
 import logging
 import sys
 import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Iterable, Optional, Union
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go  # type: ignore[import-untyped]
+import plotly.offline  # type: ignore[import-untyped]
 import pygsheets
 from plotly.subplots import make_subplots  # type: ignore[import-untyped]
 
@@ -19,6 +22,8 @@ if str(PROJECT_ROOT) not in sys.path:
 import auth  # noqa: E402
 import config  # noqa: E402
 import remote  # noqa: E402
+import schema  # noqa: E402
+import sheet_sync  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +39,11 @@ CAPPED_COLUMN = "IsCapped"
 DAILY_CATEGORY_SPEND_COLUMN = "DailyCategorySpend"
 DAILY_TOTAL_SPEND_COLUMN = "DailyTotalSpend"
 CAP_ATTR = "cap_daily_spend"
+# The plotly.js bundled with the pinned plotly package; the version in the file
+# name lets servers cache it indefinitely.
+PLOTLYJS_VERSION = plotly.offline.get_plotlyjs_version()
+PLOTLYJS_FILENAME = f"plotly-{PLOTLYJS_VERSION}.min.js"
+DAY_MS = 24 * 60 * 60 * 1000
 PLOTLY_COLORWAY = [
     "#636efa",
     "#EF553B",
@@ -60,7 +70,11 @@ def _log(job_id: Optional[str], message: str, *args: object) -> None:
 
 
 def _normalize_transaction_columns(txns: pd.DataFrame) -> pd.DataFrame:
-    """Return a copy of txns with the repo's canonical transaction columns."""
+    """Return a copy of txns with the repo's canonical, typed transaction columns.
+
+    Dtypes follow `schema.coerce_transactions`, so loaders parse dates once and
+    later stages keep the categorical text columns.
+    """
     column_names = list(config.GLOBAL.COLUMN_NAMES)
     raw_columns = list(config.GLOBAL.COLUMNS)
     normalized = txns.copy()
@@ -79,10 +93,12 @@ def _normalize_transaction_columns(txns: pd.DataFrame) -> pd.DataFrame:
             f"{column_names}; missing {missing}."
         )
 
-    normalized["Merchant"] = normalized["Merchant"].fillna(normalized["Description"])
+    merchant = normalized["Merchant"]
+    if merchant.isna().any():
+        merchant = merchant.astype(object).fillna(normalized["Description"])
+    normalized["Merchant"] = merchant
     normalized["Description"] = normalized["Description"].fillna("")
-    normalized["Amount"] = pd.to_numeric(normalized["Amount"], errors="raise")
-    return normalized
+    return schema.coerce_transactions(normalized)
 
 
 def load_transactions_from_csv(input_path: Path) -> pd.DataFrame:
@@ -96,7 +112,7 @@ def load_transactions_from_sheets() -> pd.DataFrame:
     client = pygsheets.authorize(custom_credentials=creds.sheets)
     sheet = client.open(config.GLOBAL.WORKSHEET_TITLE)
     worksheet = sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-    return _normalize_transaction_columns(worksheet.get_as_df(numerize=False))
+    return _normalize_transaction_columns(sheet_sync.read_dataframe(worksheet))
 
 
 def _prepare_transactions(
@@ -134,7 +150,7 @@ def _prepare_transactions(
 
     stage_start = time.perf_counter()
     prepared = prepared.copy()
-    prepared["Date"] = pd.to_datetime(prepared["Date"], errors="raise").dt.normalize()
+    prepared["Date"] = schema.parse_dates(prepared["Date"])
     if start_date is not None:
         prepared = prepared[prepared["Date"] >= pd.Timestamp(start_date)]
     if end_date is not None:
@@ -162,13 +178,14 @@ def _apply_top_n_category_grouping(
         return txns
 
     grouped = txns.copy()
-    totals = grouped.groupby("Category", sort=False)[SPEND_COLUMN].sum()
+    totals = grouped.groupby("Category", sort=False, observed=True)[SPEND_COLUMN].sum()
     top_categories = set(
         totals.sort_values(ascending=False).head(top_n_categories).index
     )
-    grouped["Category"] = grouped["Category"].where(
-        grouped["Category"].isin(top_categories), "Other"
-    )
+    category = grouped["Category"]
+    if schema.is_categorical(category) and "Other" not in category.cat.categories:
+        category = category.cat.add_categories("Other")
+    grouped["Category"] = category.where(category.isin(top_categories), "Other")
     return grouped
 
 
@@ -194,7 +211,232 @@ def _auto_cap_daily_spend(daily_spend: pd.Series) -> Optional[float]:
     return cap
 
 
-def prepare_spend_data(
+def _rolling_means(values: np.ndarray, window: int) -> np.ndarray:
+    """Returns trailing means of `values` along its date axis.
+
+    Matches ``rolling(window, min_periods=1).mean()`` per column, computed
+    from one cumulative sum instead of a pass per category.
+
+    Args:
+      values: Non-negative spend matrices stacked as (series, date, category).
+      window: The number of days averaged.
+
+    Returns:
+      An array shaped like `values` with the rolling means.
+    """
+    sums = np.cumsum(values, axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    # Differences of running sums leave rounding residue where a window holds
+    # only zeros; those days must stay exactly zero for the share view.
+    nonzero = np.cumsum(values > 0, axis=1)
+    nonzero[:, window:] = nonzero[:, window:] - nonzero[:, :-window]
+    sums[nonzero == 0] = 0.0
+    counts = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return sums / counts[:, np.newaxis]
+
+
+@dataclass
+class SpendGrid:
+    """Daily spend by category as contiguous (date, category) matrices.
+
+    Row i of every matrix is `dates[i]` and column j is `categories[j]`, so
+    chart views are slices and axis reductions rather than groupbys over a
+    long-format frame.
+    """
+
+    dates: pd.DatetimeIndex
+    categories: list[str]
+    spend: np.ndarray
+    display: np.ndarray
+    capped: np.ndarray
+    rolling: np.ndarray
+    raw_rolling: np.ndarray
+    cap: Optional[float] = None
+    window: Optional[int] = None
+
+    def __len__(self) -> int:
+        """Returns the number of (date, category) cells."""
+        return self.spend.size
+
+    @property
+    def empty(self) -> bool:
+        return self.spend.size == 0
+
+    @classmethod
+    def empty_grid(cls, cap: Optional[float] = None) -> "SpendGrid":
+        """Returns a grid with no dates or categories."""
+        matrix = np.zeros((0, 0))
+        return cls(
+            dates=pd.DatetimeIndex([], name="Date"),
+            categories=[],
+            spend=matrix,
+            display=matrix,
+            capped=np.zeros((0, 0), dtype=bool),
+            rolling=matrix,
+            raw_rolling=matrix,
+            cap=cap,
+        )
+
+    @classmethod
+    def from_frame(cls, spend_data: pd.DataFrame) -> "SpendGrid":
+        """Builds a grid from the long-format frame of `prepare_spend_data`."""
+        if spend_data.empty:
+            return cls.empty_grid(spend_data.attrs.get(CAP_ATTR))
+
+        def matrix(column: str, fill: Union[float, bool]) -> pd.DataFrame:
+            return spend_data.pivot(
+                index="Date", columns="Category", values=column
+            ).fillna(fill)
+
+        spend = matrix(SPEND_COLUMN, 0.0)
+        return cls(
+            dates=pd.DatetimeIndex(spend.index, name="Date"),
+            categories=[str(category) for category in spend.columns],
+            spend=spend.to_numpy(dtype=float),
+            display=matrix(DISPLAY_SPEND_COLUMN, 0.0).to_numpy(dtype=float),
+            capped=matrix(CAPPED_COLUMN, False).to_numpy(dtype=bool),
+            rolling=matrix(ROLLING_SPEND_COLUMN, 0.0).to_numpy(dtype=float),
+            raw_rolling=matrix(RAW_ROLLING_SPEND_COLUMN, 0.0).to_numpy(dtype=float),
+            cap=spend_data.attrs.get(CAP_ATTR),
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the grid as one row per date and category."""
+        frame = pd.DataFrame(
+            {
+                "Date": np.repeat(self.dates.to_numpy(), len(self.categories)),
+                "Category": np.tile(
+                    np.asarray(self.categories, dtype=object), len(self.dates)
+                ),
+                SPEND_COLUMN: self.spend.ravel(),
+                DISPLAY_SPEND_COLUMN: self.display.ravel(),
+                CAPPED_COLUMN: self.capped.ravel(),
+                ROLLING_SPEND_COLUMN: self.rolling.ravel(),
+                RAW_ROLLING_SPEND_COLUMN: self.raw_rolling.ravel(),
+            }
+        )
+        frame.attrs[CAP_ATTR] = self.cap
+        return frame
+
+    def share_percent(self) -> np.ndarray:
+        """Returns each category's percent of the day's displayed rolling spend.
+
+        Days whose rolling spend is zero in every category are NaN.
+        """
+        total = self.rolling.sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            share = self.rolling / total * 100
+        share[np.broadcast_to(total == 0, share.shape)] = np.nan
+        return share
+
+    def monthly(self) -> tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+        """Sums the daily matrices by calendar month.
+
+        Returns:
+          The month starts, and the raw and displayed spend matrices with one
+          row per month.
+        """
+        if self.empty:
+            return pd.DatetimeIndex([]), self.spend, self.display
+        periods = self.dates.to_period("M")
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        months = periods[starts].to_timestamp()
+        return (
+            months,
+            np.add.reduceat(self.spend, starts, axis=0),
+            np.add.reduceat(self.display, starts, axis=0),
+        )
+
+
+SpendData = Union[pd.DataFrame, SpendGrid]
+
+
+def _as_spend_grid(spend_data: SpendData) -> SpendGrid:
+    if isinstance(spend_data, SpendGrid):
+        return spend_data
+    return SpendGrid.from_frame(spend_data)
+
+
+def _unchanged_rows(
+    previous: Optional[SpendGrid],
+    dates: pd.DatetimeIndex,
+    categories: list[str],
+    spend: np.ndarray,
+    *,
+    window: int,
+    cap: Optional[float],
+) -> int:
+    """Returns how many leading rows of `spend` match `previous`'s grid."""
+    if (
+        previous is None
+        or previous.empty
+        or len(dates) == 0
+        or previous.window != window
+        or previous.cap != cap
+        or previous.categories != categories
+        or previous.dates[0] != dates[0]
+    ):
+        return 0
+    rows = min(len(previous.dates), len(dates))
+    changed = np.flatnonzero((previous.spend[:rows] != spend[:rows]).any(axis=1))
+    return int(changed[0]) if changed.size else rows
+
+
+def build_spend_grid(
+    dates: pd.DatetimeIndex,
+    categories: list[str],
+    spend: np.ndarray,
+    *,
+    window: int,
+    cap: Optional[float],
+    previous: Optional[SpendGrid] = None,
+) -> SpendGrid:
+    """Derives the display, capped and rolling matrices from daily spend.
+
+    Args:
+      dates: Consecutive days, one per row of `spend`.
+      categories: Sorted category labels, one per column of `spend`.
+      spend: Raw daily spend by category.
+      window: The number of days in the rolling means.
+      cap: The visual cap for daily category spend, or None.
+      previous: An earlier grid. If it starts on the same day with the same
+        categories, window and cap, its rolling values are kept for the rows
+        before the first day whose spend differs, and only the trailing
+        windows from that day on are recomputed.
+
+    Returns:
+      The SpendGrid.
+    """
+    if cap is not None:
+        capped = spend > cap
+        display = np.minimum(spend, cap)
+    else:
+        capped = np.zeros(spend.shape, dtype=bool)
+        display = spend
+    kept = _unchanged_rows(previous, dates, categories, spend, window=window, cap=cap)
+    start = max(kept - window + 1, 0)
+    rolling, raw_rolling = _rolling_means(
+        np.stack([display[start:], spend[start:]]), window
+    )
+    if previous is not None and kept:
+        rolling = np.concatenate([previous.rolling[:kept], rolling[kept - start :]])
+        raw_rolling = np.concatenate(
+            [previous.raw_rolling[:kept], raw_rolling[kept - start :]]
+        )
+    return SpendGrid(
+        dates=dates,
+        categories=categories,
+        spend=spend,
+        display=display,
+        capped=capped,
+        rolling=rolling,
+        raw_rolling=raw_rolling,
+        cap=cap,
+        window=window,
+    )
+
+
+def prepare_spend_grid(
     txns: pd.DataFrame,
     *,
     window: int = 31,
@@ -206,8 +448,8 @@ def prepare_spend_data(
     cap_daily_spend: Optional[float] = None,
     auto_cap: bool = True,
     job_id: Optional[str] = None,
-) -> pd.DataFrame:
-    """Apply category rules and build a daily category spend grid."""
+) -> SpendGrid:
+    """Apply category rules and build a daily category SpendGrid."""
     if window < 1:
         raise ValueError("--window must be at least 1.")
     if top_n_categories is not None and top_n_categories < 1:
@@ -225,17 +467,7 @@ def prepare_spend_data(
     )
 
     if prepared.empty:
-        return pd.DataFrame(
-            columns=[
-                "Date",
-                "Category",
-                SPEND_COLUMN,
-                DISPLAY_SPEND_COLUMN,
-                ROLLING_SPEND_COLUMN,
-                RAW_ROLLING_SPEND_COLUMN,
-                CAPPED_COLUMN,
-            ]
-        )
+        return SpendGrid.empty_grid()
 
     prepared = _apply_top_n_category_grouping(prepared, top_n_categories)
     _log(
@@ -247,7 +479,9 @@ def prepare_spend_data(
 
     stage_start = time.perf_counter()
     daily = (
-        prepared.groupby(["Date", "Category"], as_index=True)[SPEND_COLUMN]
+        prepared.groupby(["Date", "Category"], as_index=True, observed=True)[
+            SPEND_COLUMN
+        ]
         .sum()
         .sort_index()
     )
@@ -267,36 +501,25 @@ def prepare_spend_data(
         )
 
     stage_start = time.perf_counter()
-    dates = pd.date_range(prepared["Date"].min(), prepared["Date"].max(), freq="D")
-    categories = pd.Index(sorted(prepared["Category"].unique()), name="Category")
-    complete_index = pd.MultiIndex.from_product(
-        [dates.rename("Date"), categories], names=["Date", "Category"]
+    dates = pd.date_range(
+        prepared["Date"].min(), prepared["Date"].max(), freq="D", name="Date"
     )
-
-    grid = daily.reindex(complete_index, fill_value=0).reset_index()
+    categories = pd.Index(sorted(prepared["Category"].unique()), name="Category")
+    spend = np.zeros((len(dates), len(categories)))
+    spend[
+        dates.get_indexer(daily.index.get_level_values("Date")),
+        categories.get_indexer(np.asarray(daily.index.get_level_values("Category"))),
+    ] = daily.to_numpy()
     _log(
         job_id,
         "Built dense spend grid with %d rows in %s",
-        len(grid),
+        spend.size,
         f"{time.perf_counter() - stage_start:.2f}s",
     )
     stage_start = time.perf_counter()
-    grid.attrs[CAP_ATTR] = effective_cap
-    grid[DISPLAY_SPEND_COLUMN] = grid[SPEND_COLUMN]
-    if effective_cap is not None:
-        grid[CAPPED_COLUMN] = grid[SPEND_COLUMN] > effective_cap
-        grid[DISPLAY_SPEND_COLUMN] = grid[DISPLAY_SPEND_COLUMN].clip(
-            upper=effective_cap
-        )
-    else:
-        grid[CAPPED_COLUMN] = False
-
-    grid[ROLLING_SPEND_COLUMN] = grid.groupby("Category", group_keys=False)[
-        DISPLAY_SPEND_COLUMN
-    ].transform(lambda series: series.rolling(window=window, min_periods=1).mean())
-    grid[RAW_ROLLING_SPEND_COLUMN] = grid.groupby("Category", group_keys=False)[
-        SPEND_COLUMN
-    ].transform(lambda series: series.rolling(window=window, min_periods=1).mean())
+    grid = build_spend_grid(
+        dates, list(categories), spend, window=window, cap=effective_cap
+    )
     _log(
         job_id,
         "Computed rolling spend series in %s",
@@ -305,46 +528,79 @@ def prepare_spend_data(
     return grid
 
 
-def prepare_monthly_heatmap_data(spend_data: pd.DataFrame) -> pd.DataFrame:
+def prepare_spend_data(
+    txns: pd.DataFrame,
+    *,
+    window: int = 31,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    exclude_categories: Optional[Iterable[str]] = None,
+    top_n_categories: Optional[int] = DEFAULT_TOP_N_CATEGORIES,
+    skip_cleanup: bool = False,
+    cap_daily_spend: Optional[float] = None,
+    auto_cap: bool = True,
+    job_id: Optional[str] = None,
+) -> pd.DataFrame:
+    """Build the daily category spend grid as one row per date and category."""
+    grid = prepare_spend_grid(
+        txns,
+        window=window,
+        start_date=start_date,
+        end_date=end_date,
+        exclude_categories=exclude_categories,
+        top_n_categories=top_n_categories,
+        skip_cleanup=skip_cleanup,
+        cap_daily_spend=cap_daily_spend,
+        auto_cap=auto_cap,
+        job_id=job_id,
+    )
+    return grid.to_frame()
+
+
+def prepare_monthly_heatmap_data(spend_data: SpendData) -> pd.DataFrame:
     """Aggregate daily category spend by calendar month."""
-    if spend_data.empty:
+    grid = _as_spend_grid(spend_data)
+    if grid.empty:
         return pd.DataFrame(
             columns=["Month", "Category", SPEND_COLUMN, DISPLAY_SPEND_COLUMN]
         )
 
-    monthly = spend_data.copy()
-    monthly["Month"] = monthly["Date"].dt.to_period("M").dt.to_timestamp()
-    return (
-        monthly.groupby(["Month", "Category"], as_index=False)[
-            [SPEND_COLUMN, DISPLAY_SPEND_COLUMN]
-        ]
-        .sum()
-        .sort_values(["Category", "Month"])
+    months, spend, display = grid.monthly()
+    return pd.DataFrame(
+        {
+            "Month": np.tile(months.to_numpy(), len(grid.categories)),
+            "Category": np.repeat(
+                np.asarray(grid.categories, dtype=object), len(months)
+            ),
+            SPEND_COLUMN: spend.T.ravel(),
+            DISPLAY_SPEND_COLUMN: display.T.ravel(),
+        }
     )
 
 
-def prepare_total_spend_data(spend_data: pd.DataFrame, *, window: int) -> pd.DataFrame:
+def prepare_total_spend_data(spend_data: SpendData, *, window: int) -> pd.DataFrame:
     """Build a total daily rolling spend series from category grid data."""
-    if spend_data.empty:
+    grid = _as_spend_grid(spend_data)
+    if grid.empty:
         return pd.DataFrame(columns=["Date", SPEND_COLUMN, DISPLAY_SPEND_COLUMN])
 
-    daily_total = (
-        spend_data.groupby("Date", as_index=False)[[SPEND_COLUMN, DISPLAY_SPEND_COLUMN]]
-        .sum()
-        .sort_values("Date")
-    )
-    daily_total[ROLLING_SPEND_COLUMN] = (
-        daily_total[DISPLAY_SPEND_COLUMN].rolling(window=window, min_periods=1).mean()
-    )
-    daily_total[RAW_ROLLING_SPEND_COLUMN] = (
-        daily_total[SPEND_COLUMN].rolling(window=window, min_periods=1).mean()
-    )
-    return daily_total
+    totals = np.stack([grid.display.sum(axis=1), grid.spend.sum(axis=1)])
+    rolling, raw_rolling = _rolling_means(totals[:, :, np.newaxis], window)
+    return pd.DataFrame(
+        {
+            "Date": grid.dates,
+            SPEND_COLUMN: totals[1],
+            DISPLAY_SPEND_COLUMN: totals[0],
+            ROLLING_SPEND_COLUMN: rolling[:, 0],
+            RAW_ROLLING_SPEND_COLUMN: raw_rolling[:, 0],
+        }
+    ).reset_index(drop=True)
 
 
-def prepare_category_share_data(spend_data: pd.DataFrame) -> pd.DataFrame:
+def prepare_category_share_data(spend_data: SpendData) -> pd.DataFrame:
     """Build category percentages from displayed rolling spend."""
-    if spend_data.empty:
+    grid = _as_spend_grid(spend_data)
+    if grid.empty:
         return pd.DataFrame(
             columns=[
                 "Date",
@@ -355,53 +611,55 @@ def prepare_category_share_data(spend_data: pd.DataFrame) -> pd.DataFrame:
             ]
         )
 
-    share_data = spend_data.copy()
-    total_rolling = share_data.groupby("Date")[ROLLING_SPEND_COLUMN].transform("sum")
-    share_data[SHARE_PERCENT_COLUMN] = (
-        share_data[ROLLING_SPEND_COLUMN].div(total_rolling).mul(100)
-    )
-    share_data.loc[total_rolling == 0, SHARE_PERCENT_COLUMN] = pd.NA
+    share_data = grid.to_frame()
+    share_data[SHARE_PERCENT_COLUMN] = grid.share_percent().ravel()
     return share_data
 
 
+def outlier_cells(
+    grid: SpendGrid, *, cap_daily_spend: Optional[float] = None
+) -> tuple[np.ndarray, str]:
+    """Finds the (date, category) cells of unusually large daily spend.
+
+    Args:
+      grid: The spend grid; must not be empty.
+      cap_daily_spend: The cap marking large category spend; defaults to the
+        grid's cap. Without either, whole days whose total spend is far above
+        the interquartile range are marked.
+
+    Returns:
+      A boolean matrix shaped like the grid, and why its cells were marked.
+    """
+    effective_cap = cap_daily_spend
+    if effective_cap is None:
+        effective_cap = grid.cap
+    if effective_cap is not None:
+        return (
+            grid.spend > effective_cap,
+            f"daily category spend over ${effective_cap:,.2f}",
+        )
+    daily_totals = grid.spend.sum(axis=1)
+    q1, q3 = np.quantile(daily_totals, [0.25, 0.75])
+    threshold = q3 + (3 * (q3 - q1))
+    spikes = np.broadcast_to(
+        (daily_totals > threshold)[:, np.newaxis], grid.spend.shape
+    )
+    return spikes, f"daily total spend over ${threshold:,.2f}"
+
+
 def build_outlier_report(
     txns: pd.DataFrame,
-    spend_data: pd.DataFrame,
+    spend_data: SpendData,
     *,
     cap_daily_spend: Optional[float] = None,
 ) -> pd.DataFrame:
     """Return transactions belonging to unusually large daily category spikes."""
-    if txns.empty or spend_data.empty:
+    grid = _as_spend_grid(spend_data)
+    if txns.empty or grid.empty:
         return pd.DataFrame()
 
-    category_spend = spend_data[["Date", "Category", SPEND_COLUMN]].copy()
-    daily_totals = spend_data.groupby("Date", as_index=False)[[SPEND_COLUMN]].sum()
-    daily_totals = daily_totals.rename(columns={SPEND_COLUMN: DAILY_TOTAL_SPEND_COLUMN})
-    category_spend = category_spend.merge(daily_totals, on="Date", how="left")
-    category_spend = category_spend.rename(
-        columns={SPEND_COLUMN: DAILY_CATEGORY_SPEND_COLUMN}
-    )
-
-    effective_cap = cap_daily_spend
-    if effective_cap is None:
-        effective_cap = spend_data.attrs.get(CAP_ATTR)
-
-    if effective_cap is not None:
-        spikes = category_spend[
-            category_spend[DAILY_CATEGORY_SPEND_COLUMN] > effective_cap
-        ].copy()
-        spikes["OutlierReason"] = f"daily category spend over ${effective_cap:,.2f}"
-    else:
-        q1 = daily_totals[DAILY_TOTAL_SPEND_COLUMN].quantile(0.25)
-        q3 = daily_totals[DAILY_TOTAL_SPEND_COLUMN].quantile(0.75)
-        iqr = q3 - q1
-        threshold = q3 + (3 * iqr)
-        spikes = category_spend[
-            category_spend[DAILY_TOTAL_SPEND_COLUMN] > threshold
-        ].copy()
-        spikes["OutlierReason"] = f"daily total spend over ${threshold:,.2f}"
-
-    if spikes.empty:
+    spikes, reason = outlier_cells(grid, cap_daily_spend=cap_daily_spend)
+    if not spikes.any():
         return pd.DataFrame(
             columns=[
                 "Date",
@@ -415,19 +673,17 @@ def build_outlier_report(
             ]
         )
 
-    outlier_txns = txns.merge(
-        spikes[
-            [
-                "Date",
-                "Category",
-                DAILY_CATEGORY_SPEND_COLUMN,
-                DAILY_TOTAL_SPEND_COLUMN,
-                "OutlierReason",
-            ]
-        ],
-        on=["Date", "Category"],
-        how="inner",
+    rows, columns = np.nonzero(spikes)
+    spike_cells = pd.DataFrame(
+        {
+            "Date": grid.dates[rows],
+            "Category": np.asarray(grid.categories, dtype=object)[columns],
+            DAILY_CATEGORY_SPEND_COLUMN: grid.spend[rows, columns],
+            DAILY_TOTAL_SPEND_COLUMN: grid.spend[rows].sum(axis=1),
+            "OutlierReason": reason,
+        }
     )
+    outlier_txns = txns.merge(spike_cells, on=["Date", "Category"], how="inner")
     return outlier_txns.sort_values(
         ["Date", DAILY_CATEGORY_SPEND_COLUMN, SPEND_COLUMN],
         ascending=[True, False, False],
@@ -440,15 +696,42 @@ def write_outlier_report(outlier_report: pd.DataFrame, output_path: Path) -> Non
     outlier_report.to_csv(output_path, index=False)
 
 
+def _date_axis(dates: pd.DatetimeIndex, *, compact: bool) -> dict[str, object]:
+    """Return trace keyword arguments placing a series on dates.
+
+    Compact charts describe an evenly spaced daily axis by its first date and a
+    one day step rather than repeating an ISO date string for every point.
+    """
+    steps = np.diff(dates.to_numpy())
+    if compact and len(dates) and (steps == np.timedelta64(1, "D")).all():
+        return {"x0": dates[0].strftime("%Y-%m-%d"), "dx": DAY_MS}
+    return {"x": dates}
+
+
+def _trace_values(values: object, *, compact: bool) -> np.ndarray:
+    """Return trace values, reduced to float32 for compact charts.
+
+    Plotly encodes numeric arrays as base64 typed arrays, so halving the width
+    halves the embedded payload; float32 still resolves cents below $100k.
+    """
+    return np.asarray(values, dtype=np.float32 if compact else np.float64)
+
+
 def _add_total_spend_trace(
-    fig: go.Figure, total_spend: pd.DataFrame, *, include_customdata: bool
+    fig: go.Figure,
+    total_spend: pd.DataFrame,
+    *,
+    include_customdata: bool,
+    compact: bool = False,
 ) -> None:
     hovertemplate = (
         "%{x|%Y-%m-%d}<br>" "Displayed rolling spend: $%{y:,.2f}<extra></extra>"
     )
     trace_kwargs: dict[str, object] = {}
     if include_customdata:
-        trace_kwargs["customdata"] = total_spend[[RAW_ROLLING_SPEND_COLUMN]]
+        trace_kwargs["customdata"] = _trace_values(
+            total_spend[[RAW_ROLLING_SPEND_COLUMN]], compact=compact
+        )
         hovertemplate = (
             "%{x|%Y-%m-%d}<br>"
             "Displayed rolling spend: $%{y:,.2f}<br>"
@@ -456,8 +739,8 @@ def _add_total_spend_trace(
         )
     fig.add_trace(
         go.Scatter(
-            x=total_spend["Date"],
-            y=total_spend[ROLLING_SPEND_COLUMN],
+            **_date_axis(pd.DatetimeIndex(total_spend["Date"]), compact=compact),
+            y=_trace_values(total_spend[ROLLING_SPEND_COLUMN], compact=compact),
             mode="lines",
             name="Total rolling spend",
             line={"color": "#1f77b4", "width": 2},
@@ -469,20 +752,18 @@ def _add_total_spend_trace(
     )
 
 
-def _add_outlier_markers(fig: go.Figure, spend_data: pd.DataFrame, *, row: int) -> None:
-    capped_totals = (
-        spend_data[spend_data[CAPPED_COLUMN]]
-        .groupby("Date", as_index=False)[[SPEND_COLUMN]]
-        .sum()
-        .sort_values("Date")
-    )
-    if capped_totals.empty:
+def _add_outlier_markers(
+    fig: go.Figure, grid: SpendGrid, *, row: int, compact: bool = False
+) -> None:
+    capped_days = np.flatnonzero(grid.capped.any(axis=1))
+    if capped_days.size == 0:
         return
 
+    capped_totals = np.where(grid.capped, grid.spend, 0.0).sum(axis=1)
     fig.add_trace(
         go.Scatter(
-            x=capped_totals["Date"],
-            y=capped_totals[SPEND_COLUMN],
+            x=grid.dates[capped_days],
+            y=_trace_values(capped_totals[capped_days], compact=compact),
             mode="markers",
             name="Capped/outlier days",
             marker={"color": "#d62728", "size": 8, "symbol": "diamond"},
@@ -505,14 +786,15 @@ def _category_colors(categories: list[str]) -> dict[str, str]:
 
 def _add_category_area_traces(
     fig: go.Figure,
-    spend_data: pd.DataFrame,
+    grid: SpendGrid,
     category_colors: dict[str, str],
     *,
     row: int,
     include_customdata: bool,
+    compact: bool = False,
 ) -> None:
-    for category in sorted(spend_data["Category"].unique()):
-        category_data = spend_data[spend_data["Category"] == category]
+    x = _date_axis(grid.dates, compact=compact)
+    for index, category in enumerate(grid.categories):
         hovertemplate = (
             "%{x|%Y-%m-%d}<br>"
             f"{category}<br>"
@@ -526,11 +808,11 @@ def _add_category_area_traces(
                 "Displayed rolling spend: $%{y:,.2f}<br>"
                 "Capped: %{customdata}<extra></extra>"
             )
-            trace_kwargs["customdata"] = category_data[CAPPED_COLUMN]
+            trace_kwargs["customdata"] = grid.capped[:, index]
         fig.add_trace(
             go.Scatter(
-                x=category_data["Date"],
-                y=category_data[ROLLING_SPEND_COLUMN],
+                **x,
+                y=_trace_values(grid.rolling[:, index], compact=compact),
                 mode="lines",
                 stackgroup="category_spend",
                 hoveron="points+fills",
@@ -546,17 +828,19 @@ def _add_category_area_traces(
 
 def _add_category_share_traces(
     fig: go.Figure,
-    share_data: pd.DataFrame,
+    grid: SpendGrid,
+    share: np.ndarray,
     category_colors: dict[str, str],
     *,
     row: int,
+    compact: bool = False,
 ) -> None:
-    for category in sorted(share_data["Category"].unique()):
-        category_data = share_data[share_data["Category"] == category]
+    x = _date_axis(grid.dates, compact=compact)
+    for index, category in enumerate(grid.categories):
         fig.add_trace(
             go.Scatter(
-                x=category_data["Date"],
-                y=category_data[SHARE_PERCENT_COLUMN],
+                **x,
+                y=_trace_values(share[:, index], compact=compact),
                 mode="lines",
                 stackgroup="category_share",
                 groupnorm="percent",
@@ -575,18 +859,22 @@ def _add_category_share_traces(
         )
 
 
-def _add_monthly_heatmap(fig: go.Figure, monthly_spend: pd.DataFrame) -> None:
-    if monthly_spend.empty:
+def _add_monthly_heatmap(
+    fig: go.Figure,
+    categories: list[str],
+    monthly: tuple[pd.DatetimeIndex, np.ndarray, np.ndarray],
+    *,
+    compact: bool = False,
+) -> None:
+    months, _, display = monthly
+    if display.size == 0:
         return
 
-    heatmap = monthly_spend.pivot(
-        index="Category", columns="Month", values=DISPLAY_SPEND_COLUMN
-    ).fillna(0)
     fig.add_trace(
         go.Heatmap(
-            x=heatmap.columns,
-            y=heatmap.index,
-            z=heatmap.values,
+            x=months,
+            y=categories,
+            z=_trace_values(display.T, compact=compact),
             colorscale="Viridis",
             colorbar={"title": "Displayed monthly spend"},
             hovertemplate=(
@@ -601,7 +889,7 @@ def _add_monthly_heatmap(fig: go.Figure, monthly_spend: pd.DataFrame) -> None:
 
 
 def write_spend_chart(  # noqa: C901
-    spend_data: pd.DataFrame,
+    spend_data: SpendData,
     output_path: Path,
     *,
     window: int,
@@ -610,43 +898,51 @@ def write_spend_chart(  # noqa: C901
     include_total_spend: bool = True,
     include_category_share: bool = True,
     include_customdata: bool = True,
+    compact: bool = False,
+    plotlyjs: str = "cdn",
 ) -> None:
-    """Write an interactive multi-view spending report to output_path."""
+    """Write an interactive multi-view spending report to output_path.
+
+    Compact reports store trace values as float32 and daily axes as a start
+    date plus a one day step. `plotlyjs` is passed to plotly's
+    `include_plotlyjs`: "cdn", or the URL of a self-hosted plotly.js.
+    """
     chart_start = time.perf_counter()
+    grid = _as_spend_grid(spend_data)
     _log(
         job_id,
         "Starting chart build with %d spend rows across %d categories",
-        len(spend_data),
-        spend_data["Category"].nunique() if not spend_data.empty else 0,
+        len(grid),
+        len(grid.categories),
     )
     stage_start = time.perf_counter()
     total_spend = pd.DataFrame()
     if include_total_spend:
-        total_spend = prepare_total_spend_data(spend_data, window=window)
+        total_spend = prepare_total_spend_data(grid, window=window)
         _log(
             job_id,
             "Prepared total spend series with %d rows in %s",
             len(total_spend),
             f"{time.perf_counter() - stage_start:.2f}s",
         )
-    share_data = pd.DataFrame()
+    share = None
     if include_category_share:
         stage_start = time.perf_counter()
-        share_data = prepare_category_share_data(spend_data)
+        share = grid.share_percent()
         _log(
             job_id,
             "Prepared share series with %d rows in %s",
-            len(share_data),
+            share.size,
             f"{time.perf_counter() - stage_start:.2f}s",
         )
-    monthly_spend = pd.DataFrame()
+    monthly = None
     if include_heatmap:
         stage_start = time.perf_counter()
-        monthly_spend = prepare_monthly_heatmap_data(spend_data)
+        monthly = grid.monthly()
         _log(
             job_id,
             "Prepared monthly heatmap with %d rows in %s",
-            len(monthly_spend),
+            monthly[1].size,
             f"{time.perf_counter() - stage_start:.2f}s",
         )
     stage_start = time.perf_counter()
@@ -694,29 +990,32 @@ def write_spend_chart(  # noqa: C901
             fig,
             total_spend,
             include_customdata=include_customdata,
+            compact=compact,
         )
         trace_count += 1
-        _add_outlier_markers(fig, spend_data, row=current_row)
+        _add_outlier_markers(fig, grid, row=current_row, compact=compact)
         trace_count += 1
         current_row += 1
     category_row = current_row
     share_row = current_row + 1 if include_category_share else None
-    if not spend_data.empty:
-        categories = sorted(spend_data["Category"].unique())
-        category_colors = _category_colors(categories)
+    if not grid.empty:
+        category_colors = _category_colors(grid.categories)
         _add_category_area_traces(
             fig,
-            spend_data,
+            grid,
             category_colors,
             row=category_row,
             include_customdata=include_customdata,
+            compact=compact,
         )
-        trace_count += len(categories)
-        if include_category_share and not share_data.empty and share_row is not None:
-            _add_category_share_traces(fig, share_data, category_colors, row=share_row)
-            trace_count += len(categories)
-        if include_heatmap:
-            _add_monthly_heatmap(fig, monthly_spend)
+        trace_count += len(grid.categories)
+        if share is not None and share_row is not None:
+            _add_category_share_traces(
+                fig, grid, share, category_colors, row=share_row, compact=compact
+            )
+            trace_count += len(grid.categories)
+        if monthly is not None:
+            _add_monthly_heatmap(fig, grid.categories, monthly, compact=compact)
             trace_count += 1
     _log(
         job_id,
@@ -732,7 +1031,7 @@ def write_spend_chart(  # noqa: C901
         height=1400,
         legend_title_text="Category",
     )
-    cap = spend_data.attrs.get(CAP_ATTR)
+    cap = grid.cap
     if cap is not None:
         fig.add_annotation(
             text=f"Visual cap applied to daily category spend: ${cap:,.2f}",
@@ -771,7 +1070,7 @@ def write_spend_chart(  # noqa: C901
     _log(job_id, "Writing chart HTML to %s", output_path)
     fig.write_html(
         output_path,
-        include_plotlyjs="cdn",
+        include_plotlyjs=plotlyjs,
         full_html=True,
         validate=False,
     )
@@ -829,6 +1128,11 @@ def build_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument("--exclude-category", action="append", default=[])
     parser.add_argument("--skip-cleanup", action="store_true")
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write float32 trace values and start-plus-step daily axes.",
+    )
     return parser
 
 
@@ -859,7 +1163,7 @@ def main(argv: Optional[list[str]] = None) -> None:
         skip_cleanup=args.skip_cleanup,
     )
     grouped_txns = _apply_top_n_category_grouping(prepared_txns, args.top_n_categories)
-    spend_data = prepare_spend_data(
+    spend_data = prepare_spend_grid(
         grouped_txns,
         window=args.window,
         top_n_categories=None,
@@ -867,7 +1171,7 @@ def main(argv: Optional[list[str]] = None) -> None:
         cap_daily_spend=args.cap_daily_spend,
         auto_cap=not args.no_auto_cap,
     )
-    write_spend_chart(spend_data, args.output, window=args.window)
+    write_spend_chart(spend_data, args.output, window=args.window, compact=args.compact)
     logger.info("Wrote %s.", args.output)
 
     if args.outlier_report is not None:
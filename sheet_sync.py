@@ -0,0 +1,406 @@
+"""Delta writes of DataFrames to worksheets, and a local mirror for reads.
+
+``write_dataframe`` compares an outgoing frame with the snapshot of what the
+worksheet last held in this process, either as read with ``read_dataframe`` or
+as last written, matching rows by ``IDENTIFIER_COLUMNS``. The difference is
+applied as one ``batchUpdate`` that deletes and inserts rows plus one values
+``batchUpdate`` that fills in new and changed rows. Without a usable snapshot,
+when the spreadsheet was modified since the snapshot was taken, or when most
+rows changed anyway, the frame is rewritten with ``set_dataframe``.
+
+When ``SHEET_MIRROR_DIR`` is set, ``read_dataframe`` also keeps a copy of each
+worksheet there, tagged with the spreadsheet's Drive ``modifiedTime``. Reads
+are served from it while the spreadsheet is unmodified, and writes through
+``write_dataframe`` drop it so the next read downloads what the sheet holds."""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Hashable, Iterable, Optional, Sequence
+
+import pandas as pd
+import pygsheets
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Rewrite the whole tab once the delta touches more than this share of rows.
+FULL_REWRITE_FRACTION = 0.25
+# What set_dataframe writes for missing values.
+NAN = "NaN"
+# Directory of the local worksheet mirror; unset disables it.
+_MIRROR_DIR_ENV = os.getenv("SHEET_MIRROR_DIR")
+MIRROR_DIR: Optional[Path] = Path(_MIRROR_DIR_ENV) if _MIRROR_DIR_ENV else None
+
+# The frame each worksheet held as last read or written, with the spreadsheet
+# revision it was taken at.
+_snapshots: dict[tuple[Hashable, Hashable], tuple[Optional[str], pd.DataFrame]] = {}
+
+
+@dataclass
+class SheetDelta:
+    """Row changes that turn the previous tab contents into the new frame.
+
+    Row positions are 0-based offsets into the data rows, below the header.
+    """
+
+    # Positions in the previous frame, ascending.
+    deleted: list[int] = field(default_factory=list)
+    # Positions in the new frame of rows that did not exist before, ascending.
+    inserted: list[int] = field(default_factory=list)
+    # Positions in the new frame of kept rows whose values changed.
+    changed: list[int] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.deleted) + len(self.inserted) + len(self.changed)
+
+
+def _key(worksheet: pygsheets.Worksheet) -> tuple[Hashable, Hashable]:
+    return (worksheet.spreadsheet.id, worksheet.id)
+
+
+def _mirror_path(worksheet: pygsheets.Worksheet) -> Optional[Path]:
+    if MIRROR_DIR is None:
+        return None
+    return MIRROR_DIR / f"{worksheet.spreadsheet.id}-{worksheet.id}.pkl"
+
+
+def _revision(worksheet: pygsheets.Worksheet) -> Optional[str]:
+    """Returns the spreadsheet's last modified time, or None if unavailable."""
+    try:
+        return str(worksheet.spreadsheet.updated)
+    except Exception:
+        logger.warning("Could not fetch the spreadsheet revision.", exc_info=True)
+        return None
+
+
+def _load_mirror(path: Path, revision: str) -> Optional[pd.DataFrame]:
+    """Returns the mirrored frame if it was taken at `revision`."""
+    try:
+        with open(path, "rb") as f:
+            mirror = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Ignoring unreadable sheet mirror %s.", path, exc_info=True)
+        return None
+    if mirror.get("revision") != revision:
+        return None
+    return mirror["frame"]
+
+
+def _save_mirror(path: Path, revision: str, frame: pd.DataFrame) -> None:
+    """Atomically stores `frame` as the mirror at `revision`.
+
+    The mirror is an optimization, so failures are logged and otherwise ignored.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"revision": revision, "frame": frame},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Could not write sheet mirror %s.", path, exc_info=True)
+
+
+def read_dataframe(worksheet: pygsheets.Worksheet) -> pd.DataFrame:
+    """Reads a worksheet as strings and remembers it as the delta baseline.
+
+    With the mirror enabled this costs one Drive metadata request instead of
+    a download while the spreadsheet is unmodified.
+
+    Args:
+      worksheet: The worksheet to read.
+
+    Returns:
+      The worksheet as get_as_df(numerize=False) returns it.
+    """
+    path = _mirror_path(worksheet)
+    # Fetched before downloading, so edits made during the download leave
+    # the mirror and snapshot tagged with an older revision rather than
+    # hiding them.
+    revision = _revision(worksheet)
+    frame = None if path is None or revision is None else _load_mirror(path, revision)
+    if frame is None:
+        frame = worksheet.get_as_df(numerize=False)
+        if path is not None and revision is not None:
+            _save_mirror(path, revision, frame)
+    else:
+        logger.info("Read '%s' from the local mirror.", worksheet.title)
+    _snapshots[_key(worksheet)] = (revision, frame.copy())
+    return frame
+
+
+def _drop_mirror(worksheet: pygsheets.Worksheet) -> None:
+    """Removes the mirror of a worksheet that was just written.
+
+    Rebuilding it from the written frame could not reproduce what get_as_df
+    returns, such as its RangeIndex, and the revision read after the write
+    could hide edits made meanwhile; the next read downloads instead.
+    """
+    path = _mirror_path(worksheet)
+    if path is None:
+        return
+    try:
+        path.unlink(missing_ok=True)
+    except OSError:
+        logger.warning("Could not remove sheet mirror %s.", path, exc_info=True)
+
+
+def forget(worksheet: pygsheets.Worksheet) -> None:
+    """Drops the snapshot so the next write rewrites the whole worksheet.
+
+    Call this before changing the worksheet other than with write_dataframe.
+    """
+    _snapshots.pop(_key(worksheet), None)
+
+
+def clear() -> None:
+    """Drops all snapshots."""
+    _snapshots.clear()
+
+
+def _values(frame: pd.DataFrame) -> pd.DataFrame:
+    """Returns the cell strings set_dataframe would send for `frame`."""
+    return frame.fillna(NAN).astype(str)
+
+
+def _canonical(frame: pd.DataFrame) -> pd.DataFrame:
+    """Returns cell strings that compare equal when the sheet shows the same value.
+
+    Values read back from a sheet lose trailing decimal zeros, so "12.50" and
+    "12.5" are both written as "12.5" and "-10.0" as "-10".
+    """
+    text = _values(frame)
+    for column in text.columns:
+        text[column] = (
+            text[column]
+            .str.replace(r"^(-?\d+\.\d*?)0+$", r"\1", regex=True)
+            .str.replace(r"^(-?\d+)\.$", r"\1", regex=True)
+        )
+    return text
+
+
+def _row_keys(text: pd.DataFrame, key_columns: Sequence[str]) -> list[tuple]:
+    return list(text[list(key_columns)].itertuples(index=False, name=None))
+
+
+def compute_delta(
+    previous: pd.DataFrame, current: pd.DataFrame, key_columns: Sequence[str]
+) -> Optional[SheetDelta]:
+    """Matches rows of two frames by `key_columns` and returns their difference.
+
+    Args:
+      previous: The frame the worksheet currently holds.
+      current: The frame the worksheet should hold.
+      key_columns: Columns that identify a row.
+
+    Returns:
+      The delta, or None when it cannot be expressed as row inserts, deletes
+      and updates: the headers differ, a key is duplicated, or kept rows
+      were reordered.
+    """
+    if list(previous.columns) != list(current.columns):
+        return None
+    if not set(key_columns).issubset(current.columns):
+        return None
+    old_text = _canonical(previous)
+    new_text = _canonical(current)
+    old_keys = _row_keys(old_text, key_columns)
+    new_keys = _row_keys(new_text, key_columns)
+    new_positions = {key: position for position, key in enumerate(new_keys)}
+    if len(new_positions) != len(new_keys) or len(set(old_keys)) != len(old_keys):
+        return None
+
+    delta = SheetDelta()
+    kept: list[tuple[int, int]] = []
+    for old_position, key in enumerate(old_keys):
+        new_position = new_positions.get(key)
+        if new_position is None:
+            delta.deleted.append(old_position)
+        else:
+            kept.append((old_position, new_position))
+    if any(a[1] >= b[1] for a, b in zip(kept, kept[1:])):
+        return None
+
+    kept_positions = {new_position for _, new_position in kept}
+    delta.inserted = [p for p in range(len(new_keys)) if p not in kept_positions]
+    old_rows = old_text.to_numpy()
+    new_rows = new_text.to_numpy()
+    delta.changed = [
+        new_position
+        for old_position, new_position in kept
+        if (old_rows[old_position] != new_rows[new_position]).any()
+    ]
+    return delta
+
+
+def _runs(positions: Iterable[int]) -> list[tuple[int, int]]:
+    """Coalesces ascending positions into (first, count) runs."""
+    runs: list[tuple[int, int]] = []
+    for position in positions:
+        if runs and runs[-1][0] + runs[-1][1] == position:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((position, 1))
+    return runs
+
+
+def _column_label(number: int) -> str:
+    """Returns the A1 letters of the 1-based column `number`."""
+    label = ""
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        label = chr(ord("A") + remainder) + label
+    return label
+
+
+def delete_rows(worksheet: pygsheets.Worksheet, rows: Iterable[int]) -> None:
+    """Deletes 1-based sheet `rows` with a single batchUpdate.
+
+    Args:
+      worksheet: The worksheet to delete rows from.
+      rows: Sheet row numbers to delete, in any order.
+    """
+    requests = _delete_requests(worksheet, [row - 1 for row in sorted(set(rows))])
+    if requests:
+        forget(worksheet)
+        worksheet.spreadsheet.custom_request(requests, fields="")
+
+
+def _dimension_range(
+    worksheet: pygsheets.Worksheet, start: int, count: int
+) -> dict[str, Any]:
+    return {
+        "sheetId": worksheet.id,
+        "dimension": "ROWS",
+        "startIndex": start,
+        "endIndex": start + count,
+    }
+
+
+def _delete_requests(
+    worksheet: pygsheets.Worksheet, indexes: Sequence[int]
+) -> list[dict[str, Any]]:
+    # Delete bottom-up so earlier row indexes stay valid.
+    return [
+        {"deleteDimension": {"range": _dimension_range(worksheet, start, count)}}
+        for start, count in reversed(_runs(indexes))
+    ]
+
+
+def _structure_requests(
+    worksheet: pygsheets.Worksheet, delta: SheetDelta, kept_rows: int
+) -> list[dict[str, Any]]:
+    """Returns the row deletes and inserts of `delta` as batchUpdate requests."""
+    # Sheet index = data position + 1 for the header row.
+    requests = _delete_requests(worksheet, [p + 1 for p in delta.deleted])
+    table_rows = kept_rows
+    for start, count in _runs(delta.inserted):
+        if start >= table_rows:
+            # Rows past the end of the table may lie past the end of the grid,
+            # where insertDimension fails, so grow the grid instead.
+            requests.append(
+                {
+                    "appendDimension": {
+                        "sheetId": worksheet.id,
+                        "dimension": "ROWS",
+                        "length": count,
+                    }
+                }
+            )
+        else:
+            requests.append(
+                {
+                    "insertDimension": {
+                        "range": _dimension_range(worksheet, start + 1, count),
+                        # Row 1 is the header, so rows inserted right below
+                        # it take their formatting from the row after.
+                        "inheritFromBefore": start > 0,
+                    }
+                }
+            )
+        table_rows += count
+    return requests
+
+
+def apply_delta(
+    worksheet: pygsheets.Worksheet, frame: pd.DataFrame, delta: SheetDelta
+) -> None:
+    """Applies `delta` to the worksheet in at most two batchUpdate calls.
+
+    Args:
+      worksheet: The worksheet holding the frame `delta` was computed from.
+      frame: The new frame.
+      delta: The result of compute_delta for `frame`.
+    """
+    kept_rows = len(frame) - len(delta.inserted)
+    requests = _structure_requests(worksheet, delta, kept_rows)
+    if requests:
+        worksheet.spreadsheet.custom_request(requests, fields="")
+
+    written = sorted(delta.inserted + delta.changed)
+    if not written:
+        return
+    values = _values(frame).to_numpy().tolist()
+    last_column = _column_label(len(frame.columns))
+    ranges = []
+    blocks = []
+    for start, count in _runs(written):
+        ranges.append(f"A{start + 2}:{last_column}{start + count + 1}")
+        blocks.append(values[start : start + count])
+    worksheet.update_values_batch(ranges, blocks)
+
+
+def write_dataframe(
+    worksheet: pygsheets.Worksheet,
+    frame: pd.DataFrame,
+    key_columns: Optional[Sequence[str]] = None,
+) -> None:
+    """Makes the worksheet hold `frame`, writing only the rows that changed.
+
+    Args:
+      worksheet: The worksheet to update.
+      frame: The frame to write below a header row, without its index.
+      key_columns: Columns that identify a row. Defaults to
+        `IDENTIFIER_COLUMNS`.
+    """
+    if key_columns is None:
+        key_columns = config.GLOBAL.IDENTIFIER_COLUMNS
+    key = _key(worksheet)
+    revision, previous = _snapshots.pop(key, (None, None))
+    if previous is not None and (revision is None or _revision(worksheet) != revision):
+        # Row positions in the snapshot are only valid for the sheet it was
+        # taken from; another writer may have inserted or deleted rows since.
+        logger.info("'%s' changed since it was last read.", worksheet.title)
+        previous = None
+    delta = None if previous is None else compute_delta(previous, frame, key_columns)
+    if delta is None or delta.size > FULL_REWRITE_FRACTION * max(len(frame), 1):
+        logger.info("Rewriting all %d rows of '%s'.", len(frame), worksheet.title)
+        worksheet.set_dataframe(frame, "A1", fit=True)
+    else:
+        logger.info(
+            "Updating '%s': %d rows deleted, %d inserted, %d changed.",
+            worksheet.title,
+            len(delta.deleted),
+            len(delta.inserted),
+            len(delta.changed),
+        )
+        apply_delta(worksheet, frame, delta)
+    # Only reached when the write succeeded; on errors the snapshot stays
+    # dropped so the next write starts over with a full rewrite. The revision
+    # is only available after the write, so an edit landing between the write
+    # and this request goes unnoticed.
+    _snapshots[key] = (_revision(worksheet), frame.copy())
+    _drop_mirror(worksheet)
@@ -0,0 +1,450 @@
+"""Incremental upkeep of the report's daily spend grid.
+
+Each report used to prepare the whole transaction history and rebuild the
+spend grid from it, although usually only the last few days changed since the
+previous report. When ``SPEND_GRID_DIR`` is set, ``update_spend_grid`` keeps a
+``SpendSnapshot`` there: daily spend totals per category, the SpendGrid built
+from them, and a fingerprint of every transaction row they include. The next
+report diffs the current rows against those fingerprints, prepares only the
+added rows, subtracts the removed ones from the totals and recomputes rolling
+values from the first changed day on.
+
+The snapshot is only reused with the same window, date filters, top-N and cap
+options and category rules; any change rebuilds the grid in full.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import rules
+import schema
+from scripts import generate_spend_charts
+from scripts.generate_spend_charts import SpendGrid
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the spend grid snapshot; unset disables it.
+SNAPSHOT_DIR: Optional[Path] = (
+    Path(os.environ["SPEND_GRID_DIR"]) if os.getenv("SPEND_GRID_DIR") else None
+)
+SNAPSHOT_FILE_NAME = "spend_grid.pkl"
+# Bump when the layout of SpendSnapshot or the way it is derived changes.
+SNAPSHOT_VERSION = 2
+# Transaction amounts are in cents. Cell totals are rounded to them after
+# adding and subtracting rows, so float residue cannot move a cell tied with
+# others across the auto cap's trim threshold.
+SPEND_DECIMALS = 2
+
+
+@dataclass
+class SpendSnapshot:
+    """The state one report's spend grid was built from.
+
+    Row arrays are ordered by `keys`; cell matrices have a row per day from
+    `first_day` and a column per entry of `categories`.
+
+    Attributes:
+      settings: The options and rules the grid was built with.
+      watermark: Digest of `keys`, identifying the transaction set.
+      keys: Sorted fingerprints of the transaction rows.
+      days: Each row's day number since the epoch, or -1 if it was filtered
+        out.
+      columns: Each row's index into `categories`, or -1 if filtered out.
+      spend: Each row's spend.
+      categories: Categories after the rules, before top-N grouping.
+      first_day: The day number of the first cell row.
+      totals: Daily spend by category.
+      counts: The number of transactions in each `totals` cell.
+      grid: The SpendGrid built from `totals`.
+    """
+
+    settings: dict[str, Any]
+    watermark: str
+    keys: np.ndarray
+    days: np.ndarray
+    columns: np.ndarray
+    spend: np.ndarray
+    categories: list[str]
+    first_day: int
+    totals: np.ndarray
+    counts: np.ndarray
+    grid: SpendGrid
+
+    @classmethod
+    def empty(cls, settings: dict[str, Any]) -> "SpendSnapshot":
+        """Returns a snapshot of no transactions."""
+        return cls(
+            settings=settings,
+            watermark="",
+            keys=np.zeros(0, dtype=np.uint64),
+            days=np.zeros(0, dtype=np.int64),
+            columns=np.zeros(0, dtype=np.int64),
+            spend=np.zeros(0),
+            categories=[],
+            first_day=0,
+            totals=np.zeros((0, 0)),
+            counts=np.zeros((0, 0), dtype=np.int64),
+            grid=SpendGrid.empty_grid(),
+        )
+
+
+def load_snapshot(settings: dict[str, Any]) -> Optional[SpendSnapshot]:
+    """Loads the saved snapshot if it was built with `settings`."""
+    if SNAPSHOT_DIR is None:
+        return None
+    path = SNAPSHOT_DIR / SNAPSHOT_FILE_NAME
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning(
+            "Ignoring unreadable spend grid snapshot %s.", path, exc_info=True
+        )
+        return None
+    if not isinstance(snapshot, SpendSnapshot) or snapshot.settings != settings:
+        logger.info("Spend grid settings or rules changed; rebuilding the grid.")
+        return None
+    return snapshot
+
+
+def save_snapshot(snapshot: SpendSnapshot) -> None:
+    """Atomically stores `snapshot`; failures are logged and ignored."""
+    if SNAPSHOT_DIR is None:
+        return
+    path = SNAPSHOT_DIR / SNAPSHOT_FILE_NAME
+    try:
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Could not write spend grid snapshot %s.", path, exc_info=True)
+
+
+def row_keys(txns: pd.DataFrame) -> np.ndarray:
+    """Fingerprints each transaction row; identical rows get distinct keys."""
+    hashed = pd.util.hash_pandas_object(txns, index=False).to_numpy()
+    occurrence = pd.Series(hashed).groupby(hashed).cumcount().to_numpy()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({"row": hashed, "occurrence": occurrence}), index=False
+    ).to_numpy()
+
+
+def _contributions(
+    txns: pd.DataFrame,
+    rows: np.ndarray,
+    *,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    job_id: Optional[str],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Prepares `txns` rows and returns each row's day, category and spend.
+
+    Rows that the cleanup or the date filters drop get day -1.
+    """
+    days = np.full(len(rows), -1, dtype=np.int64)
+    labels = np.full(len(rows), None, dtype=object)
+    spend = np.zeros(len(rows))
+    if not len(rows):
+        return days, labels, spend
+    prepared = generate_spend_charts._prepare_transactions(
+        txns.iloc[rows].reset_index(drop=True),
+        start_date=start_date,
+        end_date=end_date,
+        job_id=job_id,
+    )
+    category = prepared["Category"].astype(object)
+    prepared = prepared[category.notna()]
+    kept = prepared.index.to_numpy()
+    days[kept] = prepared["Date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    labels[kept] = category[prepared.index].to_numpy()
+    spend[kept] = prepared[generate_spend_charts.SPEND_COLUMN].to_numpy()
+    return days, labels, spend
+
+
+def _resize(
+    snapshot: SpendSnapshot, first_day: int, last_day: int, categories: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the snapshot's cell matrices padded to cover the given days."""
+    totals = np.zeros((last_day - first_day + 1, categories))
+    counts = np.zeros(totals.shape, dtype=np.int64)
+    rows, columns = snapshot.totals.shape
+    offset = snapshot.first_day - first_day
+    totals[offset : offset + rows, :columns] = snapshot.totals
+    counts[offset : offset + rows, :columns] = snapshot.counts
+    return totals, counts
+
+
+def _apply_changes(
+    previous: SpendSnapshot,
+    txns: pd.DataFrame,
+    order: np.ndarray,
+    keys: np.ndarray,
+    *,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    job_id: Optional[str],
+) -> SpendSnapshot:
+    """Returns `previous` updated to the `txns` rows whose sorted keys are `keys`.
+
+    Args:
+      previous: The snapshot to update; it is not modified.
+      txns: The current transactions.
+      order: The `txns` row of each key.
+      keys: The sorted fingerprints of the `txns` rows.
+      start_date: Drop transactions before this date.
+      end_date: Drop transactions after this date.
+      job_id: Report job ID for log messages.
+    """
+    known = np.zeros(len(keys), dtype=bool)
+    position = np.searchsorted(previous.keys, keys)
+    if len(previous.keys):
+        known = previous.keys[np.minimum(position, len(previous.keys) - 1)] == keys
+    removed = np.ones(len(previous.keys), dtype=bool)
+    removed[position[known]] = False
+    added = ~known
+    new_days, labels, new_spend = _contributions(
+        txns, order[added], start_date=start_date, end_date=end_date, job_id=job_id
+    )
+
+    categories = list(previous.categories)
+    live = new_days >= 0
+    categories += sorted(set(labels[live]) - set(categories))
+    new_columns = np.full(len(new_days), -1, dtype=np.int64)
+    new_columns[live] = pd.Index(categories).get_indexer(pd.Index(labels[live]))
+
+    gone = removed & (previous.columns >= 0)
+    day_bounds = [new_days[live]]
+    if previous.totals.size:
+        day_bounds.append(
+            np.array(
+                [previous.first_day, previous.first_day + len(previous.totals) - 1]
+            )
+        )
+    bounds = np.concatenate(day_bounds)
+    first_day, last_day = (
+        (int(bounds.min()), int(bounds.max())) if bounds.size else (0, -1)
+    )
+    totals, counts = _resize(previous, first_day, last_day, len(categories))
+    gone_cells = (previous.days[gone] - first_day, previous.columns[gone])
+    np.subtract.at(totals, gone_cells, previous.spend[gone])
+    np.subtract.at(counts, gone_cells, 1)
+    new_cells = (new_days[live] - first_day, new_columns[live])
+    np.add.at(totals, new_cells, new_spend[live])
+    np.add.at(counts, new_cells, 1)
+    touched = tuple(np.concatenate(axis) for axis in zip(gone_cells, new_cells))
+    totals[touched] = totals[touched].round(SPEND_DECIMALS)
+    totals[counts == 0] = 0.0
+
+    days = np.empty(len(keys), dtype=np.int64)
+    columns = np.empty(len(keys), dtype=np.int64)
+    spend = np.empty(len(keys))
+    days[known] = previous.days[position[known]]
+    columns[known] = previous.columns[position[known]]
+    spend[known] = previous.spend[position[known]]
+    days[added], columns[added], spend[added] = new_days, new_columns, new_spend
+    return _compact(
+        SpendSnapshot(
+            settings=previous.settings,
+            watermark="",
+            keys=keys,
+            days=days,
+            columns=columns,
+            spend=spend,
+            categories=categories,
+            first_day=first_day,
+            totals=totals,
+            counts=counts,
+            grid=previous.grid,
+        )
+    )
+
+
+def _compact(snapshot: SpendSnapshot) -> SpendSnapshot:
+    """Drops leading and trailing days and categories without transactions."""
+    counts = snapshot.counts
+    live_days = np.flatnonzero(counts.any(axis=1))
+    first, last = (live_days[0], live_days[-1] + 1) if live_days.size else (0, 0)
+    used = counts.any(axis=0)
+    remap = np.cumsum(used) - 1
+    live = snapshot.columns >= 0
+    snapshot.columns[live] = remap[snapshot.columns[live]]
+    snapshot.categories = [snapshot.categories[index] for index in np.flatnonzero(used)]
+    snapshot.first_day += int(first)
+    snapshot.totals = snapshot.totals[first:last, used]
+    snapshot.counts = counts[first:last, used]
+    return snapshot
+
+
+def _grouped_labels(
+    categories: list[str], totals: np.ndarray, top_n_categories: Optional[int]
+) -> list[str]:
+    """Maps categories outside the top N by total spend to Other."""
+    if top_n_categories is None:
+        return list(categories)
+    top = {
+        categories[index]
+        for index in np.argsort(-totals, kind="stable")[:top_n_categories]
+    }
+    return [category if category in top else "Other" for category in categories]
+
+
+def _build_grid(
+    snapshot: SpendSnapshot,
+    *,
+    window: int,
+    top_n_categories: Optional[int],
+    cap_daily_spend: Optional[float],
+    auto_cap: bool,
+) -> SpendGrid:
+    """Builds the SpendGrid of `snapshot`, reusing its previous grid."""
+    if not snapshot.totals.size:
+        return SpendGrid.empty_grid()
+    labels = np.asarray(
+        _grouped_labels(
+            snapshot.categories, snapshot.totals.sum(axis=0), top_n_categories
+        ),
+        dtype=object,
+    )
+    categories = sorted(set(labels))
+    spend = np.zeros((len(snapshot.totals), len(categories)))
+    for column, category in enumerate(categories):
+        members = labels == category
+        spend[:, column] = snapshot.totals[:, members].sum(axis=1).round(SPEND_DECIMALS)
+        spend[snapshot.counts[:, members].sum(axis=1) == 0, column] = 0.0
+
+    cap = cap_daily_spend
+    if cap is None and auto_cap:
+        cap = generate_spend_charts._auto_cap_daily_spend(pd.Series(spend[spend > 0]))
+    dates = pd.date_range(
+        np.datetime64(snapshot.first_day, "D"),
+        periods=len(spend),
+        freq="D",
+        name="Date",
+    )
+    return generate_spend_charts.build_spend_grid(
+        dates, categories, spend, window=window, cap=cap, previous=snapshot.grid
+    )
+
+
+def update_spend_grid(
+    txns: pd.DataFrame,
+    *,
+    window: int = 31,
+    top_n_categories: Optional[int] = generate_spend_charts.DEFAULT_TOP_N_CATEGORIES,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    cap_daily_spend: Optional[float] = None,
+    auto_cap: bool = True,
+    job_id: Optional[str] = None,
+) -> SpendGrid:
+    """Builds the spend grid of `txns`, incrementally when a snapshot allows.
+
+    Takes the same options as `generate_spend_charts.prepare_spend_grid`, with
+    the transaction cleanup always applied.
+
+    Returns:
+      The SpendGrid, as `prepare_spend_grid` would build it.
+    """
+    stage_start = time.perf_counter()
+    settings = {
+        "version": SNAPSHOT_VERSION,
+        "rules": rules.fingerprint(),
+        "window": window,
+        "top_n_categories": top_n_categories,
+        "start_date": start_date,
+        "end_date": end_date,
+        "cap_daily_spend": cap_daily_spend,
+        "auto_cap": auto_cap,
+    }
+    txns = generate_spend_charts._normalize_transaction_columns(txns).reset_index(
+        drop=True
+    )
+    keys = row_keys(txns)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    watermark = hashlib.sha256(keys.tobytes()).hexdigest()
+    previous = load_snapshot(settings)
+    if previous is None:
+        prepared_rows = len(keys)
+    else:
+        prepared_rows = int(np.count_nonzero(~np.isin(keys, previous.keys)))
+    if previous is not None and previous.watermark == watermark:
+        generate_spend_charts._log(
+            job_id,
+            "Reused spend grid snapshot of %d transactions in %s",
+            len(keys),
+            f"{time.perf_counter() - stage_start:.2f}s",
+        )
+        return previous.grid
+
+    snapshot = _apply_changes(
+        previous or SpendSnapshot.empty(settings),
+        txns,
+        order,
+        keys,
+        start_date=start_date,
+        end_date=end_date,
+        job_id=job_id,
+    )
+    snapshot.watermark = watermark
+    snapshot.grid = _build_grid(
+        snapshot,
+        window=window,
+        top_n_categories=top_n_categories,
+        cap_daily_spend=cap_daily_spend,
+        auto_cap=auto_cap,
+    )
+    save_snapshot(snapshot)
+    generate_spend_charts._log(
+        job_id,
+        "Updated spend grid snapshot (%s, %d of %d transactions prepared) in %s",
+        "incremental" if previous is not None else "full rebuild",
+        prepared_rows,
+        len(keys),
+        f"{time.perf_counter() - stage_start:.2f}s",
+    )
+    return snapshot.grid
+
+
+def spike_transactions(
+    txns: pd.DataFrame,
+    grid: SpendGrid,
+    *,
+    cap_daily_spend: Optional[float] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> pd.DataFrame:
+    """Prepares only the transactions on days with outlier cells of `grid`.
+
+    The result, with categories grouped as in the grid, can stand in for the
+    full prepared transactions in `generate_spend_charts.build_outlier_report`.
+    """
+    if grid.empty or txns.empty:
+        return txns.iloc[:0]
+    spikes, _ = generate_spend_charts.outlier_cells(
+        grid, cap_daily_spend=cap_daily_spend
+    )
+    spike_days = grid.dates[np.flatnonzero(spikes.any(axis=1))]
+    candidates = txns[schema.parse_dates(txns["Date"]).isin(spike_days)]
+    prepared = generate_spend_charts._prepare_transactions(
+        candidates, start_date=start_date, end_date=end_date, job_id=job_id
+    )
+    category = prepared["Category"].astype(object)
+    prepared["Category"] = category.where(category.isin(grid.categories), "Other")
+    return prepared
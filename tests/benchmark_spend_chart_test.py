@@ -139,7 +139,7 @@ def test_main_prints_json_metrics(monkeypatch: pytest.MonkeyPatch, capsys) -> No
     assert json.loads(stdout) == result.as_dict()
 
 
-def test_run_benchmark_matrix_runs_four_variants(
+def test_run_benchmark_matrix_runs_full_and_compact_variants(
     tmp_path: Path, monkeypatch: pytest.MonkeyPatch
 ) -> None:
     commands: list[list[str]] = []
@@ -165,6 +165,9 @@ def test_run_benchmark_matrix_runs_four_variants(
             "include_total_spend": "--include-total-spend" in command,
             "include_category_share": "--include-category-share" in command,
             "include_customdata": "--include-customdata" in command,
+            "compact": "--compact" in command,
+            "compressed_bytes": 5,
+            "parse_seconds": 0.01,
         }
         return Completed(json.dumps(payload))
 
@@ -175,28 +178,24 @@ def test_run_benchmark_matrix_runs_four_variants(
         output_dir=tmp_path,
     )
 
-    assert len(commands) == 8
+    assert len(commands) == 16
     combos = {
         (
             "--include-total-spend" in command,
             "--include-category-share" in command,
             "--include-customdata" in command,
+            "--compact" in command,
         )
         for command in commands
     }
-    assert combos == {
-        (True, True, True),
-        (True, True, False),
-        (True, False, True),
-        (True, False, False),
-        (False, True, True),
-        (False, True, False),
-        (False, False, True),
-        (False, False, False),
-    }
-    assert len(results) == 8
+    assert len(combos) == 16
+    assert len(results) == 16
     assert all(not result.include_heatmap for result in results)
-    assert results[0].output_path.name.endswith("total-1_share-1_custom-1.html")
+    assert sum(result.compact for result in results) == 8
+    assert results[0].output_path.name.endswith(
+        "total-1_share-1_custom-1_compact-1.html"
+    )
+    assert len(benchmark_spend_chart.compact_savings(results)) == 8
 
 
 def test_refresh_cache_from_sheets_writes_full_export(
@@ -228,3 +227,39 @@ def test_refresh_cache_from_sheets_writes_full_export(
     assert written_cache == cache_path
     assert cache_path.exists()
     assert "Coffee Shop" in cache_path.read_text()
+
+
+def test_compact_savings_compare_matching_variants() -> None:
+    def result(compact: bool, output_bytes: int, parse_seconds: float):
+        return benchmark_spend_chart.BenchmarkResult(
+            input_path=Path("input.csv"),
+            output_path=Path(f"spend_profile_compact-{int(compact)}.html"),
+            rows=4,
+            categories=2,
+            elapsed_seconds=1.0,
+            peak_rss_mb=100.0,
+            output_bytes=output_bytes,
+            include_heatmap=False,
+            include_total_spend=True,
+            include_category_share=True,
+            include_customdata=True,
+            compact=compact,
+            compressed_bytes=output_bytes // 4,
+            parse_seconds=parse_seconds,
+        )
+
+    savings = benchmark_spend_chart.compact_savings(
+        [result(False, 4000, 0.2), result(True, 1000, 0.05)]
+    )
+
+    assert savings == [
+        {
+            "variant": "spend_profile_compact-0",
+            "output_bytes": [4000, 1000],
+            "compressed_bytes": [1000, 250],
+            "parse_seconds": [0.2, 0.05],
+            "size_factor": 4.0,
+            "compressed_factor": 4.0,
+            "parse_factor": 4.0,
+        }
+    ]
@@ -0,0 +1,51 @@
+import config
+import yaml
+
+from pathlib import Path
+
+from _pytest.monkeypatch import MonkeyPatch
+
+
+def test_config_is_cached_by_content_hash(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path / "cache")
+    path = tmp_path / "config.yaml"
+    path.write_text("WORKSHEET_TITLE: First\nIGNORED_TXNS: [1, 2]\n")
+
+    first = config.Config(path)
+    assert first.WORKSHEET_TITLE == "First"
+    assert config.cache_path("config", first.CONTENT_HASH).exists()
+
+    # A cache hit does not parse the YAML again.
+    monkeypatch.setattr(yaml, "safe_load", lambda _: {"WORKSHEET_TITLE": "Parsed"})
+    assert config.Config(path).WORKSHEET_TITLE == "First"
+
+    # Editing the file changes the hash and replaces the stale cache entry.
+    path.write_text("WORKSHEET_TITLE: Second\n")
+    second = config.Config(path)
+    assert second.WORKSHEET_TITLE == "Parsed"
+    assert second.CONTENT_HASH != first.CONTENT_HASH
+    assert not config.cache_path("config", first.CONTENT_HASH).exists()
+
+
+def test_config_ignores_corrupt_cache(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    path = tmp_path / "config.yaml"
+    path.write_text("WORKSHEET_TITLE: Title\n")
+    content_hash = config.Config(path).CONTENT_HASH
+    config.cache_path("config", content_hash).write_bytes(b"not a pickle")
+
+    assert config.Config(path).WORKSHEET_TITLE == "Title"
+
+
+def test_config_unchanged(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    path = tmp_path / "config.yaml"
+    path.write_text("IGNORED_MERCHANTS: [Foo]\nIGNORED_CATEGORIES: [Bar]\n")
+    settings = config.Config(path)
+    assert settings.unchanged(["IGNORED_MERCHANTS", "IGNORED_CATEGORIES", "MISSING"])
+
+    settings.IGNORED_MERCHANTS = ["Foo"]
+    assert not settings.unchanged(["IGNORED_MERCHANTS"])
+    assert settings.unchanged(["IGNORED_CATEGORIES"])
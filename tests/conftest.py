@@ -3,6 +3,7 @@ import empower
 import pandas as pd
 import pickle
 import pytest
+import sheet_sync
 
 from _pytest.monkeypatch import MonkeyPatch
 
@@ -26,6 +27,13 @@ _REQUIRED_ENV_KEYS: dict[str, str] = {
 }
 
 
+@pytest.fixture(autouse=True)
+def clear_sheet_snapshots() -> Iterator[None]:
+    """Keeps sheet snapshots read in one test from steering writes in another."""
+    yield
+    sheet_sync.clear()
+
+
 @pytest.fixture()
 def test_creds(monkeypatch: MonkeyPatch, mocker) -> service_account.Credentials:
     google_creds = service_account.Credentials(
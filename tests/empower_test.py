@@ -1,6 +1,8 @@
 import empower
 import pytest
 
+from datetime import date
+
 
 def test_api_request_non_ok_status(mocker):
     session = mocker.MagicMock()
@@ -205,3 +207,117 @@ def test_is_logged_in_does_not_treat_cloudflare_challenge_as_expired(mocker):
 
     with pytest.raises(empower.PersonalCapitalCloudflareChallengeException):
         pc.is_logged_in()
+
+
+def test_month_shards_split_at_month_boundaries():
+    assert empower.month_shards(date(2024, 1, 15), date(2024, 3, 3)) == [
+        (date(2024, 1, 15), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 29)),
+        (date(2024, 3, 1), date(2024, 3, 3)),
+    ]
+
+
+def _shard_response(start, txn_ids):
+    return {
+        "spData": {
+            "endDate": start,
+            "moneyIn": 1.0,
+            "netCashflow": -2.0,
+            "transactions": [
+                {"userTransactionId": txn_id, "transactionDate": txn_date}
+                for txn_id, txn_date in txn_ids
+            ],
+        }
+    }
+
+
+_SHARDS = {
+    "2024-01-01": [(0, "2024-01-02"), (1, "2024-01-20"), (2, "2024-01-31")],
+    "2024-02-01": [(2, "2024-01-31"), (3, "2024-02-10")],
+    "2024-03-01": [(4, "2024-03-02"), (5, "2024-03-30")],
+}
+
+
+def _api_request(failures=()):
+    failures = set(failures)
+    requested = []
+
+    def api_request(method, path, data):
+        start = data["startDate"]
+        requested.append(start)
+        if start in failures:
+            failures.remove(start)
+            raise RuntimeError("flaky")
+        return _shard_response(start, _SHARDS[start])
+
+    return api_request, requested
+
+
+def test_get_transaction_data_merges_monthly_shards(mocker):
+    mocker.patch.object(empower.time, "sleep")
+    pc = empower.PersonalCapital()
+    api_request, requested = _api_request(failures={"2024-02-01"})
+    mocker.patch.object(pc, "_api_request", side_effect=api_request)
+
+    data = pc.get_transaction_data(
+        date(2024, 1, 15), date(2024, 3, 3), monthly_shards=True
+    )
+
+    assert [t["userTransactionId"] for t in data["transactions"]] == [1, 2, 3, 4]
+    assert data["moneyIn"] == 3.0
+    assert data["netCashflow"] == -6.0
+    assert data["endDate"] == "2024-03-01"
+    assert sorted(requested) == [
+        "2024-01-01",
+        "2024-02-01",
+        "2024-02-01",
+        "2024-03-01",
+    ]
+
+
+def test_settled_months_are_served_from_shard_cache(mocker, tmp_path):
+    mocker.patch.object(empower, "SHARD_CACHE_DIR", tmp_path)
+    pc = empower.PersonalCapital()
+    api_request, requested = _api_request()
+    mocker.patch.object(pc, "_api_request", side_effect=api_request)
+
+    first = pc.get_transaction_data(date(2024, 1, 15), date(2024, 3, 3), True)
+    requested.clear()
+    second = pc.get_transaction_data(date(2024, 1, 15), date(2024, 3, 3), True)
+
+    # The partial March shard is still open, so only it is fetched again.
+    assert requested == ["2024-03-01"]
+    assert second == first
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "2024-01.json.gz",
+        "2024-02.json.gz",
+    ]
+
+
+def test_get_transaction_data_does_not_retry_challenged_shards(mocker):
+    mocker.patch.object(empower.time, "sleep")
+    pc = empower.PersonalCapital()
+    request = mocker.patch.object(
+        pc,
+        "_api_request",
+        side_effect=empower.PersonalCapitalCloudflareChallengeException("later"),
+    )
+
+    with pytest.raises(empower.PersonalCapitalCloudflareChallengeException):
+        pc.get_transaction_data(date(2024, 1, 15), date(2024, 1, 20), True)
+    request.assert_called_once()
+
+
+def test_challenged_shard_cancels_the_remaining_months(mocker):
+    mocker.patch.object(empower, "SHARD_WORKERS", 1)
+    pc = empower.PersonalCapital()
+    request = mocker.patch.object(
+        pc,
+        "_api_request",
+        side_effect=empower.PersonalCapitalCloudflareChallengeException("later"),
+    )
+
+    with pytest.raises(empower.PersonalCapitalCloudflareChallengeException):
+        pc.get_transaction_data(date(2024, 1, 15), date(2024, 6, 20), True)
+    # The worker may pick up one more month before the rest are cancelled.
+    assert request.call_count <= 2
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -154,6 +155,19 @@ def _auto_cap_txns() -> pd.DataFrame:
     )
 
 
+def test_normalize_transaction_columns_applies_schema() -> None:
+    txns = _sample_txns().astype(str)
+
+    normalized = generate_spend_charts._normalize_transaction_columns(txns)
+
+    assert normalized["Date"].dtype == "datetime64[ns]"
+    assert normalized["Amount"].dtype == "float64"
+    assert all(
+        isinstance(normalized[column].dtype, pd.CategoricalDtype)
+        for column in ["Category", "Account", "Merchant"]
+    )
+
+
 def test_prepare_spend_data_fills_dates_and_rolls_by_calendar_day(
     category_config: MonkeyPatch,
 ) -> None:
@@ -267,6 +281,90 @@ def test_prepare_spend_data_auto_caps_extreme_values(
     assert spend.attrs[generate_spend_charts.CAP_ATTR] is not None
 
 
+def test_prepare_spend_data_rolls_many_categories_like_pandas(
+    category_config: MonkeyPatch,
+) -> None:
+    rng = np.random.default_rng(7)
+    count = 600
+    txns = pd.DataFrame(
+        {
+            "Date": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 200, count), unit="D"),
+            "Merchant": [f"Shop {i}" for i in range(count)],
+            "Amount": -rng.exponential(40.0, count).round(2),
+            "Category": [f"Category {i % 40}" for i in range(count)],
+            "Account": "Checking",
+            "ID": [str(i) for i in range(count)],
+            "Description": "",
+        }
+    )
+
+    spend = generate_spend_charts.prepare_spend_data(
+        txns, window=31, top_n_categories=None, cap_daily_spend=80.0, skip_cleanup=True
+    )
+
+    by_category = spend.groupby("Category")
+    for column, source in [
+        (generate_spend_charts.ROLLING_SPEND_COLUMN, "DisplaySpend"),
+        (generate_spend_charts.RAW_ROLLING_SPEND_COLUMN, "Spend"),
+    ]:
+        expected = by_category[source].transform(
+            lambda series: series.rolling(window=31, min_periods=1).mean()
+        )
+        np.testing.assert_allclose(spend[column], expected, atol=1e-9)
+        assert ((spend[column] == 0) == (expected == 0)).all()
+    assert spend[generate_spend_charts.CAPPED_COLUMN].equals(spend["Spend"] > 80.0)
+    assert len(spend) == 40 * spend["Date"].nunique()
+
+
+def test_spend_grid_views_match_long_format_frame(
+    category_config: MonkeyPatch,
+) -> None:
+    grid = generate_spend_charts.prepare_spend_grid(
+        _outlier_txns(),
+        window=2,
+        top_n_categories=None,
+        cap_daily_spend=100.0,
+        skip_cleanup=True,
+    )
+    frame = grid.to_frame()
+
+    assert grid.categories == ["Food/Dining Coffee", "Groceries", "Shopping"]
+    assert grid.spend.shape == (4, 3)
+    assert grid.capped[3].tolist() == [False, False, True]
+    roundtrip = generate_spend_charts.SpendGrid.from_frame(frame)
+    np.testing.assert_array_equal(roundtrip.rolling, grid.rolling)
+    assert roundtrip.cap == 100.0
+    for view in [
+        generate_spend_charts.prepare_category_share_data,
+        generate_spend_charts.prepare_monthly_heatmap_data,
+        lambda spend: generate_spend_charts.prepare_total_spend_data(spend, window=2),
+    ]:
+        pd.testing.assert_frame_equal(view(grid), view(frame))
+
+
+def test_build_spend_grid_recomputes_only_trailing_windows(mocker) -> None:
+    dates = pd.date_range("2026-01-01", periods=40, freq="D", name="Date")
+    spend = np.random.default_rng(3).exponential(20.0, (40, 3))
+    previous = generate_spend_charts.build_spend_grid(
+        dates, ["A", "B", "C"], spend, window=7, cap=50.0
+    )
+    changed = spend.copy()
+    changed[30, 1] += 12.0
+    rolling = mocker.spy(generate_spend_charts, "_rolling_means")
+
+    grid = generate_spend_charts.build_spend_grid(
+        dates, ["A", "B", "C"], changed, window=7, cap=50.0, previous=previous
+    )
+
+    assert rolling.call_args.args[0].shape == (2, 16, 3)
+    expected = generate_spend_charts.build_spend_grid(
+        dates, ["A", "B", "C"], changed, window=7, cap=50.0
+    )
+    np.testing.assert_allclose(grid.rolling, expected.rolling)
+    np.testing.assert_allclose(grid.raw_rolling, expected.raw_rolling)
+
+
 def test_prepare_total_spend_data_rolls_display_and_raw(
     category_config: MonkeyPatch,
 ) -> None:
@@ -420,3 +518,36 @@ def test_write_spend_chart_logs_and_writes_html(
     assert "Finished chart build" in messages
     assert output_path.exists()
     assert output_path.stat().st_size > 0
+
+
+def test_compact_chart_uses_float32_values_and_daily_steps(
+    tmp_path: Path, category_config: MonkeyPatch, mocker
+) -> None:
+    grid = generate_spend_charts.prepare_spend_grid(
+        _outlier_txns(), window=2, top_n_categories=None, skip_cleanup=True
+    )
+    write_html = mocker.spy(generate_spend_charts.go.Figure, "write_html")
+
+    for compact in (False, True):
+        generate_spend_charts.write_spend_chart(
+            grid,
+            tmp_path / f"spend-{compact}.html",
+            window=2,
+            compact=compact,
+            plotlyjs="../assets/plotly.min.js",
+        )
+
+    full_fig, compact_fig = (call.args[0] for call in write_html.call_args_list)
+    assert write_html.call_args.kwargs["include_plotlyjs"] == "../assets/plotly.min.js"
+    assert len(full_fig.data) == len(compact_fig.data)
+    for full_trace, compact_trace in zip(full_fig.data, compact_fig.data):
+        if compact_trace.type == "scatter" and compact_trace.x is None:
+            assert compact_trace.x0 == grid.dates[0].strftime("%Y-%m-%d")
+            assert compact_trace.dx == generate_spend_charts.DAY_MS
+            assert len(full_trace.x) == len(compact_trace.y)
+        values = "z" if compact_trace.type == "heatmap" else "y"
+        assert getattr(compact_trace, values).dtype == np.float32
+        np.testing.assert_allclose(
+            getattr(compact_trace, values), getattr(full_trace, values), rtol=1e-6
+        )
+    assert sum(trace.x is None for trace in compact_fig.data) > len(grid.categories)
@@ -0,0 +1,51 @@
+import keyword_index
+
+
+def test_prefers_longest_keyword() -> None:
+    index = keyword_index.KeywordIndex(
+        {"tea": "Tea", "coffee": "Coffee", "tea leaf": "Loose Leaf"}
+    )
+    assert index.get("coffee and tea leaf") == "Loose Leaf"
+    assert index.get("tea coffee") == "Coffee"
+    assert index.get("teacoffee") == "Coffee"
+    assert index.match("green tea") == ("tea", "Tea")
+    assert index.get("water") is None
+
+
+def test_ties_keep_map_order() -> None:
+    index = keyword_index.KeywordIndex({"bean": "Beans", "cafe": "Cafes"})
+    assert index.get("cafe bean") == "Beans"
+
+
+def test_finds_keywords_that_are_suffixes_of_other_paths() -> None:
+    index = keyword_index.KeywordIndex({"shell": "Gas", "hello": "Greeting"})
+    assert index.get("shelf shell") == "Gas"
+    assert index.get("shhello") == "Greeting"
+
+
+def test_normalizes_and_ranks_keywords() -> None:
+    index = keyword_index.KeywordIndex(
+        {"Whole-Foods!!": "Groceries", "Whole": "Other"},
+        lambda keyword: keyword.lower().replace("-", " ").strip("!"),
+        rank_key=len,
+    )
+    assert len(index) == 2
+    assert index.match("whole foods market") == ("whole foods", "Groceries")
+
+
+def test_duplicate_spellings_keep_first_ranked() -> None:
+    index = keyword_index.KeywordIndex(
+        {"Uber": "Transportation", "UBER!!": "Travel"},
+        lambda keyword: keyword.lower().strip("!"),
+    )
+    assert len(index) == 1
+    assert index.get("uber trip") == "Travel"
+
+
+def test_matches_brute_force_scan() -> None:
+    keyword_map = {"ab": 1, "b": 2, "abc": 3, "bca": 4, "c": 5, "": 6}
+    index = keyword_index.KeywordIndex(keyword_map)
+    ranked = sorted(keyword_map.items(), key=lambda item: len(item[0]), reverse=True)
+    for text in ["", "a", "abca", "bcab", "cc", "xbcay", "aab"]:
+        expected = next(value for keyword, value in ranked if keyword in text)
+        assert index.get(text) == expected
@@ -0,0 +1,131 @@
+import normalization
+import numpy as np
+import pandas as pd
+import pytest
+
+from _pytest.monkeypatch import MonkeyPatch
+
+
+@pytest.fixture()
+def normalizer() -> normalization.MerchantNormalizer:
+    return normalization.MerchantNormalizer(
+        starts_with_removal=["SQ *", "TST* "],
+        ends_with_removal=[" inc"],
+        normalization_pairs=[("wholefds", "whole foods"), ("com", "")],
+        canonical_names=["Whole Foods", "Amazon", "Amazon Prime"],
+    )
+
+
+def test_trim() -> None:
+    assert normalization.trim("hello-world 123 xx") == "Helloworld"
+    assert normalization.trim("  a   b ") == "A B"
+    assert normalization.trim("café #1") == "Café"
+
+
+def test_normalize_once_applies_rules_in_order(
+    normalizer: normalization.MerchantNormalizer,
+) -> None:
+    assert normalizer.normalize_once("SQ *Blue Bottle") == "Blue Bottle"
+    assert normalizer.normalize_once("TST* Acme inc") == "Acme"
+    assert normalizer.normalize_once("WHOLEFDS #123") == "Whole Foods"
+    assert normalizer.normalize_once("amzn mktp us") == "Amazon"
+    # The first configured canonical name wins.
+    assert normalizer.normalize_once("amazon prime video") == "Amazon"
+    assert normalizer.normalize_once("Local Cafe") == "Local Cafe"
+
+
+def test_normalize_reaches_fixpoint(
+    normalizer: normalization.MerchantNormalizer,
+) -> None:
+    # Each pass exposes another suffix.
+    assert normalizer.normalize("Cafe inc inc") == "Cafe"
+    assert normalizer.normalize("comcomcafe") == "Cafe"
+    assert normalizer.normalize("") == ""
+
+
+def test_normalize_matches_pass_by_pass_loop(
+    normalizer: normalization.MerchantNormalizer,
+) -> None:
+    merchants = [
+        "SQ *Blue Bottle",
+        "amzn mktp us*2k3",
+        "TST* wholefds market inc",
+        "the comcom store",
+        "xxcafe inc inc",
+        "Local Cafe",
+    ]
+    for merchant in merchants:
+        assert normalizer.normalize(merchant) == normalizer._normalize_loop(merchant)
+
+
+def test_merchant_normalizer_recompiles_on_config_change(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    settings = normalization.config.GLOBAL
+    first = normalization.merchant_normalizer()
+    assert normalization.merchant_normalizer() is first
+
+    monkeypatch.setattr(settings, "MERCHANT_NORMALIZATION", ["Blue Bottle"])
+    second = normalization.merchant_normalizer()
+    assert second is not first
+    assert second.normalize("blue bottle coffee") == "Blue Bottle"
+
+    monkeypatch.setattr(settings, "MERCHANT_NORMALIZATION", [])
+    assert normalization.merchant_normalizer().normalize("blue bottle coffee") == (
+        "Blue Bottle Coffee"
+    )
+
+
+def test_map_unique_matches_map() -> None:
+    values = pd.Series(["b", "a", "b", None, np.nan], index=[3, 4, 5, 6, 7], name="M")
+    calls: list[object] = []
+
+    def shout(value: object) -> str:
+        calls.append(value)
+        return f"{value}!"
+
+    result = normalization.map_unique(values, shout)
+
+    pd.testing.assert_series_equal(result, values.map(lambda v: f"{v}!"))
+    # Distinct values are mapped once; missing values one by one.
+    assert calls[:2] == ["b", "a"]
+    assert len(calls) == 4
+
+
+def test_map_unique_infers_bool_dtype() -> None:
+    result = normalization.map_unique(pd.Series(["a", "b", "a"]), lambda v: v == "a")
+    assert result.dtype == bool
+    assert list(~result) == [False, True, False]
+
+
+def test_map_unique_keeps_categoricals() -> None:
+    values = pd.Series(["b", "a", None, "B"], name="M", dtype="category")
+    calls: list[object] = []
+
+    def upper(value: object) -> object:
+        calls.append(value)
+        return None if value == "a" else str(value).upper()
+
+    result = normalization.map_unique(values, upper)
+
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.name == "M"
+    assert result.astype(object).fillna("-").tolist() == ["B", "-", "NAN", "B"]
+    # Once per category plus once for the missing value.
+    assert len(calls) == 4
+
+
+def test_normalization_caches(monkeypatch: MonkeyPatch) -> None:
+    normalization.clear_caches()
+    normalizer = normalization.merchant_normalizer()
+    for _ in range(3):
+        normalizer.normalize("SQ *Blue Bottle")
+        normalization.normalize_value("blue bottle #1")
+
+    stats = normalization.cache_info()
+    assert (stats["merchant"].hits, stats["merchant"].misses) == (2, 1)
+    assert (stats["value"].hits, stats["value"].misses) == (2, 1)
+
+    # Replacing a rule list compiles a fresh normalizer with an empty cache.
+    monkeypatch.setattr(normalization.config.GLOBAL, "STARTS_WITH_REMOVAL", [])
+    assert normalization.cache_info()["merchant"].currsize == 0
@@ -1,5 +1,11 @@
+import json
+import numpy as np
 import pandas as pd
 import pytest
+import requests
+import secrets
+
+from unittest.mock import MagicMock
 
 import plaid_source
 
@@ -8,11 +14,13 @@ class FakeWorksheet:
     def __init__(self):
         self.values = {}
         self.hidden = False
+        self.writes = []
 
     def get_value(self, cell):
         return self.values.get(cell, "")
 
     def update_values(self, cell, values):
+        self.writes.append((cell, len(values)))
         start_row = int(cell[1:])
         for offset, value in enumerate(values):
             self.values[f"A{start_row + offset}"] = value[0]
@@ -56,11 +64,12 @@ def test_large_state_is_split_across_encrypted_cells(monkeypatch):
     monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
     sheet = FakeSheet()
     store = plaid_source.SheetStateStore(sheet)
-    payload = "x" * (plaid_source.STATE_MAX_CHUNK_SIZE * 2)
+    # Random text, so compression cannot fit it into one cell.
+    payload = secrets.token_urlsafe(plaid_source.STATE_MAX_CHUNK_SIZE * 2)
 
     store.save({"version": 1, "items": {"item": {"pending": payload}}})
 
-    assert sheet.ws.values["A3"]
+    assert sheet.ws.values["A4"]
     assert store.load()["items"]["item"]["pending"] == payload
 
 
@@ -68,12 +77,12 @@ def test_smaller_state_clears_stale_encrypted_chunks(monkeypatch):
     monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
     sheet = FakeSheet()
     store = plaid_source.SheetStateStore(sheet)
-    large_payload = "x" * (plaid_source.STATE_MAX_CHUNK_SIZE * 2)
+    large_payload = secrets.token_urlsafe(plaid_source.STATE_MAX_CHUNK_SIZE * 2)
 
     store.save({"version": 1, "items": {"item": {"pending": large_payload}}})
     store.save({"version": 1, "items": {"item": {"status": "active"}}})
 
-    assert sheet.ws.values["A3"] == ""
+    assert sheet.ws.values["A4"] == ""
     assert store.load()["items"]["item"]["status"] == "active"
 
 
@@ -88,6 +97,84 @@ def test_state_rejects_wrong_key(monkeypatch):
         store.load()
 
 
+def test_state_save_rewrites_only_changed_item_rows(monkeypatch):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    sheet = FakeSheet()
+    items = {f"item-{n}": {"cursor": f"c{n}", "status": "active"} for n in range(4)}
+    plaid_source.SheetStateStore(sheet).save({"version": 1, "items": items})
+    store = plaid_source.SheetStateStore(sheet)
+    state = store.load()
+    sheet.ws.writes.clear()
+
+    state["items"]["item-2"]["cursor"] = "c2-next"
+    store.save(state)
+    store.save(state)
+
+    # Row 2 is the top-level record, so item-2 is row 5.
+    assert sheet.ws.writes == [("A5", 1)]
+    assert plaid_source.SheetStateStore(sheet).load()["items"]["item-2"] == {
+        "cursor": "c2-next",
+        "status": "active",
+    }
+
+
+def test_state_save_rewrites_rows_another_writer_changed(monkeypatch):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    sheet = FakeSheet()
+    items = {f"item-{n}": {"status": "active"} for n in range(3)}
+    plaid_source.SheetStateStore(sheet).save({"version": 1, "items": items})
+    store = plaid_source.SheetStateStore(sheet)
+    state = store.load()
+    # Another process saves a state whose item spans several chunks.
+    payload = secrets.token_urlsafe(plaid_source.STATE_MAX_CHUNK_SIZE * 2)
+    other = plaid_source.SheetStateStore(sheet)
+    other_state = other.load()
+    other_state["items"]["item-0"]["pending"] = payload
+    other.save(other_state)
+
+    state["items"]["item-2"]["status"] = "paused"
+    store.save(state)
+
+    loaded = plaid_source.SheetStateStore(sheet).load()["items"]
+    assert {item_id: loaded[item_id] for item_id in loaded} == {
+        "item-0": {"status": "active"},
+        "item-1": {"status": "active"},
+        "item-2": {"status": "paused"},
+    }
+
+
+def test_state_items_are_decrypted_on_first_access(monkeypatch):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    sheet = FakeSheet()
+    items = {"good": {"status": "active"}, "bad": {"status": "active"}}
+    plaid_source.SheetStateStore(sheet).save({"version": 1, "items": items})
+    sheet.ws.values["A4"] = "2:corrupted"
+
+    state = plaid_source.SheetStateStore(sheet).load()
+
+    assert list(state["items"]) == ["good", "bad"]
+    assert state["items"]["good"] == {"status": "active"}
+    with pytest.raises(plaid_source.PlaidError, match="cannot be decrypted"):
+        state["items"]["bad"]
+
+
+def test_state_reads_single_blob_written_by_older_versions(monkeypatch):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    sheet = FakeSheet()
+    sheet.exists = True
+    state = {"version": 1, "items": {"item": {"status": "active"}}}
+    sheet.ws.values["A2"] = (
+        plaid_source._fernet().encrypt(json.dumps(state).encode()).decode()
+    )
+    store = plaid_source.SheetStateStore(sheet)
+
+    assert store.load() == state
+    store.save(store.load())
+    assert plaid_source.SheetStateStore(sheet).load()["items"]["item"] == {
+        "status": "active"
+    }
+
+
 def test_transaction_sign_mapping_and_overlap_deduplication():
     item = {"selected_account_ids": ["acct"], "account_mappings": {"acct": "Smartly"}}
     incoming = plaid_source.transaction_frame(
@@ -332,3 +419,238 @@ def test_initial_merge_uses_historical_account_alias_and_merchant_variant():
         existing, incoming, set(), set(), initial_import=True
     )
     assert merged["ID"].tolist() == ["legacy"]
+
+
+def _brute_force_overlap_pairs(existing, candidate, max_date_delta_days=3):
+    pairs = []
+    for new_index, new in candidate.iterrows():
+        for old_index, old in existing.iterrows():
+            if (new["Account"], new["Amount"]) != (old["Account"], old["Amount"]):
+                continue
+            delta = abs((pd.Timestamp(new["Date"]) - pd.Timestamp(old["Date"])).days)
+            left = plaid_source.remote._NormalizeMerchant(new["Merchant"]).lower()
+            right = plaid_source.remote._NormalizeMerchant(old["Merchant"]).lower()
+            allowed = max_date_delta_days if left == right else 1
+            if delta <= allowed and plaid_source._merchants_overlap(left, right):
+                pairs.append((delta, new_index, old_index))
+    return sorted(pairs)
+
+
+def test_tolerant_overlap_pairs_match_pairwise_comparison():
+    rng = np.random.default_rng(7)
+    merchants = ["Coffee Shop", "Coffee Shop Downtown", "Apple", "Grocer", "Gas"]
+
+    def frame(size, offset):
+        return pd.DataFrame(
+            {
+                "Date": [
+                    f"2026-06-{day:02d}" for day in rng.integers(1, 29, size=size)
+                ],
+                "Merchant": rng.choice(merchants, size=size),
+                "Amount": rng.choice([-5.0, -12.34, -40.0], size=size),
+                "Category": "X",
+                "Account": rng.choice(["One", "Two"], size=size),
+                "ID": [f"id{i}" for i in range(size)],
+                "Description": "",
+            },
+            index=range(offset, offset + size),
+        )
+
+    existing = frame(120, 0)
+    candidate = frame(60, 1000)
+
+    assert sorted(
+        plaid_source._tolerant_overlap_pairs(existing, candidate)
+    ) == _brute_force_overlap_pairs(existing, candidate)
+
+
+def _history(size):
+    return pd.DataFrame(
+        {
+            "Date": [f"2026-05-{day % 28 + 1:02d}" for day in range(size)],
+            "Merchant": [f"SQ *Shop {i % 7}" if i % 5 else "" for i in range(size)],
+            "Amount": [-(i % 11) - 0.5 for i in range(size)],
+            "Category": "X",
+            "Account": ["Checking", "Card"] * (size // 2),
+            "ID": [f"id{i}" for i in range(size)],
+            "Description": [f"Desc {i % 3}" for i in range(size)],
+        }
+    )
+
+
+def test_overlap_fingerprints_match_row_fingerprints():
+    history = _history(40)
+
+    assert plaid_source.overlap_fingerprints(history).tolist() == [
+        plaid_source.overlap_fingerprint(row) for _, row in history.iterrows()
+    ]
+
+
+def test_fingerprint_index_persists_and_fingerprints_only_new_rows(
+    tmp_path, monkeypatch, mocker
+):
+    monkeypatch.setattr(plaid_source.config, "CACHE_DIR", tmp_path)
+    history = _history(40)
+    additions = _history(44).iloc[38:].assign(ID=lambda f: "plaid:" + f["ID"])
+    plaid_source.merge_transactions(history, additions, set(), set())
+    spy = mocker.spy(plaid_source, "overlap_fingerprints")
+    hashes = mocker.spy(plaid_source.pd.util, "hash_pandas_object")
+
+    index = plaid_source.FingerprintIndex.load()
+    merged = plaid_source.merge_transactions(
+        history.iloc[1:], additions, set(), set(), fingerprints=index
+    )
+
+    assert len(merged) == 39 + 4
+    spy.assert_not_called()
+    # Each row is hashed once per merge.
+    assert sum(len(c.args[0]) for c in hashes.call_args_list) == 39 + 6
+    # The row dropped from the history is forgotten.
+    assert len(plaid_source.FingerprintIndex.load()) == 43
+
+
+def test_fingerprint_index_is_dropped_when_the_code_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(plaid_source.config, "CACHE_DIR", tmp_path)
+    history = _history(10)
+    additions = _history(12).iloc[10:].assign(ID=lambda f: "plaid:" + f["ID"])
+    plaid_source.merge_transactions(history, additions, set(), set())
+    assert len(plaid_source.FingerprintIndex.load()) == 12
+
+    monkeypatch.setattr(plaid_source, "FINGERPRINT_CODE_VERSION", "changed")
+    assert len(plaid_source.FingerprintIndex.load()) == 0
+    monkeypatch.undo()
+    monkeypatch.setattr(plaid_source.config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(plaid_source.rules, "CODE_VERSION", "changed")
+    assert len(plaid_source.FingerprintIndex.load()) == 0
+
+
+def _response(status, body, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture()
+def plaid_client(monkeypatch):
+    monkeypatch.setenv("PLAID_ENV", "sandbox")
+    sleeps = []
+    monkeypatch.setattr(plaid_source.time, "sleep", sleeps.append)
+    client = plaid_source.PlaidClient()
+    client.sleeps = sleeps
+    return client
+
+
+def test_plaid_client_retries_transient_failures_with_backoff(
+    plaid_client, monkeypatch
+):
+    post = MagicMock(
+        side_effect=[
+            requests.ConnectionError("reset"),
+            _response(429, {"error_code": "RATE_LIMIT_EXCEEDED"}, {"Retry-After": "2"}),
+            _response(200, {"accounts": [{"account_id": "a"}]}),
+        ]
+    )
+    monkeypatch.setattr(plaid_client.session, "post", post)
+
+    assert plaid_client.accounts("token") == [{"account_id": "a"}]
+    assert post.call_count == 3
+    assert 0 <= plaid_client.sleeps[0] <= plaid_source.RETRY_BASE_SECONDS
+    assert plaid_client.sleeps[1] == 2.0
+    assert len(plaid_client.latencies["/accounts/get"]) == 3
+
+
+def test_plaid_client_gives_up_after_max_retries(plaid_client, monkeypatch):
+    post = MagicMock(return_value=_response(503, {"error_message": "down"}))
+    monkeypatch.setattr(plaid_client.session, "post", post)
+
+    with pytest.raises(plaid_source.PlaidError, match="down"):
+        plaid_client.sync("token")
+    assert post.call_count == plaid_source.MAX_RETRIES + 1
+
+
+def test_plaid_client_does_not_retry_non_idempotent_calls(plaid_client, monkeypatch):
+    post = MagicMock(side_effect=requests.ConnectionError("reset"))
+    monkeypatch.setattr(plaid_client.session, "post", post)
+
+    with pytest.raises(plaid_source.PlaidError, match="request failed"):
+        plaid_client.exchange_public_token("public")
+    post.assert_called_once()
+    assert plaid_client.sleeps == []
+
+
+def test_sync_progress_checkpoints_each_page_once(monkeypatch, tmp_path):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    monkeypatch.setattr(plaid_source.config, "CACHE_DIR", tmp_path)
+    item = {"account_mappings": {"acct": "Card"}, "selected_account_ids": ["acct"]}
+    progress = plaid_source.SyncProgress.resume("item", "c0")
+    writes = []
+    write_cache = plaid_source.config.write_cache
+
+    def record_write(kind, key, value):
+        if kind.startswith(plaid_source.SYNC_CHECKPOINT_KIND):
+            writes.append(kind)
+        write_cache(kind, key, value)
+
+    monkeypatch.setattr(plaid_source.config, "write_cache", record_write)
+
+    for n in range(3):
+        page = {
+            "added": [
+                {
+                    "account_id": "acct",
+                    "transaction_id": f"t{n}",
+                    "date": "2026-01-0" + str(n + 1),
+                    "amount": 1.5,
+                    "name": "Shop",
+                }
+            ],
+            "removed": [{"transaction_id": f"r{n}"}],
+            "next_cursor": f"c{n + 1}",
+        }
+        progress.add_page(page, item)
+    resumed = plaid_source.SyncProgress.resume("item", "c0")
+
+    # Each page record is written once, then only the small progress record.
+    assert len(set(writes)) == 4
+    assert len(writes) == 6
+    assert resumed.cursor == "c3"
+    assert resumed.removed_ids == {"plaid:r0", "plaid:r1", "plaid:r2"}
+    assert [list(frame["ID"]) for frame in resumed.frames] == [
+        ["plaid:t0"],
+        ["plaid:t1"],
+        ["plaid:t2"],
+    ]
+
+    resumed.discard()
+    assert list(tmp_path.glob("plaid-sync-*")) == []
+
+
+def test_sync_progress_merges_later_pages_into_earlier_ones(monkeypatch, tmp_path):
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    monkeypatch.setattr(plaid_source.config, "CACHE_DIR", tmp_path)
+    item = {"account_mappings": {"acct": "Card"}, "selected_account_ids": ["acct"]}
+
+    def txn(transaction_id, amount):
+        return {
+            "account_id": "acct",
+            "transaction_id": transaction_id,
+            "date": "2026-01-01",
+            "amount": amount,
+            "name": "Shop",
+        }
+
+    progress = plaid_source.SyncProgress.resume("item", "", keep_transactions=True)
+    progress.add_page({"added": [txn("t0", 1.0), txn("t1", 2.0)]}, item)
+    progress.add_page(
+        {"modified": [txn("t1", 3.0)], "removed": [{"transaction_id": "t0"}]}, item
+    )
+    resumed = plaid_source.SyncProgress.resume("item", "", keep_transactions=True)
+
+    for synced in [progress, resumed]:
+        additions = synced.additions()
+        assert additions[["ID", "Amount"]].values.tolist() == [["plaid:t1", -3.0]]
+        assert list(synced.transactions.values()) == [txn("t1", 3.0)]
+    # A checkpoint without Plaid's JSON cannot resume a sync that needs it.
+    assert plaid_source.SyncProgress.resume("item", "").pages == 0
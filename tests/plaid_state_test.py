@@ -0,0 +1,200 @@
+import plaid_source
+import plaid_state
+import pytest
+
+from _pytest.monkeypatch import MonkeyPatch
+from pathlib import Path
+
+
+class FakeWorksheet:
+    def __init__(self):
+        self.values = {}
+        self.hidden = False
+
+    def update_values(self, cell, values):
+        start_row = int(cell[1:])
+        for offset, value in enumerate(values):
+            self.values[f"A{start_row + offset}"] = value[0]
+
+    def get_values(self, start, end, include_tailing_empty=False):
+        return [
+            [self.values.get(f"A{row}", "")]
+            for row in range(int(start[1:]), int(end[1:]) + 1)
+        ]
+
+
+class FakeSheet:
+    def __init__(self):
+        self.ws = FakeWorksheet()
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        return self
+
+    def worksheet_by_title(self, title):
+        return self.ws
+
+
+@pytest.fixture()
+def sheet(monkeypatch: MonkeyPatch) -> FakeSheet:
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    sheet = FakeSheet()
+    plaid_source.SheetStateStore(sheet).save(
+        {"version": 1, "items": {"item": {"status": "active", "cursor": "c1"}}}
+    )
+    return sheet
+
+
+def _store(tmp_path: Path, sheet: FakeSheet, name: str = "web", background=False):
+    local = plaid_state.LocalStateStore(tmp_path / name / "state.sqlite3")
+    return plaid_state.ReplicatedStateStore(local, sheet.open, background)
+
+
+def _sheet_items(sheet: FakeSheet) -> dict:
+    return dict(plaid_source.SheetStateStore(sheet).load()["items"].items())
+
+
+def test_loads_are_served_locally_once_seeded(tmp_path: Path, sheet) -> None:
+    store = _store(tmp_path, sheet, background=True)
+
+    first = store.load()
+    plaid_state.wait_for_replication()
+    second = store.load()
+
+    assert first["items"] == second["items"] == _sheet_items(sheet)
+    assert sheet.opened == 1
+
+
+def test_saves_are_compare_and_swap(tmp_path: Path, sheet) -> None:
+    store = _store(tmp_path, sheet)
+    state = store.load()
+    stale = store.load()
+
+    state["items"]["item"]["status"] = "paused"
+    store.save(state)
+    store.save(state)
+
+    with pytest.raises(plaid_source.PlaidError, match="concurrently"):
+        store.save(stale)
+    assert _sheet_items(sheet)["item"]["status"] == "paused"
+
+
+def test_background_save_replicates_to_sheet(tmp_path: Path, sheet) -> None:
+    store = _store(tmp_path, sheet, background=True)
+    state = store.load()
+
+    state["items"]["new"] = {"status": "pending_review"}
+    store.save(state)
+    plaid_state.wait_for_replication()
+
+    assert _sheet_items(sheet)["new"] == {"status": "pending_review"}
+
+
+def test_concurrent_edits_from_two_volumes_are_merged(tmp_path: Path, sheet) -> None:
+    web = _store(tmp_path, sheet, "web", background=True)
+    scraper = _store(tmp_path, sheet, "scraper")
+    web_state = web.load()
+    plaid_state.wait_for_replication()
+    scraper_state = scraper.load()
+
+    scraper_state["items"]["item"]["cursor"] = "c2"
+    scraper.save(scraper_state)
+    web_state["items"]["item"]["last_error"] = ""
+    web_state["items"]["new"] = {"status": "pending_review"}
+    web.save(web_state)
+    plaid_state.wait_for_replication()
+
+    expected = {
+        "item": {"status": "active", "cursor": "c2", "last_error": ""},
+        "new": {"status": "pending_review"},
+    }
+    assert _sheet_items(sheet) == expected
+    assert web.local.read(plaid_state.LocalStateStore.STATE)["items"] == expected
+    assert scraper.load()["items"] == expected
+
+
+def test_merge_states_prefers_local_edits_on_conflict() -> None:
+    base = {"a": 1, "b": {"x": 1, "y": 1}, "gone": 1}
+    ours = {"a": 2, "b": {"x": 2, "y": 1}}
+    theirs = {"a": 3, "b": {"x": 1, "y": 3}, "gone": 1, "new": 3}
+
+    assert plaid_state.merge_states(base, ours, theirs) == {
+        "a": 2,
+        "b": {"x": 2, "y": 3},
+        "new": 3,
+    }
+
+
+def test_save_merges_onto_a_state_pulled_after_load(tmp_path: Path, sheet) -> None:
+    web = _store(tmp_path, sheet, "web", background=True)
+    scraper = _store(tmp_path, sheet, "scraper")
+    web.load()
+    plaid_state.wait_for_replication()
+    state = web.load()
+    scraper_state = scraper.load()
+    scraper_state["items"]["item"]["cursor"] = "c2"
+    scraper.save(scraper_state)
+
+    # A background reconcile pulls the scraper's edit between load and save.
+    web.reconcile()
+    state["items"]["new"] = {"status": "pending_review"}
+    web.save(state)
+    state["items"]["new"]["status"] = "active"
+    web.save(state)
+
+    expected = {
+        "item": {"status": "active", "cursor": "c2"},
+        "new": {"status": "active"},
+    }
+    assert web.local.read(plaid_state.LocalStateStore.STATE)["items"] == expected
+    assert state["items"] == expected
+
+
+def test_reconcile_pulls_a_sheet_overwritten_at_the_same_revision(
+    tmp_path: Path, sheet
+) -> None:
+    scraper = _store(tmp_path, sheet, "scraper")
+    state = scraper.load()
+    state["items"]["item"]["cursor"] = "c2"
+    scraper.save(state)
+
+    # Another process group pushed the same revision last, with other content.
+    theirs = plaid_source.SheetStateStore(sheet).load()
+    theirs = {**theirs, "items": {"item": {"status": "active", "cursor": "c3"}}}
+    plaid_source.SheetStateStore(sheet).save(theirs)
+    scraper.reconcile()
+
+    assert scraper.load()["items"] == {"item": {"status": "active", "cursor": "c3"}}
+
+
+def test_reconcile_retries_when_the_sheet_moves_before_pushing(
+    tmp_path: Path, sheet, monkeypatch: MonkeyPatch
+) -> None:
+    web = _store(tmp_path, sheet, "web")
+    state = web.load()
+    state["items"]["new"] = {"status": "pending_review"}
+    web.local.write(plaid_state.LocalStateStore.STATE, {**state, "revision": 2})
+    load = plaid_source.SheetStateStore.load
+    loads = []
+
+    def load_after_concurrent_push(self):
+        loads.append(self)
+        if len(loads) == 2:
+            # The scraper pushes between the merge and the pre-push re-read.
+            other = plaid_source.SheetStateStore(sheet)
+            pushed = load(other)
+            pushed["items"]["item"]["cursor"] = "c2"
+            other.save({**pushed, "revision": pushed.get("revision", 0) + 1})
+        return load(self)
+
+    monkeypatch.setattr(
+        plaid_source.SheetStateStore, "load", load_after_concurrent_push
+    )
+    web.reconcile()
+    monkeypatch.setattr(plaid_source.SheetStateStore, "load", load)
+
+    assert _sheet_items(sheet) == {
+        "item": {"status": "active", "cursor": "c2"},
+        "new": {"status": "pending_review"},
+    }
@@ -1,4 +1,5 @@
 # We test several internal-only details. Its easier this way.
+import normalization
 import remote
 from scripts import generate_keyword_map
 
@@ -153,6 +154,43 @@ def test_apply_category_rules_prefers_exact_merchant(config: MonkeyPatch) -> Non
         assert updated.loc[1, "Category"] == "Services/Other"
 
 
+def test_apply_category_rules_prefers_longest_keyword(config: MonkeyPatch) -> None:
+    merchants = ["Coffee Bean Tea Leaf", "Bean Coffee", "Tea Coffee", "Plain"]
+    txns = pd.DataFrame(
+        [
+            {
+                "Date": "2026-01-01",
+                "Merchant": merchant,
+                "Amount": -1.00,
+                "Category": "Unknown",
+                "Account": "Checking",
+                "ID": str(i),
+                "Description": merchant,
+            }
+            for i, merchant in enumerate(merchants * 2)
+        ]
+    )
+
+    with config.context() as c:
+        c.setattr(remote.config.GLOBAL, "EXACT_MERCHANT_TO_CATEGORY_MAP", {})
+        c.setattr(
+            remote.config.GLOBAL,
+            "MERCHANT_TO_CATEGORY_MAP",
+            {
+                "coffee": "Coffee",
+                "tea": "Tea",
+                "bean": "Beans",
+                "tea leaf": "Loose Leaf",
+            },
+        )
+        c.setattr(remote.config.GLOBAL, "CATEGORY_MAP", {})
+
+        updated = remote.ApplyCategoryRules(txns)
+
+        expected = ["Loose Leaf", "Coffee", "Coffee", "Unknown"]
+        assert list(updated["Category"]) == expected * 2
+
+
 def test_config_category_rules_for_costco_and_meal_delivery(
     config: MonkeyPatch,
 ) -> None:
@@ -277,6 +315,23 @@ def test_keyword_generator_preserves_costco_and_meal_delivery() -> None:
     assert generate_keyword_map.BRAND_KEYWORDS["doordash"] == "Food/Dining Restaurants"
 
 
+def test_keyword_generator_matches_longest_normalized_keyword() -> None:
+    keyword_map = {"tea": "Coffee", "tea spoon": "Dessert", "lucky": "Groceries"}
+    index = generate_keyword_map.build_keyword_index(keyword_map)
+
+    assert generate_keyword_map.find_keyword_category("TEASPOON #4", index) == (
+        "Dessert"
+    )
+    assert generate_keyword_map.find_keyword_category("Green Tea", index) == "Coffee"
+    assert generate_keyword_map.find_keyword_category("Safeway", index) is None
+
+    matched, unmatched = generate_keyword_map.compute_coverage(
+        keyword_map, ["Lucky #12", "Safeway", "Tea House"], {"Safeway": "Groceries"}
+    )
+    assert matched == ["Lucky #12", "Safeway", "Tea House"]
+    assert unmatched == []
+
+
 def test_select_spending_transactions_includes_only_safe_smartly_fallback(
     config: MonkeyPatch,
 ) -> None:
@@ -899,8 +954,13 @@ def test_read_last_scrape_at_parses_iso_timestamp(mocker) -> None:
 
 
 def test_normalize_merchant_cycle(config: MonkeyPatch, mocker) -> None:
-    mocker.patch.object(remote, "_normalize", side_effect=lambda x: x + "a")
-    remote._NormalizeMerchant("g")
+    normalization.clear_caches()
+    mocker.patch.object(
+        normalization.MerchantNormalizer,
+        "normalize_once",
+        side_effect=lambda x: x + "a",
+    )
+    assert remote._NormalizeMerchant("g") == "g" + "a" * 30
 
 
 def test_retrieve_accounts_unknown_type(
@@ -0,0 +1,69 @@
+import os
+import pandas as pd
+import pytest
+import report_cache
+
+from _pytest.monkeypatch import MonkeyPatch
+from pathlib import Path
+
+_FILES = ("report.html", "outliers.csv")
+
+
+@pytest.fixture()
+def cache_dir(tmp_path: Path, monkeypatch: MonkeyPatch) -> Path:
+    monkeypatch.setattr(report_cache, "CACHE_DIR", tmp_path / "cache")
+    return tmp_path / "cache"
+
+
+def _build(content: str):
+    def build(directory: Path) -> None:
+        for filename in _FILES:
+            (directory / filename).write_text(f"{filename}:{content}")
+
+    return build
+
+
+def test_cache_key_covers_transactions_rules_code_and_options(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    txns = pd.DataFrame({"Date": ["2026-01-01"], "Amount": [-1.0]})
+    key = report_cache.cache_key(txns, {"window": 31})
+
+    assert report_cache.cache_key(txns.copy(), {"window": 31}) == key
+    assert report_cache.cache_key(txns.assign(Amount=-2.0), {"window": 31}) != key
+    assert report_cache.cache_key(txns, {"window": 7}) != key
+    monkeypatch.setattr(report_cache, "CODE_VERSION", "changed")
+    assert report_cache.cache_key(txns, {"window": 31}) != key
+    monkeypatch.setattr(report_cache.rules.config.GLOBAL, "CATEGORY_MAP", {"a": "b"})
+    assert report_cache.cache_key(txns, {"window": 31}) != key
+
+
+def test_publish_swaps_in_cached_files(cache_dir: Path, tmp_path: Path) -> None:
+    output_dir = tmp_path / "reports"
+    assert report_cache.lookup("first", _FILES) is None
+
+    first = report_cache.store("first", _build("1"))
+    report_cache.publish(first, output_dir, _FILES)
+    second = report_cache.store("second", _build("2"))
+    report_cache.publish(second, output_dir, _FILES)
+    cached = report_cache.lookup("first", _FILES)
+    assert cached == first
+    report_cache.publish(cached, output_dir, _FILES)
+
+    assert (output_dir / "report.html").read_text() == "report.html:1"
+    assert (second / "report.html").read_text() == "report.html:2"
+    assert sorted(path.name for path in output_dir.iterdir()) == sorted(_FILES)
+
+
+def test_store_evicts_least_recently_used_entries(
+    cache_dir: Path, monkeypatch: MonkeyPatch
+) -> None:
+    for age, key in enumerate(["a", "b", "c"]):
+        report_cache.store(key, _build(key))
+        os.utime(cache_dir / key, (age, age))
+    report_cache.lookup("a", _FILES)
+    monkeypatch.setattr(report_cache, "MAX_BYTES", 60)
+
+    report_cache.store("d", _build("d"))
+
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["a", "d"]
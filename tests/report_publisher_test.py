@@ -34,11 +34,14 @@ def _record_chart_call(
     include_total_spend: bool = True,
     include_category_share: bool = True,
     include_customdata: bool = True,
+    compact: bool = False,
+    plotlyjs: str = "cdn",
 ):
     calls.append(
         "chart:"
         f"{output_path}:{len(spend_data)}:{window}:{include_heatmap}:"
-        f"{include_total_spend}:{include_category_share}:{include_customdata}"
+        f"{include_total_spend}:{include_category_share}:{include_customdata}:"
+        f"{compact}:{plotlyjs}"
     )
 
 
@@ -238,6 +241,52 @@ def test_publish_spend_report_logs_stage_progress(
     assert "Status write finished" in messages
 
 
+def test_publish_spend_report_reuses_cached_report_files(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    generated: list[Path] = []
+
+    def fake_generate(txns, output_dir: Path, **kwargs):
+        generated.append(output_dir)
+        for filename in ["spend_profile.html", "outliers.csv"]:
+            (output_dir / filename).write_text(f"{filename}:{len(generated)}")
+        return _fake_generated_files(txns, output_dir, **kwargs)
+
+    monkeypatch.setattr(report_publisher.report_cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(
+        report_publisher.generate_spend_charts,
+        "load_transactions_from_csv",
+        lambda path: pd.DataFrame([{"id": 1}]),
+    )
+    monkeypatch.setattr(report_publisher, "generate_report_files", fake_generate)
+
+    def publish() -> report_publisher.SpendReportResult:
+        return report_publisher.publish_spend_report(
+            source="csv",
+            input_path=Path("txns.csv"),
+            output_dir=tmp_path / "reports",
+            base_url="https://example.test",
+            token="secret",
+            update_sheet=False,
+        )
+
+    for _ in range(2):
+        result = publish()
+
+    assert result.status == "success"
+    assert len(generated) == 1
+    assert generated[0].parent == tmp_path / "cache"
+    report = tmp_path / "reports" / "spend_profile.html"
+    assert report.read_text() == "spend_profile.html:1"
+
+    # A plotly upgrade renames the asset the cached HTML links to.
+    monkeypatch.setattr(
+        report_publisher.generate_spend_charts, "PLOTLYJS_VERSION", "0.0.0"
+    )
+    publish()
+    assert len(generated) == 2
+
+
 def test_generate_report_files_logs_each_stage(
     caplog: pytest.LogCaptureFixture,
     monkeypatch: pytest.MonkeyPatch,
@@ -298,6 +347,7 @@ def test_generate_report_files_logs_each_stage(
     assert "Built outlier report with" in messages
     assert "Wrote outlier CSV" in messages
     assert calls[0].startswith("chart:/tmp/reports/spend_profile.html:")
+    assert calls[0].endswith(f":True:../assets/{report_publisher.PLOTLYJS_FILENAME}")
     assert calls[1].startswith("outliers:/tmp/reports/outliers.csv:")
 
 
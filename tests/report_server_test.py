@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta, timezone
+import gzip
 from pathlib import Path
+from types import SimpleNamespace
 import threading
 import time
 
@@ -9,6 +11,7 @@ import pandas as pd
 import config
 import empower
 import plaid_source
+import plaid_state
 import report_publisher
 import report_server
 
@@ -61,6 +64,9 @@ class _ApprovalStore:
 
 
 class _ApprovalWorksheet:
+    id = 0
+    spreadsheet = SimpleNamespace(id="approval-sheet")
+
     def __init__(self, frame: pd.DataFrame):
         self.frame = frame
 
@@ -99,6 +105,53 @@ def _pending_approval_state(status: str = "pending_review") -> dict:
     }
 
 
+def test_plaid_exchange_checkpoints_the_initial_sync_and_restarts(
+    client, monkeypatch, tmp_path
+) -> None:
+    monkeypatch.setenv("PLAID_ENV", "sandbox")
+    monkeypatch.setenv("PLAID_STATE_KEY", "a test state key")
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    store = _ApprovalStore({"items": {}})
+    sheet = _ApprovalSheet(pd.DataFrame(columns=config.GLOBAL.COLUMN_NAMES))
+    monkeypatch.setattr(report_server, "_open_plaid_sheet", lambda: sheet)
+    monkeypatch.setattr(plaid_source, "SheetStateStore", lambda _: store)
+    txn = _pending_approval_state()["items"]["item"]["pending_transactions"][0]
+    cursors = []
+
+    def sync_pages(self, access_token, cursor=""):
+        cursors.append(cursor)
+        yield {"added": [txn], "next_cursor": "c1", "has_more": True}
+        if len(cursors) == 1:
+            raise plaid_source.PlaidError("sync_restart_required", "restart")
+        modified = {**txn, "amount": 15.0}
+        yield {"modified": [modified], "next_cursor": "c2", "has_more": False}
+
+    monkeypatch.setattr(
+        plaid_source.PlaidClient,
+        "exchange_public_token",
+        lambda self, token: {"item_id": "item", "access_token": "access"},
+    )
+    monkeypatch.setattr(
+        plaid_source.PlaidClient,
+        "accounts",
+        lambda self, token: [{"account_id": "account", "name": "Amex"}],
+    )
+    monkeypatch.setattr(plaid_source.PlaidClient, "sync_pages", sync_pages)
+    with client.session_transaction() as flask_session:
+        flask_session["plaid_link_authorized"] = True
+
+    response = client.post("/plaid/exchange", json={"public_token": "public"})
+
+    assert response.status_code == 200
+    assert response.get_json()["review"]["plaid_only_candidates"] == 1
+    # The restart discarded the first attempt's checkpoint and began again.
+    assert cursors == ["", ""]
+    item = store.state["items"]["item"]
+    assert item["cursor"] == "c2"
+    assert item["pending_transactions"] == [{**txn, "amount": 15.0}]
+    assert list(tmp_path.glob("plaid-sync-*")) == []
+
+
 def test_plaid_approval_is_single_flight_and_idempotent(client, monkeypatch) -> None:
     store = _ApprovalStore(_pending_approval_state())
     sheet = _ApprovalSheet(pd.DataFrame(columns=config.GLOBAL.COLUMN_NAMES))
@@ -149,6 +202,36 @@ def test_plaid_approval_rejects_a_second_in_flight_request(client, monkeypatch)
     assert response.get_json()["error_code"] == "approval_in_progress"
 
 
+def test_plaid_state_conflict_returns_409(client, monkeypatch) -> None:
+    class ConflictingStore:
+        def load(self) -> dict:
+            return {"items": {"item": {"status": "error"}}}
+
+        def save(self, state) -> None:
+            raise plaid_source.PlaidError("state_conflict", "changed concurrently")
+
+    monkeypatch.setattr(
+        report_server, "_plaid_state_store", lambda sheet=None: ConflictingStore()
+    )
+    with client.session_transaction() as flask_session:
+        flask_session["plaid_reauth_item_id"] = "item"
+
+    response = client.post("/plaid/reauth/complete")
+
+    assert response.status_code == 409
+    assert response.get_json()["error_code"] == "state_conflict"
+
+
+def test_replicated_plaid_state_opens_its_own_sheet(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(plaid_state, "STATE_DIR", tmp_path)
+    request_sheet = object()
+
+    store = report_server._plaid_state_store(request_sheet)
+
+    # The background replica must not share the request's Sheets client.
+    assert store._open_replica is report_server._open_plaid_sheet
+
+
 def test_report_file_requires_valid_token(client, tmp_path: Path) -> None:
     report_path = tmp_path / report_publisher.SPEND_REPORT_FILENAME
     report_path.write_text("<html>report</html>")
@@ -173,6 +256,39 @@ def test_outlier_file_requires_valid_token(client, tmp_path: Path) -> None:
     assert b"Date,Amount" in response.data
 
 
+def test_report_html_is_sent_gzipped_when_accepted(client, tmp_path: Path) -> None:
+    report_path = tmp_path / report_publisher.SPEND_REPORT_FILENAME
+    report_path.write_text("<html>first</html>")
+    url = "/reports/spend_profile.html?token=test-token"
+    headers = {"Accept-Encoding": "gzip, br"}
+
+    first = client.get(url, headers=headers)
+    report_path.write_text("<html>second report</html>")
+    second = client.get(url, headers=headers)
+    repeat = client.get(url, headers={**headers, "If-None-Match": second.get_etag()[0]})
+
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(first.data) == b"<html>first</html>"
+    assert gzip.decompress(second.data) == b"<html>second report</html>"
+    assert repeat.status_code == 304
+
+
+def test_plotlyjs_asset_is_public_and_long_cached(client) -> None:
+    url = f"/assets/{report_publisher.PLOTLYJS_FILENAME}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    plain = client.get(url)
+    missing = client.get("/assets/plotly-0.0.0.min.js")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age >= 365 * 24 * 60 * 60
+    assert gzip.decompress(response.data) == plain.data
+    assert "Content-Encoding" not in plain.headers
+    assert missing.status_code == 404
+
+
 def test_generate_requires_valid_token(client) -> None:
     response = client.post("/generate")
 
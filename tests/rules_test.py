@@ -0,0 +1,152 @@
+import pandas as pd
+import rules
+
+from pathlib import Path
+
+from _pytest.monkeypatch import MonkeyPatch
+
+
+def test_compiled_rules_normalize_config(monkeypatch: MonkeyPatch) -> None:
+    settings = rules.config.GLOBAL
+    monkeypatch.setattr(settings, "IGNORED_CATEGORIES", ["transfer!!"])
+    monkeypatch.setattr(settings, "SKIPPED_ACCOUNTS", ["my  checking"])
+    monkeypatch.setattr(settings, "EXACT_MERCHANT_TO_CATEGORY_MAP", {"A&B": "Food"})
+    monkeypatch.setattr(settings, "CATEGORY_MAP", {})
+    monkeypatch.setattr(
+        settings, "ACCOUNT_NAME_TO_TYPE_MAP", [["IRA", "Retirement"], ["Roth IRA", "R"]]
+    )
+
+    compiled = rules.compiled_rules()
+
+    assert compiled.ignore_filter.categories == frozenset({"Transfer"})
+    assert compiled.ignore_filter.accounts == frozenset({"My Checking"})
+    assert compiled.exact_merchant_to_category == {"ab": "Food"}
+    assert compiled.category_map == {}
+    assert compiled.account_types == (("roth ira", "R"), ("ira", "Retirement"))
+
+
+def test_compiled_rules_recompile_on_config_change(monkeypatch: MonkeyPatch) -> None:
+    first = rules.compiled_rules()
+    assert rules.compiled_rules() is first
+
+    monkeypatch.setattr(rules.config.GLOBAL, "MERCHANT_TO_CATEGORY_MAP", {})
+    second = rules.compiled_rules()
+    assert second is not first
+    assert second.merchant_keywords is None
+
+
+def test_compiled_rules_are_cached_on_disk(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rules.config, "CACHE_DIR", tmp_path)
+    stale = [tmp_path / "rules-v1-abc.pkl", tmp_path / "rules-abc-0123.pkl"]
+    for path in stale:
+        path.write_bytes(b"stale")
+    rules.clear_cache()
+    compiled = rules.compiled_rules()
+    key = rules.cache_key(rules.config.GLOBAL)
+    assert rules.config.GLOBAL.CONTENT_HASH in key
+    assert rules.CODE_VERSION in key
+    assert rules.config.cache_path(rules.CACHE_KIND, key).exists()
+    assert not any(path.exists() for path in stale)
+
+    rules.clear_cache()
+    monkeypatch.setattr(
+        rules.CompiledRules,
+        "from_config",
+        classmethod(lambda cls, settings: None),
+    )
+    loaded = rules.compiled_rules()
+    assert isinstance(loaded, rules.CompiledRules)
+    assert loaded.ignore_filter == compiled.ignore_filter
+    assert loaded.category_map == compiled.category_map
+    rules.clear_cache()
+
+
+def test_modified_rules_are_not_cached_on_disk(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rules.config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(rules.config.GLOBAL, "IGNORED_TXNS", ["123"])
+
+    assert rules.compiled_rules().ignore_filter.txns == ("123",)
+    assert not list(tmp_path.iterdir())
+
+
+def test_ignore_filter_counts_each_rule() -> None:
+    ignore_filter = rules.IgnoreFilter(
+        categories=frozenset({"Transfer"}),
+        merchants=frozenset({"Venmo"}),
+        merchant_prefixes=("Paypal", "Zelle"),
+        txns=("skip-me",),
+        accounts=frozenset({"Old Card"}),
+    )
+    txns = pd.DataFrame(
+        {
+            "Category": ["Transfer", "Food", "Food", "Food", "Food", "Transfer"],
+            "Merchant": ["Venmo", "Paypal Inc", "Zelle", "Cafe", "Venmo", None],
+            "ID": ["1", "2", "3", "skip-me", "5", "6"],
+            "Account": ["Checking", "Checking", "Checking", "Old Card", "X", "X"],
+        },
+        index=[10, 11, 12, 13, 14, 15],
+    )
+
+    result = ignore_filter.evaluate(txns)
+
+    assert list(result.mask) == [True, True, True, True, True, True]
+    assert list(result.mask.index) == [10, 11, 12, 13, 14, 15]
+    assert result.counts == {
+        "category": 2,
+        "merchant": 2,
+        "merchant_prefix": 2,
+        "txn": 1,
+        "account": 1,
+    }
+    kept = ignore_filter.evaluate(txns.assign(Category="Food", ID="0", Account="X"))
+    assert list(kept.mask) == [True, True, True, False, True, False]
+
+
+def test_fingerprint_tracks_rule_settings(monkeypatch: MonkeyPatch) -> None:
+    first = rules.fingerprint()
+    assert rules.fingerprint() == first
+
+    monkeypatch.setattr(rules.config.GLOBAL, "CATEGORY_MAP", {"Old": "New"})
+    assert rules.fingerprint() != first
+
+
+def test_diff_requires_full_update_for_global_rules() -> None:
+    previous = rules.snapshot()
+    current = {**previous, "CATEGORY_MAP": {"Old": "New"}}
+    assert rules.diff(previous, current) is None
+    assert rules.diff(previous, previous) is not None
+
+
+def test_diff_finds_affected_merchants(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(rules.config.GLOBAL, "MERCHANT_NORMALIZATION", [])
+    previous = {
+        **rules.snapshot(),
+        "EXACT_MERCHANT_TO_CATEGORY_MAP": {"Corner Store": "Groceries"},
+        "MERCHANT_TO_CATEGORY_MAP": {"coffee": "Cafes", "tea": "Cafes"},
+        "IGNORED_MERCHANTS": ["Venmo"],
+    }
+    current = {
+        **previous,
+        "EXACT_MERCHANT_TO_CATEGORY_MAP": {"Deli": "Restaurants"},
+        "MERCHANT_TO_CATEGORY_MAP": {"coffee": "Coffee", "tea": "Cafes"},
+        "IGNORED_MERCHANTS": ["Venmo", "Zelle"],
+    }
+
+    changes = rules.diff(previous, current)
+
+    assert changes is not None
+    txns = pd.DataFrame(
+        {
+            "Merchant": ["Corner Store", "Deli", "Blue Coffee", "Tea Shop", "Zelle"],
+            "Category": ["A"] * 5,
+            "ID": ["1", "2", "3", "4", "5"],
+            "Account": ["X"] * 5,
+        }
+    )
+    assert list(changes.affected(txns)) == [True, True, True, False, False]
+    ignored = changes.added_ignores.evaluate(txns)
+    assert list(ignored.mask) == [False, False, False, False, True]
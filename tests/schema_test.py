@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+import schema
+
+
+def _txns() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Date": ["2026-01-02", "2026-01-01"],
+            "Merchant": ["Cafe", "Cafe"],
+            "Amount": ["-4.50", "-10"],
+            "Category": ["Coffee", "Coffee"],
+            "Account": ["Checking", "Card"],
+            "ID": ["1", "2"],
+            "Description": ["CAFE 1", "CAFE 2"],
+        }
+    )
+
+
+def test_coerce_transactions_applies_schema_dtypes() -> None:
+    typed = schema.coerce_transactions(_txns())
+
+    assert typed["Date"].dtype == schema.DATE_DTYPE
+    assert list(typed["Date"]) == [
+        pd.Timestamp("2026-01-02"),
+        pd.Timestamp("2026-01-01"),
+    ]
+    assert list(typed["Amount"]) == [-4.5, -10.0]
+    for column in schema.CATEGORICAL_COLUMNS:
+        assert schema.is_categorical(typed[column])
+    assert list(typed["ID"]) == ["1", "2"]
+
+
+def test_coerce_transactions_keeps_typed_columns() -> None:
+    typed = schema.coerce_transactions(_txns())
+
+    again = schema.coerce_transactions(typed)
+
+    pd.testing.assert_frame_equal(again, typed)
+    assert again["Category"].cat.categories is typed["Category"].cat.categories
+
+
+def test_coerce_transactions_rejects_bad_values() -> None:
+    txns = _txns()
+    txns.loc[0, "Amount"] = "n/a"
+
+    with pytest.raises(ValueError):
+        schema.coerce_transactions(txns)
@@ -1,9 +1,16 @@
+import json
 import pandas as pd
+import pytest
 import runpy
 import scraper
 import sys
+import threading
 
 from _pytest.monkeypatch import MonkeyPatch
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator, Optional
 
 from google.oauth2 import service_account
 from unittest.mock import MagicMock
@@ -92,3 +99,219 @@ def test_main_entrypoint(mocker, test_env: MonkeyPatch):
     # Clear argv to avoid pytest args being passed to scraper
     sys.argv = ["scraper.py"]
     runpy.run_module("scraper", run_name="__main__")
+
+
+class _FakePlaid(BaseHTTPRequestHandler):
+    """Serves /transactions/sync and /accounts/get for the tokens in PAGES.
+
+    When `barrier` is set, the first page of each item waits until both
+    items' first pages are in flight, so the test fails (with a 500) unless
+    items are fetched concurrently. Cursors in `fail_cursors` fail once.
+    """
+
+    PAGES = {
+        "token-a": [
+            {
+                "added": [
+                    {
+                        "transaction_id": "a1",
+                        "account_id": "acct-a",
+                        "date": "2025-01-02",
+                        "amount": 12.5,
+                        "merchant_name": "Bakery",
+                        "personal_finance_category": {"primary": "FOOD_AND_DRINK"},
+                    }
+                ],
+                "next_cursor": "a-1",
+                "has_more": True,
+            },
+            {"next_cursor": "a-2", "has_more": False},
+        ],
+        "token-b": [{"next_cursor": "b-1", "has_more": False}],
+        "token-c": [
+            {
+                "accounts": [
+                    {
+                        "account_id": "acct-c",
+                        "name": "Checking",
+                        "type": "depository",
+                        "balances": {"current": 100.0, "available": 90.0},
+                    }
+                ],
+                "next_cursor": "c-1",
+                "has_more": False,
+            }
+        ],
+    }
+    barrier: Optional[threading.Barrier] = None
+    fail_cursors: set[str] = set()
+    seen: list[tuple[str, str]] = []
+    accounts_calls: list[str] = []
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        token = body["access_token"]
+        if token == "token-bad":
+            self._reply(400, {"error_code": "ITEM_LOGIN_REQUIRED"})
+        elif self.path == "/accounts/get":
+            self.accounts_calls.append(token)
+            account = {"account_id": f"acct-{token[-1]}", "name": f"Card {token[-1]}"}
+            self._reply(200, {"accounts": [{**account, "type": "credit"}]})
+        else:
+            pages = self.PAGES[token]
+            page = 0 if not body["cursor"] else int(body["cursor"][-1])
+            self.seen.append((token, body["cursor"]))
+            if body["cursor"] in self.fail_cursors:
+                self.fail_cursors.remove(body["cursor"])
+                self._reply(400, {"error_message": "flaky"})
+                return
+            try:
+                if page == 0 and self.barrier is not None:
+                    self.barrier.wait()
+            except threading.BrokenBarrierError:
+                self._reply(500, {"error_message": "items were synced serially"})
+                return
+            self._reply(200, pages[page])
+
+
+@pytest.fixture()
+def fake_plaid(monkeypatch: MonkeyPatch, tmp_path: Path, mocker) -> Iterator[str]:
+    monkeypatch.setenv("PLAID_STATE_KEY", "test-key")
+    monkeypatch.setattr(scraper.config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(_FakePlaid, "barrier", None)
+    monkeypatch.setattr(_FakePlaid, "fail_cursors", set())
+    monkeypatch.setattr(_FakePlaid, "seen", [])
+    monkeypatch.setattr(_FakePlaid, "accounts_calls", [])
+    mocker.patch.object(scraper, "_open_sheet")
+    mocker.patch.object(scraper.auth, "GetGoogleCredentials")
+    mocker.patch.object(
+        scraper.sheet_sync,
+        "read_dataframe",
+        return_value=pd.DataFrame(columns=scraper.config.GLOBAL.COLUMN_NAMES),
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakePlaid)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    client = scraper.plaid_source.PlaidClient()
+    client.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(scraper.plaid_source, "PlaidClient", lambda: client)
+    yield client.base_url
+    server.shutdown()
+    server.server_close()
+
+
+def _plaid_store(mocker, items: dict) -> MagicMock:
+    store = mocker.patch.object(scraper.plaid_source, "SheetStateStore")
+    store.return_value.load.return_value = {"items": items}
+    return store
+
+
+def test_scrape_plaid_syncs_items_concurrently(
+    fake_plaid: str, monkeypatch: MonkeyPatch, mocker
+) -> None:
+    monkeypatch.setattr(_FakePlaid, "barrier", threading.Barrier(2, timeout=5))
+    items = {
+        "item-a": {"status": "active", "access_token": "token-a"},
+        "item-bad": {"status": "active", "access_token": "token-bad"},
+        "item-b": {"status": "active", "access_token": "token-b", "cursor": "b-0"},
+        "item-off": {"status": "disconnected", "access_token": "token-off"},
+    }
+    store = _plaid_store(mocker, items)
+    update = mocker.patch.object(scraper.remote, "UpdateGoogleSheet")
+
+    scraper.scrape_plaid_and_push(scraper.utils.ScraperOptions())
+
+    assert list(items) == ["item-a", "item-bad", "item-b", "item-off"]
+    assert items["item-a"]["cursor"] == "a-2"
+    assert items["item-b"]["cursor"] == "b-1"
+    assert "cursor" not in items["item-bad"]
+    assert items["item-bad"]["last_error"] == "reauthentication_required"
+    assert items["item-a"]["last_error"] == items["item-b"]["last_error"] == ""
+    assert "last_sync_at" not in items["item-off"]
+    store.return_value.save.assert_called_once_with({"items": items})
+    _, transactions, accounts = update.call_args.args
+    assert list(transactions["ID"]) == ["plaid:a1"]
+    assert list(accounts["Name"]) == ["Card a", "Card b"]
+
+
+def test_scrape_plaid_resumes_interrupted_sync_from_last_page(
+    fake_plaid: str, tmp_path: Path, mocker
+) -> None:
+    items = {"item-a": {"status": "active", "access_token": "token-a"}}
+    store = _plaid_store(mocker, items)
+    update = mocker.patch.object(scraper.remote, "UpdateGoogleSheet")
+    _FakePlaid.fail_cursors.add("a-1")
+
+    with pytest.raises(scraper.plaid_source.PlaidError, match="flaky"):
+        scraper.scrape_plaid_and_push(scraper.utils.ScraperOptions())
+    assert "cursor" not in items["item-a"]
+    update.assert_not_called()
+
+    scraper.scrape_plaid_and_push(scraper.utils.ScraperOptions())
+
+    assert _FakePlaid.seen == [("token-a", ""), ("token-a", "a-1"), ("token-a", "a-1")]
+    assert items["item-a"]["cursor"] == "a-2"
+    assert list(update.call_args.args[1]["ID"]) == ["plaid:a1"]
+    assert store.return_value.save.call_count == 2
+    assert list(tmp_path.glob("plaid-sync-*")) == []
+
+
+def test_scrape_plaid_uses_synced_or_cached_accounts(fake_plaid: str, mocker) -> None:
+    fresh = datetime.now(timezone.utc).isoformat()
+    items: dict[str, dict[str, Any]] = {
+        "item-a": {
+            "status": "active",
+            "access_token": "token-a",
+            "accounts_cache": {
+                "fetched_at": fresh,
+                "accounts": [{"account_id": "acct-a", "name": "Cached card"}],
+            },
+        },
+        "item-b": {"status": "active", "access_token": "token-b", "cursor": "b-0"},
+        "item-c": {"status": "active", "access_token": "token-c"},
+    }
+    _plaid_store(mocker, items)
+    update = mocker.patch.object(scraper.remote, "UpdateGoogleSheet")
+
+    scraper.scrape_plaid_and_push(scraper.utils.ScraperOptions())
+
+    # Only item-b had neither accounts in its sync nor a fresh cache.
+    assert _FakePlaid.accounts_calls == ["token-b"]
+    accounts = update.call_args.args[2]
+    assert list(accounts["Name"]) == ["Cached card", "Card b", "Checking"]
+    assert items["item-a"]["accounts_cache"]["fetched_at"] == fresh
+    assert items["item-c"]["accounts_cache"]["accounts"] == [
+        {
+            "account_id": "acct-c",
+            "name": "Checking",
+            "type": "depository",
+            "balances": {"current": 100.0},
+        }
+    ]
+
+
+def test_scrape_plaid_skips_accounts_when_not_requested(
+    fake_plaid: str, mocker
+) -> None:
+    items = {"item-b": {"status": "active", "access_token": "token-b"}}
+    _plaid_store(mocker, items)
+    update = mocker.patch.object(scraper.remote, "UpdateGoogleSheet")
+    options = scraper.utils.ScraperOptions()
+    options.scrape_accounts = False
+
+    scraper.scrape_plaid_and_push(options)
+
+    assert _FakePlaid.accounts_calls == []
+    assert update.call_args.args[2] is None
+    assert "accounts_cache" not in items["item-b"]
@@ -0,0 +1,219 @@
+import pandas as pd
+import pytest
+import sheet_sync
+
+from _pytest.monkeypatch import MonkeyPatch
+from pathlib import Path
+from unittest.mock import MagicMock
+
+_KEYS = ["Date", "Merchant", "Amount"]
+
+
+def _frame(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["Date", "Merchant", "Amount", "Category"])
+
+
+def _rows(count: int) -> list[tuple]:
+    return [
+        (f"2024-01-{day:02d}", f"Shop {day}", f"-{day}.5", "Food")
+        for day in range(1, count + 1)
+    ]
+
+
+def _worksheet(mocker, frame: pd.DataFrame) -> MagicMock:
+    worksheet = mocker.MagicMock()
+    worksheet.id = 7
+    worksheet.get_as_df.return_value = frame
+    return worksheet
+
+
+def _range(start: int, end: int) -> dict:
+    return {"sheetId": 7, "dimension": "ROWS", "startIndex": start, "endIndex": end}
+
+
+def test_compute_delta_matches_rows_by_key() -> None:
+    previous = _frame(_rows(4))
+    current = _frame(
+        [
+            ("2024-01-01", "Shop 1", -1.5, "Food"),
+            ("2024-01-02", "Shop 2", "-2.50", "Travel"),
+            ("2024-01-04", "Shop 4", "-4.5", "Food"),
+            ("2024-01-05", "Shop 5", "-5", "Food"),
+        ]
+    )
+
+    delta = sheet_sync.compute_delta(previous, current, _KEYS)
+
+    assert delta == sheet_sync.SheetDelta(deleted=[2], inserted=[3], changed=[1])
+
+
+def test_compute_delta_rejects_reordered_or_duplicate_rows() -> None:
+    previous = _frame(_rows(3))
+
+    reordered = previous.iloc[[1, 0, 2]]
+    duplicated = previous.iloc[[0, 0, 1, 2]]
+    renamed = previous.rename(columns={"Category": "Type"})
+
+    assert sheet_sync.compute_delta(previous, reordered, _KEYS) is None
+    assert sheet_sync.compute_delta(previous, duplicated, _KEYS) is None
+    assert sheet_sync.compute_delta(previous, renamed, _KEYS) is None
+
+
+def test_write_dataframe_without_snapshot_rewrites(mocker) -> None:
+    frame = _frame(_rows(2))
+    worksheet = _worksheet(mocker, frame)
+
+    sheet_sync.write_dataframe(worksheet, frame, _KEYS)
+
+    worksheet.set_dataframe.assert_called_once_with(frame, "A1", fit=True)
+    worksheet.spreadsheet.custom_request.assert_not_called()
+
+
+def test_write_dataframe_sends_delta(mocker) -> None:
+    rows = _rows(30)
+    worksheet = _worksheet(mocker, _frame(rows))
+    sheet_sync.read_dataframe(worksheet)
+    new_row = ("2024-01-03", "Bakery", "-3", "Food")
+    changed_row = rows[5][:3] + ("Travel",)
+    current = _frame(
+        rows[:3] + [new_row] + rows[3:5] + [changed_row] + rows[6:27] + _rows(31)[30:]
+    )
+
+    sheet_sync.write_dataframe(worksheet, current, _KEYS)
+
+    worksheet.set_dataframe.assert_not_called()
+    worksheet.spreadsheet.custom_request.assert_called_once_with(
+        [
+            # Sheet rows 29-31 (data positions 27-29) are gone.
+            {"deleteDimension": {"range": _range(28, 31)}},
+            {
+                "insertDimension": {
+                    "range": _range(4, 5),
+                    "inheritFromBefore": True,
+                }
+            },
+            {"appendDimension": {"sheetId": 7, "dimension": "ROWS", "length": 1}},
+        ],
+        fields="",
+    )
+    worksheet.update_values_batch.assert_called_once_with(
+        ["A5:D5", "A8:D8", "A30:D30"],
+        [[list(new_row)], [list(changed_row)], [list(_rows(31)[30])]],
+    )
+
+
+def test_write_dataframe_uses_written_frame_as_next_snapshot(mocker) -> None:
+    rows = _rows(8)
+    worksheet = _worksheet(mocker, _frame(rows[:4]))
+
+    sheet_sync.write_dataframe(worksheet, _frame(rows[:7]), _KEYS)
+    sheet_sync.write_dataframe(worksheet, _frame(rows), _KEYS)
+
+    worksheet.set_dataframe.assert_called_once()
+    worksheet.update_values_batch.assert_called_once_with(["A9:D9"], [[list(rows[7])]])
+
+
+def test_write_dataframe_rewrites_sheet_modified_since_read(mocker) -> None:
+    rows = _rows(8)
+    worksheet = _worksheet(mocker, _frame(rows[:7]))
+    worksheet.spreadsheet.updated = "2024-01-01T00:00:00.000Z"
+    sheet_sync.read_dataframe(worksheet)
+
+    worksheet.spreadsheet.updated = "2024-01-01T00:05:00.000Z"
+    sheet_sync.write_dataframe(worksheet, _frame(rows), _KEYS)
+
+    worksheet.set_dataframe.assert_called_once()
+    worksheet.update_values_batch.assert_not_called()
+
+
+def test_write_dataframe_rewrites_large_deltas(mocker) -> None:
+    rows = _rows(8)
+    worksheet = _worksheet(mocker, _frame(rows[:4]))
+    sheet_sync.read_dataframe(worksheet)
+
+    sheet_sync.write_dataframe(worksheet, _frame(rows), _KEYS)
+
+    worksheet.set_dataframe.assert_called_once()
+    worksheet.update_values_batch.assert_not_called()
+
+
+def test_failed_write_drops_snapshot(mocker) -> None:
+    rows = _rows(8)
+    worksheet = _worksheet(mocker, _frame(rows[:7]))
+    sheet_sync.read_dataframe(worksheet)
+    worksheet.update_values_batch.side_effect = RuntimeError("quota")
+
+    with pytest.raises(RuntimeError):
+        sheet_sync.write_dataframe(worksheet, _frame(rows), _KEYS)
+    worksheet.update_values_batch.side_effect = None
+    sheet_sync.write_dataframe(worksheet, _frame(rows), _KEYS)
+
+    worksheet.set_dataframe.assert_called_once()
+
+
+def test_delete_rows_coalesces_runs(mocker) -> None:
+    worksheet = _worksheet(mocker, _frame([]))
+
+    sheet_sync.delete_rows(worksheet, [9, 3, 4, 10, 5])
+
+    worksheet.spreadsheet.custom_request.assert_called_once_with(
+        [
+            {"deleteDimension": {"range": _range(8, 10)}},
+            {"deleteDimension": {"range": _range(2, 5)}},
+        ],
+        fields="",
+    )
+
+
+@pytest.fixture()
+def mirror_dir(tmp_path: Path, monkeypatch: MonkeyPatch) -> Path:
+    monkeypatch.setattr(sheet_sync, "MIRROR_DIR", tmp_path)
+    return tmp_path
+
+
+def test_read_dataframe_serves_unmodified_sheet_from_mirror(
+    mirror_dir: Path, mocker
+) -> None:
+    frame = _frame(_rows(3))
+    worksheet = _worksheet(mocker, frame)
+    worksheet.spreadsheet.updated = "2024-01-01T00:00:00.000Z"
+
+    first = sheet_sync.read_dataframe(worksheet)
+    second = sheet_sync.read_dataframe(worksheet)
+
+    worksheet.get_as_df.assert_called_once_with(numerize=False)
+    pd.testing.assert_frame_equal(first, frame)
+    pd.testing.assert_frame_equal(second, frame)
+
+    worksheet.spreadsheet.updated = "2024-01-02T00:00:00.000Z"
+    sheet_sync.read_dataframe(worksheet)
+
+    assert worksheet.get_as_df.call_count == 2
+
+
+def test_write_dataframe_drops_mirror(mirror_dir: Path, mocker) -> None:
+    worksheet = _worksheet(mocker, _frame(_rows(4)))
+    worksheet.spreadsheet.updated = "2024-01-01T00:00:00.000Z"
+    sheet_sync.read_dataframe(worksheet)
+    written = _frame(_rows(4)).iloc[[0, 2, 3]]
+    worksheet.get_as_df.return_value = written.reset_index(drop=True)
+
+    sheet_sync.write_dataframe(worksheet, written, _KEYS)
+    assert list(mirror_dir.iterdir()) == []
+    read = sheet_sync.read_dataframe(worksheet)
+
+    assert worksheet.get_as_df.call_count == 2
+    assert isinstance(read.index, pd.RangeIndex)
+
+
+def test_read_dataframe_without_revision_downloads(mirror_dir: Path, mocker) -> None:
+    worksheet = _worksheet(mocker, _frame(_rows(3)))
+    type(worksheet.spreadsheet).updated = mocker.PropertyMock(
+        side_effect=RuntimeError("drive")
+    )
+
+    sheet_sync.read_dataframe(worksheet)
+    sheet_sync.read_dataframe(worksheet)
+
+    assert worksheet.get_as_df.call_count == 2
+    assert list(mirror_dir.iterdir()) == []
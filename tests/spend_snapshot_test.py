@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+import spend_snapshot
+
+from _pytest.monkeypatch import MonkeyPatch
+from pathlib import Path
+
+from scripts import generate_spend_charts
+
+
+@pytest.fixture()
+def snapshot_dir(tmp_path: Path, monkeypatch: MonkeyPatch) -> Path:
+    monkeypatch.setattr(spend_snapshot, "SNAPSHOT_DIR", tmp_path)
+    return tmp_path
+
+
+def _txns(count: int, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Date": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 120, count), unit="D"),
+            "Merchant": [f"Shop {i % 50}" for i in range(count)],
+            "Amount": -rng.exponential(40.0, count).round(2),
+            "Category": [f"Category {i % 14}" for i in range(count)],
+            "Account": "Checking",
+            "ID": [f"txn-{i}" for i in range(count)],
+            "Description": "",
+        }
+    )
+
+
+def _assert_same_grid(grid, txns: pd.DataFrame) -> None:
+    expected = generate_spend_charts.prepare_spend_grid(txns, window=7)
+    assert grid.categories == expected.categories
+    assert grid.dates.equals(expected.dates)
+    assert grid.cap == pytest.approx(expected.cap)
+    for matrix in ["spend", "display", "rolling", "raw_rolling"]:
+        np.testing.assert_allclose(
+            getattr(grid, matrix), getattr(expected, matrix), atol=1e-9
+        )
+    np.testing.assert_array_equal(grid.capped, expected.capped)
+
+
+def test_update_applies_only_changed_transactions(snapshot_dir: Path, mocker) -> None:
+    txns = _txns(400)
+    spend_snapshot.update_spend_grid(txns, window=7)
+    changed = txns.drop(index=[3, 150]).reset_index(drop=True)
+    changed.loc[10, "Amount"] = -999.0
+    late = _txns(5, seed=9).assign(Date=pd.Timestamp("2025-06-01"), ID="late")
+    changed = pd.concat([changed, late], ignore_index=True)
+    prepare = mocker.spy(generate_spend_charts, "_prepare_transactions")
+
+    grid = spend_snapshot.update_spend_grid(changed, window=7)
+
+    assert [len(call.args[0]) for call in prepare.call_args_list] == [6]
+    _assert_same_grid(grid, changed)
+
+
+def test_tied_cells_match_a_full_rebuild_after_a_modification(
+    snapshot_dir: Path,
+) -> None:
+    days = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.arange(80), unit="D")
+    rng = np.random.default_rng(1)
+    txns = pd.DataFrame(
+        {
+            "Date": [*days[::4], *days, days[0], days[0]],
+            "Merchant": "Landlord",
+            # Rent ties the top cells, which the auto cap's trim excludes.
+            "Amount": [
+                *[-500.0] * 20,
+                *-rng.uniform(10, 60, 80).round(2),
+                -30.33,
+                -36.47,
+            ],
+            "Category": ["Category 1"] * 20 + ["Category 2"] * 80 + ["Category 1"] * 2,
+            "Account": "Checking",
+            "Description": "",
+        }
+    )
+    txns["ID"] = [f"txn-{i}" for i in range(len(txns))]
+    spend_snapshot.update_spend_grid(txns, window=7)
+    # Moving the fees out of the first rent cell leaves 500 minus float residue
+    # there unless the cell is rounded.
+    changed = txns.copy()
+    changed.loc[100:, "Category"] = "Category 2"
+
+    grid = spend_snapshot.update_spend_grid(changed, window=7)
+
+    _assert_same_grid(grid, changed)
+
+
+def test_unchanged_transactions_reuse_the_grid(snapshot_dir: Path, mocker) -> None:
+    txns = _txns(50)
+    first = spend_snapshot.update_spend_grid(txns, window=7)
+    prepare = mocker.spy(generate_spend_charts, "_prepare_transactions")
+
+    second = spend_snapshot.update_spend_grid(txns.sample(frac=1), window=7)
+
+    prepare.assert_not_called()
+    np.testing.assert_array_equal(second.rolling, first.rolling)
+
+
+def test_rule_or_window_changes_rebuild(
+    snapshot_dir: Path, monkeypatch: MonkeyPatch, mocker
+) -> None:
+    txns = _txns(50)
+    spend_snapshot.update_spend_grid(txns, window=7)
+    monkeypatch.setattr(
+        generate_spend_charts.remote.config.GLOBAL,
+        "CATEGORY_MAP",
+        {"Category 1": "Category 2"},
+    )
+    prepare = mocker.spy(generate_spend_charts, "_prepare_transactions")
+
+    grid = spend_snapshot.update_spend_grid(txns, window=7)
+    spend_snapshot.update_spend_grid(txns, window=8)
+
+    assert [len(call.args[0]) for call in prepare.call_args_list] == [50, 50]
+    assert "Category 1" not in grid.categories
+    _assert_same_grid(grid, txns)
+
+
+def test_removing_every_transaction_empties_the_grid(snapshot_dir: Path) -> None:
+    txns = _txns(20)
+    spend_snapshot.update_spend_grid(txns, window=7)
+
+    grid = spend_snapshot.update_spend_grid(txns.iloc[:0], window=7)
+    filtered = spend_snapshot.update_spend_grid(txns, window=7, end_date="2024-01-01")
+
+    assert grid.empty
+    assert filtered.empty
@@ -1,13 +1,22 @@
 import os
+import pytest
 import runpy
 import sys
 import updater
 
 from _pytest.monkeypatch import MonkeyPatch
 from google.oauth2 import service_account
+from pathlib import Path
 from unittest.mock import MagicMock
 
 
+@pytest.fixture(autouse=True)
+def applied_rules_file(tmp_path: Path, monkeypatch: MonkeyPatch) -> Path:
+    path = tmp_path / "applied_rules.pkl"
+    monkeypatch.setattr(updater, "APPLIED_RULES_FILE", path)
+    return path
+
+
 def test_updater_dry_run(
     test_env: MonkeyPatch,
     test_creds: service_account.Credentials,
@@ -77,3 +86,89 @@ def test_main_entrypoint(
         os.remove("transactions_updated.csv")
     except OSError:
         pass
+
+
+def test_updater_write_saves_applied_rules(
+    test_env: MonkeyPatch,
+    test_creds: service_account.Credentials,
+    mockSheet: MagicMock,
+    applied_rules_file: Path,
+    mocker,
+) -> None:
+    sheetsClient = mocker.MagicMock()
+    sheetsClient.open.return_value = mockSheet
+    mocker.patch.object(updater.pygsheets, "authorize", return_value=sheetsClient)
+
+    updater.main([])
+
+    assert updater.load_applied_rules() == updater.rules.snapshot()
+
+
+def test_updater_incremental_write(
+    test_env: MonkeyPatch,
+    test_creds: service_account.Credentials,
+    mockSheet: MagicMock,
+    mocker,
+) -> None:
+    sheetsClient = mocker.MagicMock()
+    sheetsClient.open.return_value = mockSheet
+    mocker.patch.object(updater.pygsheets, "authorize", return_value=sheetsClient)
+    spy_update = mocker.spy(updater.remote, "UpdateGoogleSheet")
+    settings = updater.config.GLOBAL
+    updater.save_applied_rules(updater.rules.snapshot())
+
+    test_env.setattr(
+        settings,
+        "MERCHANT_TO_CATEGORY_MAP",
+        {**settings.MERCHANT_TO_CATEGORY_MAP, "typhoon streets": "Street Food"},
+    )
+    test_env.setattr(
+        settings, "IGNORED_MERCHANTS", [*settings.IGNORED_MERCHANTS, "Cvs"]
+    )
+    test_env.setattr(
+        settings,
+        "IGNORED_MERCHANT_PREFIXES",
+        [*settings.IGNORED_MERCHANT_PREFIXES, "Mbta"],
+    )
+    updater.main([])
+
+    spy_update.assert_not_called()
+    worksheet = mockSheet.worksheet_by_title.return_value
+    worksheet.set_dataframe.assert_not_called()
+    worksheet.update_values_batch.assert_called_once_with(
+        ["D6", "D7"], [[["Street Food"]], [["Street Food"]]]
+    )
+    # Sheet rows 8-10 (two Mbta rows and Cvs) are deleted in one call.
+    worksheet.spreadsheet.custom_request.assert_called_once_with(
+        [
+            {
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": worksheet.id,
+                        "dimension": "ROWS",
+                        "startIndex": 7,
+                        "endIndex": 10,
+                    }
+                }
+            }
+        ],
+        fields="",
+    )
+    assert updater.load_applied_rules() == updater.rules.snapshot()
+
+
+def test_updater_full_flag_ignores_applied_rules(
+    test_env: MonkeyPatch,
+    test_creds: service_account.Credentials,
+    mockSheet: MagicMock,
+    mocker,
+) -> None:
+    sheetsClient = mocker.MagicMock()
+    sheetsClient.open.return_value = mockSheet
+    mocker.patch.object(updater.pygsheets, "authorize", return_value=sheetsClient)
+    spy_update = mocker.spy(updater.remote, "UpdateGoogleSheet")
+    updater.save_applied_rules(updater.rules.snapshot())
+
+    updater.main(["--full"])
+
+    spy_update.assert_called_once()
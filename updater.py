@@ -1,17 +1,139 @@
 import argparse
 import logging
-from typing import cast
+import os
+import pickle
+from typing import Any, Optional, cast
+
+import pandas as pd
 import pygsheets
 
 import auth
 import config
 import remote
+import rules
+import sheet_sync
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# Snapshot of the rules the sheet was last updated with; see rules.snapshot.
+APPLIED_RULES_FILE = config.CACHE_DIR / "applied_rules.pkl"
+OUTPUT_FILE = "transactions_updated.csv"
+
+
+def load_applied_rules() -> Optional[dict[str, Any]]:
+    """Loads the rules snapshot saved by the last update, if any."""
+    path = APPLIED_RULES_FILE
+    try:
+        with open(path, "rb") as f:
+            return cast(dict[str, Any], pickle.load(f))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning(f"Ignoring unreadable rules snapshot {path}.", exc_info=True)
+        return None
+
+
+def save_applied_rules(snapshot: dict[str, Any]) -> None:
+    """Atomically records the rules the sheet was just updated with."""
+    path = APPLIED_RULES_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _log_category_changes(original_df: pd.DataFrame, categories: pd.Series) -> None:
+    if categories.empty:
+        logger.info("No category changes detected.")
+        return
+    logger.info(f"Found {len(categories)} transactions with category changes.")
+    logger.info("Sample category changes (max 20):")
+    for idx, row in original_df.loc[categories.index].head(20).iterrows():
+        idx_int = cast(int, idx)
+        logger.info(
+            f"  Row {idx_int + 2}: {row['Date']} | {row['Merchant']} | "
+            f"'{row['Category']}' -> '{categories.loc[idx_int]}'"
+        )
+
+
+def _dump(txns: pd.DataFrame, message: str) -> None:
+    txns.to_csv(OUTPUT_FILE, index=False)
+    logger.info(message, OUTPUT_FILE)
+
+
+def _full_update(
+    sheet: pygsheets.Spreadsheet, original_df: pd.DataFrame, args: argparse.Namespace
+) -> None:
+    """Re-applies every rule to every row and rewrites the whole tab."""
+    logger.info("Applying category rules and normalizations...")
+    transformed = remote.ApplyCategoryRules(original_df)
+
+    # Calculate difference before filtering ignored transactions
+    changed_mask = original_df["Category"] != transformed["Category"]
+    _log_category_changes(original_df, transformed.loc[changed_mask, "Category"])
+
+    logger.info(
+        "Running standard transaction clean-up "
+        "(filtering ignored, accounts mapping normalizations)..."
+    )
+    cleaned = remote._cleanTxns(transformed)
+
+    num_filtered = len(transformed) - len(cleaned)
+    if num_filtered > 0:
+        logger.info(f"Filtered out {num_filtered} ignored/skipped transactions.")
+
+    if args.dry_run:
+        logger.info("[DRY RUN] Bypassing Google Sheets update.")
+        # Default to dumping CSV in dry run for verification
+        _dump(cleaned, "[DRY RUN] Saved updated local copy to %s")
+    else:
+        logger.info("Uploading updated transactions to Google Sheets...")
+        remote.UpdateGoogleSheet(sheet=sheet, transactions=cleaned, accounts=None)
+        logger.info("Google Sheet update complete!")
+        if args.debug:
+            _dump(cleaned, "Saved updated local copy to %s")
+
+
+def _incremental_update(
+    sheet: pygsheets.Spreadsheet,
+    original_df: pd.DataFrame,
+    changes: rules.RulesDiff,
+    args: argparse.Namespace,
+) -> None:
+    """Re-applies the rules only to rows the rule changes can affect."""
+    affected = changes.affected(original_df)
+    logger.info(
+        f"Rule changes affect {affected.sum()} of {len(original_df)} transactions."
+    )
+    transformed = remote.ApplyCategoryRules(original_df[affected])
+    changed_mask = transformed["Category"] != original_df.loc[affected, "Category"]
+    categories = transformed.loc[changed_mask, "Category"]
+
+    ignored = changes.added_ignores.evaluate(remote._normalizeColumns(original_df))
+    removed = original_df.index[ignored.mask]
+    categories = categories.drop(removed, errors="ignore")
+    _log_category_changes(original_df, categories)
+    if len(removed) > 0:
+        logger.info(f"Filtered out {len(removed)} newly ignored transactions.")
+
+    updated = original_df.drop(removed)
+    updated.loc[categories.index, "Category"] = categories
+    if args.dry_run:
+        logger.info("[DRY RUN] Bypassing Google Sheets update.")
+        _dump(updated, "[DRY RUN] Saved updated local copy to %s")
+        return
+    logger.info(
+        f"Writing {len(categories)} category cells and deleting {len(removed)} rows..."
+    )
+    remote.UpdateTransactionCells(sheet, categories, removed)
+    logger.info("Google Sheet update complete!")
+    if args.debug:
+        _dump(updated, "Saved updated local copy to %s")
+
 
 def main(argv=None) -> None:
     """Main function for the updater script."""
@@ -28,6 +150,11 @@ def main(argv=None) -> None:
         action="store_true",
         help="Dump updated transactions to local CSV.",
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-apply every rule to every row, even if few rules changed.",
+    )
 
     args = parser.parse_args(argv)
 
@@ -43,54 +170,20 @@ def main(argv=None) -> None:
         f"'{config.GLOBAL.RAW_TRANSACTIONS_TITLE}'..."
     )
     all_txns_ws = sheet.worksheet_by_title(title=config.GLOBAL.RAW_TRANSACTIONS_TITLE)
-    original_df = all_txns_ws.get_as_df(numerize=False)
+    original_df = sheet_sync.read_dataframe(all_txns_ws)
     original_df = original_df[config.GLOBAL.COLUMN_NAMES]
 
-    logger.info("Applying category rules and normalizations...")
-    transformed = remote.ApplyCategoryRules(original_df)
-
-    # Calculate difference before filtering ignored transactions
-    changed_mask = original_df["Category"] != transformed["Category"]
-    num_changed = changed_mask.sum()
-
-    if num_changed > 0:
-        logger.info(f"Found {num_changed} transactions with category changes.")
-        diff_df = original_df[changed_mask]
-        logger.info("Sample category changes (max 20):")
-        for idx, row in diff_df.head(20).iterrows():
-            idx_int = cast(int, idx)
-            new_cat = transformed.loc[idx_int]["Category"]
-            logger.info(
-                f"  Row {idx_int + 2}: {row['Date']} | {row['Merchant']} | "
-                f"'{row['Category']}' -> '{new_cat}'"
-            )
+    current = rules.snapshot()
+    previous = None if args.full else load_applied_rules()
+    changes = None if previous is None else rules.diff(previous, current)
+    if changes is None:
+        _full_update(sheet, original_df, args)
     else:
-        logger.info("No category changes detected.")
-
-    logger.info(
-        "Running standard transaction clean-up "
-        "(filtering ignored, accounts mapping normalizations)..."
-    )
-    cleaned = remote._cleanTxns(transformed)
-
-    num_filtered = len(transformed) - len(cleaned)
-    if num_filtered > 0:
-        logger.info(f"Filtered out {num_filtered} ignored/skipped transactions.")
+        logger.info("Found a snapshot of the applied rules; updating incrementally.")
+        _incremental_update(sheet, original_df, changes, args)
 
-    if args.dry_run:
-        logger.info("[DRY RUN] Bypassing Google Sheets update.")
-        # Default to dumping CSV in dry run for verification
-        output_file = "transactions_updated.csv"
-        cleaned.to_csv(output_file, index=False)
-        logger.info(f"[DRY RUN] Saved updated local copy to {output_file}")
-    else:
-        logger.info("Uploading updated transactions to Google Sheets...")
-        remote.UpdateGoogleSheet(sheet=sheet, transactions=cleaned, accounts=None)
-        logger.info("Google Sheet update complete!")
-        if args.debug:
-            output_file = "transactions_updated.csv"
-            cleaned.to_csv(output_file, index=False)
-            logger.info(f"Saved updated local copy to {output_file}")
+    if not args.dry_run:
+        save_applied_rules(current)
 
 
 if __name__ == "__main__":